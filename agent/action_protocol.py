@@ -0,0 +1,252 @@
+"""
+Action protocol between the LLM and the agent.
+
+The model can act in two ways, and both end up as the same action dictionaries
+({"type": ..., "content": ...}) that the agent's handlers take:
+
+- Native tool use: ACTION_TOOLS gives the engine a typed schema per action type, and
+  each tool call is converted with tool_call_to_action(). render_actions() writes the
+  calls back into the response text as <action> blocks, so the conversation history,
+  logs and replays look the same for both ways.
+- <action> blocks in the response text, read by parse_action_blocks(). Unlike a regex
+  plus json.loads, the parser reports every block it could not use (bad JSON, an
+  unterminated block, a missing field) so the agent can ask the model to correct it
+  within the same turn instead of silently dropping the action. Common slips are
+  repaired locally: code fences, text after the JSON object, raw newlines in strings
+  and unescaped Windows backslashes ("projects\\NVExperiment\\..."). A backslash before
+  n, t, b, f, r or u is a valid JSON escape, so "configs\\new.json" decodes to a newline;
+  paths, commands and patch bases that decode to control characters are decoded again
+  with every lone backslash taken literally, and reported if that does not help.
+
+Usage (check the action blocks of a saved response):
+  python action_protocol.py response.txt
+"""
+import re
+import json
+import argparse
+
+ACTION_TYPES = ("message", "read", "write", "patch", "plan", "run", "vision")
+
+_POSITION = {"type": "object", "properties": {"x": {"type": "number"}, "y": {"type": "number"}},
+             "required": ["x", "y"]}
+
+# Anthropic tool definitions, one per action type
+ACTION_TOOLS = [
+    {
+        "name": "message",
+        "description": "Send a message to the user (results, questions, summaries).",
+        "input_schema": {"type": "object", "properties": {"text": {"type": "string"}}, "required": ["text"]},
+    },
+    {
+        "name": "read",
+        "description": "Read a file from the run's configs/ or data/ directory, or a default config.",
+        "input_schema": {"type": "object", "properties": {"path": {"type": "string"}}, "required": ["path"]},
+    },
+    {
+        "name": "write",
+        "description": "Write a JSON config or data file to the run's configs/ or data/ directory (needs permission).",
+        "input_schema": {"type": "object", "properties": {"path": {"type": "string"}, "data": {"type": "object"}},
+                         "required": ["path", "data"]},
+    },
+    {
+        "name": "patch",
+        "description": "Derive a config from a base config (path or config id) plus changed settings (needs permission).",
+        "input_schema": {"type": "object", "properties": {
+            "base": {"type": "string"},
+            "changes": {"type": "object", "description": "Setting path relative to scripts.<script> -> new value"},
+            "merge": {"type": "object", "description": "JSON merge patch applied to the whole config"},
+            "path": {"type": "string"},
+        }, "required": ["base"]},
+    },
+    {
+        "name": "plan",
+        "description": "Order NV candidates for measurement and get the projected instrument time.",
+        "input_schema": {"type": "object", "properties": {
+            "candidates": {"type": "array", "items": dict(_POSITION, properties=dict(
+                _POSITION["properties"], label={"type": "string"}))},
+            "start": _POSITION,
+            "measurements": {"type": "array", "items": {"type": "string"}},
+        }, "required": ["candidates"]},
+    },
+    {
+        "name": "run",
+        "description": "Run an experiment script: python <scripts dir>/<ESR|find_nv|galvo_scan|optimize>.py "
+                       "--config <config> --output-dir <run data dir> [options] (needs permission).",
+        "input_schema": {"type": "object", "properties": {"command": {"type": "string"}}, "required": ["command"]},
+    },
+    {
+        "name": "vision",
+        "description": "Analyze a plot image from the run's data/ directory (needs permission).",
+        "input_schema": {"type": "object", "properties": {"path": {"type": "string"}}, "required": ["path"]},
+    },
+]
+
+# Tool input field holding the content of actions whose content is a single string
+_STRING_FIELDS = {"message": "text", "read": "path", "run": "command", "vision": "path"}
+
+_BLOCK_OPEN, _BLOCK_CLOSE = "<action>", "</action>"
+_FENCE = re.compile(r"^```(?:json)?\s*|\s*```$")
+_BAD_ESCAPE = re.compile(r'\\(?![\\/"bfnrt]|u[0-9a-fA-F]{4})')
+# An escaped backslash or quote (kept), or any other backslash (taken literally)
+_ANY_ESCAPE = re.compile(r'\\[\\"]|\\')
+_CONTROL = re.compile(r"[\x00-\x1f]")
+
+
+def tool_call_to_action(name: str, tool_input) -> dict:
+    """Convert a native tool call into an action dictionary."""
+    tool_input = tool_input if isinstance(tool_input, dict) else {}
+    if name in _STRING_FIELDS:
+        return {"type": name, "content": tool_input.get(_STRING_FIELDS[name], "")}
+    return {"type": name, "content": tool_input}
+
+
+def render_actions(text: str, actions) -> str:
+    """Response text followed by the actions as <action> blocks."""
+    blocks = [f"{_BLOCK_OPEN}\n{json.dumps(action, indent=2)}\n{_BLOCK_CLOSE}" for action in actions]
+    return "\n".join([text.rstrip()] + blocks) if blocks else text
+
+
+def validate_action(action) -> str:
+    """
+    Check an action's type and the shape of its content.
+
+    Returns:
+        An error message, or None if the action is well-formed.
+    """
+    if not isinstance(action, dict):
+        return "the block is not a JSON object"
+    a_type = str(action.get("type", "")).lower()
+    if a_type not in ACTION_TYPES:
+        return f"unknown action type {action.get('type')!r} (expected one of {', '.join(ACTION_TYPES)})"
+    content = action.get("content")
+    if a_type in _STRING_FIELDS:
+        if not isinstance(content, str) or not content.strip():
+            return f'"{a_type}" needs a non-empty string as content'
+    elif not isinstance(content, dict):
+        return f'"{a_type}" needs an object as content'
+    elif a_type == "write" and ("path" not in content or "data" not in content):
+        return '"write" content needs "path" and "data"'
+    elif a_type == "patch" and not content.get("base"):
+        return '"patch" content needs "base"'
+    elif a_type == "plan" and not isinstance(content.get("candidates"), list):
+        return '"plan" content needs a "candidates" list'
+    return None
+
+
+def _path_fields(action) -> list:
+    """The path, command and base strings of an action (values that never hold control characters)."""
+    if not isinstance(action, dict):
+        return []
+    content = action.get("content")
+    if str(action.get("type", "")).lower() in ("read", "run", "vision"):
+        return [content]
+    if isinstance(content, dict):
+        return [content.get("path"), content.get("base")]
+    return []
+
+
+def _has_control(action) -> bool:
+    return any(isinstance(v, str) and _CONTROL.search(v) for v in _path_fields(action))
+
+
+def _decode(body: str):
+    """Decode one block body, tolerating the usual slips. Raises ValueError."""
+    body = _FENCE.sub("", body.strip())
+    start = body.find("{")
+    if start < 0:
+        raise ValueError("no JSON object in the block")
+    decoder = json.JSONDecoder(strict=False)   # allows raw newlines inside strings
+    try:
+        action = decoder.raw_decode(body, start)[0]
+    except json.JSONDecodeError as e:
+        if "escape" not in e.msg:
+            raise ValueError(f"invalid JSON: {e.msg} at line {e.lineno} column {e.colno}")
+        try:
+            action = decoder.raw_decode(_BAD_ESCAPE.sub(r"\\\\", body), start)[0]
+        except json.JSONDecodeError as e:
+            raise ValueError(f"invalid JSON: {e.msg} at line {e.lineno} column {e.colno}")
+    if not _has_control(action):
+        return action
+    # "C:\\new\\table.json": \n and \t were meant as path separators. Only the path fields
+    # are taken from the literal decoding; other strings (e.g. written data) keep their escapes
+    literal = _ANY_ESCAPE.sub(lambda m: m.group() if len(m.group()) == 2 else "\\\\", body)
+    try:
+        literal_action = decoder.raw_decode(literal, start)[0]
+        if isinstance(action["content"], dict):
+            for field in ("path", "base"):
+                if field in action["content"]:
+                    action["content"][field] = literal_action["content"][field]
+        else:
+            action["content"] = literal_action["content"]
+    except (json.JSONDecodeError, KeyError, TypeError):
+        action = None
+    if action is None or _has_control(action):
+        raise ValueError("a path or command contains control characters; write backslashes in "
+                         "paths as \\\\ or use forward slashes")
+    return action
+
+
+def parse_action_blocks(text: str):
+    """
+    Scan a response for <action> blocks.
+
+    Returns:
+        List with one entry per block, in order: {"block": 1-based number, "action": the
+        action dictionary or None, "error": None or what is wrong, "excerpt": start of the block}.
+    """
+    blocks = []
+    position = 0
+    while True:
+        start = text.find(_BLOCK_OPEN, position)
+        if start < 0:
+            break
+        body_start = start + len(_BLOCK_OPEN)
+        end = text.find(_BLOCK_CLOSE, body_start)
+        # A block that runs into the next <action> (or the end of the response) is unterminated
+        next_open = text.find(_BLOCK_OPEN, body_start)
+        if end < 0 or (0 <= next_open < end):
+            stop = next_open if next_open >= 0 else len(text)
+            body, error = text[body_start:stop], "unterminated <action> block (missing </action>)"
+            position = stop
+        else:
+            body, error = text[body_start:end], None
+            position = end + len(_BLOCK_CLOSE)
+        action = None
+        if error is None:
+            try:
+                action = _decode(body)
+                error = validate_action(action)
+            except ValueError as e:
+                error = str(e)
+            if error is None:
+                action["type"] = str(action["type"]).lower()
+            else:
+                action = None
+        blocks.append({"block": len(blocks) + 1, "action": action, "error": error,
+                       "excerpt": " ".join(body.split())[:120]})
+    return blocks
+
+
+def format_parse_errors(blocks) -> str:
+    """One line per block that could not be used."""
+    return "\n".join(f"- block {b['block']}: {b['error']} (starts: {b['excerpt']!r})"
+                     for b in blocks if b["error"])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the <action> blocks of an LLM response")
+    parser.add_argument("response", help="Text file with the response")
+    args = parser.parse_args()
+    with open(args.response, "r", encoding="utf-8") as f:
+        blocks = parse_action_blocks(f.read())
+    for b in blocks:
+        if b["error"]:
+            print(f"[Actions] block {b['block']}: ERROR {b['error']}")
+        else:
+            print(f"[Actions] block {b['block']}: {b['action']['type']}")
+    if not blocks:
+        print("[Actions] No <action> blocks")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,24 +1,86 @@
 import os
+import sys
 import json
 import re
 import subprocess
+import threading
+import time
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
 
-from anthropic_engine import call_llm, call_vision  # Import both text and vision functions
+from anthropic_engine import call_llm, call_llm_tools, call_vision  # Text (plain and with tools) and vision calls
 # from deepseek_engine import call_llm, call_vision  # Import both text and vision functions
 #from anthropic_engine import call_vision
 #from deepseek_engine import call_llm
 from rag_engine import embed_text, save_embeddings, load_embeddings, search_similar
+from agent_logging import StructuredLogWriter, infer_action
+from run_catalog import RunCatalog, queue_wait
+from config_store import ConfigStore, format_diff, config_hash
+from config_schema import ConfigValidator, format_issues
+from artifact_index import ArtifactIndex
+from session_embeddings import SessionEmbedder, search_sessions
+from nv_scheduler import plan_schedule, format_schedule, DEFAULT_DRIFT_RATE
+from drift_model import DriftModel, current_drift_model, observations_from_catalog, DEFAULT_THRESHOLD
+from tracing import Tracer
+from permission_policy import PermissionPolicy
+from agent_paths import to_path, prompt_path, is_within, parse_run_command, run_argv
+from action_protocol import ACTION_TOOLS, tool_call_to_action, render_actions, parse_action_blocks, format_parse_errors
+from plan_explorer import PlanScorer, choose_plan, format_scores, DEFAULT_MIN_GAIN_FRACTION
+from time_estimator import TimeEstimator, format_estimate, format_duration, LONG_RUN_S
+
+# Times per turn the model is asked to correct action blocks that could not be used
+MAX_ACTION_REPAIRS = 1
+
+# Runner options that control the shared instrument queue; agent-launched runs always
+# queue with the default priority of their script
+QUEUE_OPTIONS = ("--no-queue", "--priority")
+
+# Budget of run_autonomous (LLM steps, and seconds after which no new step starts)
+DEFAULT_MAX_STEPS = 12
+DEFAULT_TIME_BUDGET_S = 3600.0
+
+AUTONOMOUS_NOTE = (
+    "(autonomous mode, step {step} of {max_steps}, {minutes:.0f} min left) The results of your last actions are "
+    "above. Continue with the next step toward the goal: {goal}\n"
+    "When the goal is complete, or you need the user, reply with only a message action."
+)
 
 class NVExperimentAgent:
-    def __init__(self):
+    def __init__(self, log_fsync: str = "batch", skip_redundant_optimize: bool = True,
+                 drift_threshold: float = DEFAULT_THRESHOLD, trace: bool = False, metrics_port: int = None,
+                 permission_policy: PermissionPolicy = None, interactive: bool = True,
+                 run_suffix: str = None, catalog: RunCatalog = None, config_validator: ConfigValidator = None,
+                 instrument_lock=None, config_store: ConfigStore = None, native_tools: bool = True,
+                 plan_candidates: int = 1,
+                 min_gain_fraction: float = DEFAULT_MIN_GAIN_FRACTION, long_run_warning_s: float = LONG_RUN_S):
+        """
+        Args:
+            log_fsync: StructuredLogWriter fsync mode.
+            skip_redundant_optimize: Skip optimize runs the drift model says are unnecessary.
+            drift_threshold: Drift (V) above which optimize is needed.
+            trace: Enable tracing (spans to logs/trace_<ts>.jsonl).
+            metrics_port: Serve Prometheus metrics on this port (enables tracing).
+            permission_policy: Decide permission requests with this policy instead of asking.
+            interactive: Whether a user can be asked on the console.
+            run_suffix: Appended to the run directory name, to keep sessions started in the
+                same second apart.
+            catalog / config_validator / instrument_lock / config_store: Shared instances when
+                several sessions run in one process (agent_server.py); created per agent otherwise.
+            native_tools: Offer the actions to the model as typed tools (action_protocol.ACTION_TOOLS);
+                <action> blocks in the response text are parsed either way.
+            plan_candidates: Responses requested concurrently per step; with more than one, the
+                plan with the least instrument time among those with enough information gain
+                is executed (see plan_explorer).
+            min_gain_fraction: Gain, relative to the best candidate, a plan needs to be chosen.
+            long_run_warning_s: Runs estimated to take longer than this are flagged before launch.
+        """
         self.project_root_dir = 'projects'
         self.project_name = 'NVExperiment'
         self.runs_dir_name = 'runs'
         self.run_dir_prefix = 'run'
 
         file_ts = self._current_timestamp_for_filename()
-        self.run_dir = f"{self.run_dir_prefix}_{file_ts}"
+        self.run_dir = f"{self.run_dir_prefix}_{file_ts}" + (f"_{run_suffix}" if run_suffix else "")
         self.base_dir = os.path.join(self.project_root_dir, self.project_name, self.runs_dir_name, self.run_dir)
 
         self.default_dir = os.path.join(self.project_root_dir, self.project_name)
@@ -27,7 +89,7 @@ class NVExperimentAgent:
         self.data_dir   = os.path.join(self.base_dir, "data")
         self.logs_dir   = os.path.join(self.base_dir, "logs")
 
-        self.scripts_dir = "experiment_scripts"  # updated directory for scripts
+        self.scripts_dir = os.path.join(self.default_dir, "scripts")
         
         # Directory for storing embeddings
         self.embeddings_dir = os.path.join(self.project_root_dir, self.project_name, "embeddings")
@@ -35,14 +97,19 @@ class NVExperimentAgent:
 
         # The entire conversation history (user messages, assistant messages, actions, etc.)
         self.conversation_history = []
+        # Vision analyses as they happen: {"plot": path, "result": analysis, "timestamp": ...}
+        self.vision_events = []
 
-        # Extended system instruction with updated run command and vision option details
+        # Extended system instruction with updated run command and vision option details.
+        # Paths are written with forward slashes, which work on every OS (see agent_paths)
+        default_dir, base_dir = prompt_path(self.default_dir), prompt_path(self.base_dir)
+        data_dir, scripts_dir = prompt_path(self.data_dir), prompt_path(self.scripts_dir)
         self.system_instruction = (
             f"""You are the NVExperimentAgent. You maintain a full conversation history, which includes:
 
 - All user messages,
 - All assistant messages (your own),
-- All actions you have taken (read/write/run/vision),
+- All actions you have taken (read/write/patch/plan/run/vision),
 - The results of those actions.
 
 You have the following constraints and abilities:
@@ -62,62 +129,105 @@ You have the following constraints and abilities:
      }}
      </action>
      ```
-   - The `"type"` must be one of: `"message"`, `"read"`, `"write"`, `"run"`, or `"vision"`.
+   - The `"type"` must be one of: `"message"`, `"read"`, `"write"`, `"patch"`, `"plan"`, `"run"`, or `"vision"`.
+   - When tools named after these action types are available, you may call them instead of writing `<action>` blocks.
+   - An action block that is not valid JSON is not executed (nor are the blocks after it); you will be asked to resend it.
 
 In order to execute the script, you may use one of two cases. The first case is the default case, where there aren't any specific configs that the user wishes to change and you may simply read from the default base directories. In that case, follow the below instructions:
    
 3) Security & Directory Rules:
-   - Read Access: Only from the `configs\\` or `data\\` directories.
-   - Write Access: Only to the `configs\\` or `data\\` directories.
-   - Run Access: Only scripts in the `scripts\\` directory.
+   - Read Access: Only from the `configs/` or `data/` directories.
+   - Write Access: Only to the `configs/` or `data/` directories.
+   - Run Access: Only scripts in the `scripts/` directory.
    - For `write`, `run`, or `vision` actions, always ask user permission first. If the user says “no,” do not proceed.
    
 4) Key File Paths & Self.base_dir:
-   - All outputs, file paths, or results must be written to the directory {self.base_dir}.
+   - All outputs, file paths, or results must be written to the directory {base_dir}.
    - Default case (when no new config file is specified): Use the following default file paths:
-     - `default_esr_config`: `{self.default_dir}\\configsdefault_esr_config.json`
-     - `default_find_nv_config`: `{self.default_dir}\\configs\\default_find_nv_config.json`
-     - `default_galvo_scan_config`: `{self.default_dir}\\configs\\default_galvo_scan_config.json`
-     - `default_optimize_config`: `{self.default_dir}\\configs\\default_optimize_config.json`
+     - `default_esr_config`: `{default_dir}/configs/default_esr_config.json`
+     - `default_find_nv_config`: `{default_dir}/configs/default_find_nv_config.json`
+     - `default_galvo_scan_config`: `{default_dir}/configs/default_galvo_scan_config.json`
+     - `default_optimize_config`: `{default_dir}/configs/default_optimize_config.json`
    
 5) Run Command Options:
    - The run command must include one of the following four options: ESR, find_nv, galvo_scan, or optimize.
    - IMPORTANT: You MUST include the --output-dir parameter in your command to specify where results should be saved.
-   - Always use the current run's data directory as the output directory: projects\\NVExperiment\\runs\\run_(insert TIMESTAMP here)\\data\\
+   - Always use the current run's data directory as the output directory: {data_dir}/
    - The complete command format should be:
-         py projects\\experiment_scripts\\<script_name>.py --config <config_file> --output-dir projects\\NVExperiment\\runs\\run_(insert TIMESTAMP here)\\data\\
+         python {scripts_dir}/<script_name>.py --config <config_file> --output-dir {data_dir}/
      where <script_name> is one of ESR, find_nv, galvo_scan, or optimize.
+   - ESR.py saves the running-average spectrum after every average to `esr_snapshots_<timestamp>.bin` in the output directory.
+     Append `--stop-snr <value>` (optionally `--min-averages <n>`) to stop averaging as soon as the ESR dip reaches that contrast SNR, e.g. `--stop-snr 15` for a strong NV.
+   - Plots are rendered after the data is saved, by a background worker; the run output gives the plot path ("plot will be rendered to: ..."). A plot that is not rendered yet is rendered automatically when you request `vision` on it.
+   - Each script saves its data as `<name>_data_<timestamp>.json` (non-array values plus the shape, dtype and min/max of every array) next to a `<name>_data_<timestamp>.npz` holding the raw arrays. `read` the .json file; the .npz is binary.
+   - Instead of writing wider/narrower ESR configs, append `--sweep adaptive` to sweep the configured range coarsely and then sample densely only around the dips found.
+     Tune it with `--coarse-points <n>`, `--point-budget <n>` (total points over all passes), `--refine-span <Hz>`, `--max-resonances <n>` and `--coarse-avg <n>`.
+   - Reading, writing or patching a config reports the estimated instrument time of a run with it (calibrated on earlier runs); runs estimated at more than {long_run_warning_s / 60:.0f} min are flagged before launch. When cheaper settings answer the question (fewer `esr_avg`, `--stop-snr`, `--sweep adaptive`, a smaller scan), prefer them and say how long the run will take.
+   - Runs wait in a queue shared with other agents and the lab console before using the instruments ("[Runner] Waited ... s for the instruments"); optimize runs go first, and adaptive ESR sweeps let a waiting optimize run go between passes.
+   - An optimize run is skipped when the last optimize used the same config, no find_nv or galvo_scan run has moved the galvo since, and the drift model (fitted to earlier optimize results on that NV) predicts it has drifted less than the tolerance. Nothing is moved then: the stage stays where the last optimize left it, and the message gives the drift model's predicted NV position. Append `--force` to run optimize anyway.
+   - Configs are validated before a run is launched: only settings from the default config, with physical limits (e.g. `power_out` -60 to 10 dBm, frequencies up to 6 GHz, galvo positions within +/-10 V). A config that fails is not run; the errors list each setting to fix.
+   - Reading a config that was derived from a default config returns only the settings that differ from that default (e.g. `settings.freq_start: 2900000000.0 -> 2850000000.0`). Read the default config for the full structure.
 
 6) Vision Option:
    - In addition to running scripts, you can analyze plot images.
    - Use the command: `vision <plot_file_path>`.
-   - The plot file must reside in the `data\\` directory.
+   - The plot file must reside in the `data/` directory.
    - Expected plots and their paths:
-     - `{self.base_dir}\\data\\ESR_plot.png`
-     - `{self.base_dir}\\data\\FindNV_plot.png`
-     - `{self.base_dir}\\data\\GalvoScan_plot.png`
-     - `{self.base_dir}\\data\\Optimization_plot.png`
+     - `{base_dir}/data/ESR_plot.png`
+     - `{base_dir}/data/FindNV_plot.png`
+     - `{base_dir}/data/GalvoScan_plot.png`
+     - `{base_dir}/data/Optimization_plot.png`
    - For `GalvoScan_plot.png`, NVs are associated with large bright dots; estimate and read out the center coordinates of bright dots for subsequent steps.
 
 7) Usage Flow:
-   - Initial Analysis: Begin by reading the output from the most recent experiment (if experiments have been run) stored in the `data\\` directory. Analyze these results for insights.
+   - Initial Analysis: Begin by reading the output from the most recent experiment (if experiments have been run) stored in the `data/` directory. Analyze these results for insights.
    - Reflection & Adjustment: Reflect on the insights gained and decide on adjustments for the next run.
    - Configuration Reading: 
-     - Default Case: Read the default configuration from the appropriate file (e.g., `{self.default_dir}\\configs\\default_esr_config.json`).
+     - Default Case: Read the default configuration from the appropriate file (e.g., `{default_dir}/configs/default_esr_config.json`).
      - Non-default Case: Read the configuration from the new file path provided by the user.
    - Configuration Writing: 
      - Based on the reflection, write a new or updated configuration.
-     - Default Case: Write to a new file under {self.base_dir} using default directory paths if no custom file is specified.
+     - Default Case: Write to a new file under {base_dir} using default directory paths if no custom file is specified.
      - Non-default Case: Write to the user-specified configuration file path.
+     - Prefer a `patch` action over `write` when only some settings change: give the base config and just the changed settings
+       (paths relative to `scripts.<script>`, as in config diffs), and the system writes the full config and returns its path:
+       ```
+       <action>
+       {{
+         "type": "patch",
+         "content": {{
+           "base": "{default_dir}/configs/default_esr_config.json",
+           "changes": {{"settings.freq_start": 2.85e9, "settings.freq_stop": 2.89e9, "settings.esr_avg": 50}},
+           "path": "{base_dir}/configs/esr_narrow_config.json"
+         }}
+       }}
+       </action>
+       ```
+       `base` may also be a config id shown as `[config <id>]`; `path` is optional (a name is generated in {base_dir}/configs/).
+       Changes are checked against the default config; if they are rejected, the errors are returned so you can correct them.
+   - Multiple NV candidates: before characterizing several NVs (e.g. bright spots from a galvo scan), request a `plan`
+     with the candidate coordinates; the system returns the visiting order with the least galvo travel, where an
+     `optimize` run is actually needed (based on predicted drift) and the projected instrument time. Follow that order:
+       ```
+       <action>
+       {{
+         "type": "plan",
+         "content": {{"candidates": [{{"x": -2.1, "y": -3.0, "label": "NV1"}}, {{"x": 1.4, "y": 0.2, "label": "NV2"}}],
+                     "start": {{"x": 0, "y": 0}}, "measurements": ["find_nv", "ESR"]}}
+       }}
+       </action>
+       ```
+       `start` (current galvo position) and `measurements` are optional. Planning does not need permission.
    - Experiment Execution: Run the desired experiment with:
      ```
-     py {self.default_dir}\\scripts\\<script_name>.py --config <config_file> --output-dir projects\\NVExperiment\\runs\\run_(insert TIMESTAMP here)\\data\\
+     python {scripts_dir}/<script_name>.py --config <config_file> --output-dir {data_dir}/
      ```
      where `<script_name>` is one of: `ESR`, `find_nv`, `galvo_scan`, or `optimize`.
 
 8) Behavior & Permissions:
    - When you `<read>` a file, you receive its content internally. If you want the user to see it, produce an `<action type="message">` block.
    - When you `<write>` a file, ask the user permission. If denied, do not write.
+   - When you `<patch>` a config, ask the user permission. If denied, do not patch.
    - When you `<run>` or `<vision>` a command, ask the user permission. If denied, do not proceed.
    - Use `<action type="message">` to communicate with the user.
 
@@ -129,52 +239,117 @@ In order to execute the script, you may use one of two cases. The first case is
      <action>
      {{
        "type": "read",
-       "content": "{self.default_dir}\\configs\\default_esr_config.json"
+       "content": "{default_dir}/configs/default_esr_config.json"
      }}
      </action>
      <action>
      {{
        "type": "write",
        "content": {{
-         "path": f"{self.base_dir}\\configs\\my_new_experiment_config.json",
+         "path": f"{base_dir}/configs/my_new_experiment_config.json",
          "data": "<updated configuration dictionary>"
        }}
      }}
      </action>
      ```
-   - Always ensure that file operations and outputs are associated with {self.base_dir}.
+   - Always ensure that file operations and outputs are associated with {base_dir}.
 
 10) Non-Default vs. Default Case Summary:
     - Default Case:  
       - No new config file is provided by the user.
-      - Use the default configuration files located in the `{self.default_dir}\\configs\\` directory.
-      - New outputs and any created files should be within {self.base_dir}.
+      - Use the default configuration files located in the `{default_dir}/configs/` directory.
+      - New outputs and any created files should be within {base_dir}.
     - Non-Default Case:  
       - The user requests updates to the config file.
-      - You should read and then generate a modified configuration to {self.base_dir}\\configs\\.
-      - All outputs are still directed to {self.base_dir}, but the config file operations occur at the new path within {self.base_dir}.
+      - You should read and then generate a modified configuration to {base_dir}/configs/.
+      - All outputs are still directed to {base_dir}, but the config file operations occur at the new path within {base_dir}.
 
 11) Restrictions:
     - Do not reveal or replicate your chain-of-thought except inside the `<think>` block.
-    - Do not produce any actions outside of `"message"`, `"read"`, `"write"`, `"run"`, or `"vision"`.
+    - Do not produce any actions outside of `"message"`, `"read"`, `"write"`, `"patch"`, `"plan"`, `"run"`, or `"vision"`.
 """
         )
 
         os.makedirs(self.logs_dir, exist_ok=True)
         # Get a file-safe timestampc
         file_ts = self._current_timestamp_for_filename()
-        self.logfile_path = os.path.join(self.logs_dir, f"agent_history_{file_ts}.log")
+        # JSON-lines log written by a background thread (see agent_logging.parse_log for reading it back)
+        self.logfile_path = os.path.join(self.logs_dir, f"agent_history_{file_ts}.jsonl")
+        self.log_writer = StructuredLogWriter(self.logfile_path, run_id=self.run_dir, fsync=log_fsync)
+
+        # SQLite catalog of every run directory; index earlier runs that are not in it yet
+        self._owns_catalog = catalog is None
+        if self._owns_catalog:
+            catalog = RunCatalog(os.path.join(self.default_dir, "run_catalog.sqlite"))
+            catalog.backfill(os.path.join(self.project_root_dir, self.project_name, self.runs_dir_name))
+        self.catalog = catalog
+        self.catalog.record_run(self.run_dir, self.base_dir)
+
+        # Content-addressed config store: non-default configs are kept as deltas against the defaults
+        self.config_store = config_store or ConfigStore(os.path.join(self.default_dir, "config_store"),
+                                                        os.path.join(self.default_dir, "configs"))
+        # Instrument time of runs from their config settings, calibrated on the catalog's durations
+        self.time_estimator = TimeEstimator(self.catalog)
+        self.long_run_warning_s = long_run_warning_s
+        # Config schemas (default config structure + physical bounds), checked before every run
+        self.config_validator = config_validator or ConfigValidator(os.path.join(self.default_dir, "configs"))
+        # Plots and data files of this run, updated as runs and vision analyses complete
+        self.artifacts = ArtifactIndex(self.data_dir)
+        # Turns are embedded in the background as the session goes, so RAG can search them right away
+        self.session_embedder = SessionEmbedder(self.embeddings_dir, self.run_dir, embed_text)
+        self._embedded_turns = 0
+        # Skip optimize runs when the drift model predicts the NV has not moved more than drift_threshold
+        self.skip_redundant_optimize = skip_redundant_optimize
+        self.drift_threshold = drift_threshold
+        # Spans and latency histograms (no-ops unless tracing is enabled), exported to
+        # logs/trace_<ts>.jsonl and, with a metrics port, as Prometheus text on /metrics
+        self.tracer = Tracer(enabled=trace or metrics_port is not None,
+                             jsonl_path=os.path.join(self.logs_dir, f"trace_{file_ts}.jsonl"), trace_id=self.run_dir)
+        if metrics_port is not None:
+            self.tracer.serve(metrics_port)
+        # Permission requests are decided by the policy when one is set; "ask" rules (and every
+        # request without a policy) go to the console, or are denied when not interactive
+        self.permission_policy = permission_policy
+        self.interactive = interactive
+        # Held while an experiment runs, so sessions sharing the instruments run one at a time
+        self.instrument_lock = instrument_lock or threading.Lock()
+        self.native_tools = native_tools
+        self.plan_candidates = max(1, int(plan_candidates))
+        self.min_gain_fraction = min_gain_fraction
 
     def _current_timestamp(self):
         return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     def _current_timestamp_for_filename(self):
         # File-safe timestamp format (e.g., 20250219_101530)
         return datetime.now().strftime("%Y%m%d_%H%M%S")
-    def _log(self, role: str, content: str):
-        ts = self._current_timestamp()
-        line = f"[{ts}] {role.upper()}: {content}\n"
-        with open(self.logfile_path, "a", encoding="utf-8") as f:
-            f.write(line)
+    def _log(self, role: str, content: str, action: str = None, latency: float = None, **fields):
+        """
+        Queue a structured log record (timestamp, role, action type, run id, latency).
+        For role "action" the action type is inferred from the message prefix if not given.
+        Extra keyword fields are stored in the record as-is.
+        """
+        if action is None and role == "action":
+            action = infer_action(content)
+        self.log_writer.write(role, content, action=action, latency=latency, **fields)
+
+    def close(self):
+        """
+        Flush and close the log. Call before the process exits.
+        """
+        self._checkpoint_turns()
+        self.session_embedder.close()
+        self.tracer.close()
+        self.log_writer.close()
+        if self._owns_catalog:
+            self.catalog.close()
+
+    def _checkpoint_turns(self):
+        """
+        Hand conversation turns added since the last checkpoint to the background embedder.
+        """
+        for turn in self.conversation_history[self._embedded_turns:]:
+            self.session_embedder.append(turn["role"], turn["content"])
+        self._embedded_turns = len(self.conversation_history)
 
     def _parse_think(self, text: str) -> str:
         """
@@ -191,6 +366,9 @@ In order to execute the script, you may use one of two cases. The first case is
         Also include suggestions for relevant plots.
         """
         prompt = self.system_instruction.strip()
+        prompt += "\n\nEstimated instrument time of a run with each default config: " + ", ".join(
+            f"{name} {format_duration(seconds)}"
+            for name, seconds in self.time_estimator.default_durations(self.config_store).items())
         
         # Get the most recent user message for RAG query
         recent_user_messages = [turn["content"] for turn in self.conversation_history 
@@ -205,7 +383,8 @@ In order to execute the script, you may use one of two cases. The first case is
             print(f"[RAG] Performing RAG query for: '{query[:50]}...' if len(query) > 50 else query")
             
             # Perform RAG search
-            relevant_contexts = self._get_rag_context(query)
+            with self.tracer.span("rag_context"):
+                relevant_contexts = self._get_rag_context(query)
             
             if relevant_contexts:
                 print(f"[RAG] Retrieved relevant context from previous conversations")
@@ -244,114 +423,381 @@ In order to execute the script, you may use one of two cases. The first case is
         prompt += "\n\nPlease respond with a <think> block and any <action> blocks you need for the next step. Please carefully wait for user and experiment feedback before proceeding to too many actions."
         return prompt
 
-    def ask_human_for_permission(self, description: str) -> bool:
+    def ask_human_for_permission(self, description: str, action: str = None, content=None) -> bool:
         #RX 05142025
         """
-        Ask the user on the console for permission and log the response.
+        Ask for permission and log the response: from the permission policy if one is set,
+        otherwise (or for "ask" rules) from the user on the console.
+
+        Args:
+            description: What the agent wants to do, shown to the user.
+            action: Action type, used to look up the policy rule.
+            content: The action content (for runs, the command).
         """
+        context = self._policy_context(action, content)
+        if context.get("estimated_s") is not None:
+            description += f" (estimated instrument time {format_duration(context['estimated_s'])})"
         self._log("action", f"(ASK PERMISSION) {description}")
         self.conversation_history.append({
             "role": "assistant",
             "content": f"Agent requests permission to: {description}"
         })
         print(f"[System] Agent requests permission to: {description}")
-        ans = input("Grant permission? (yes/no): ").strip().lower()
-        self._log("user", f"(permission) {ans}")
+        decision, reason = "ask", None
+        if self.permission_policy is not None and action is not None:
+            decision, reason = self.permission_policy.decide(action, **context)
+        if decision == "ask" and not self.interactive:
+            decision, reason = "deny", "no user to ask in unattended mode"
+        if decision == "ask":
+            ans = input("Grant permission? (yes/no): ").strip().lower()
+            answer = f"(permission) {ans}"
+        else:
+            ans = "yes" if decision == "allow" else "no"
+            answer = f"(permission) {ans} [{reason}]"
+            print(f"[System] Permission {'granted' if ans == 'yes' else 'denied'}: {reason}")
+        self._log("user", answer)
         self.conversation_history.append({
             "role": "user",
-            "content": f"(permission) {ans}"
+            "content": answer
         })
-        ans = "yes"
         return (ans == "yes")
 
+    def _policy_context(self, action: str, content) -> dict:
+        """
+        Details the permission policy needs for an action: for runs, the script name, the
+        loaded config and the estimated instrument time (None if the command or config
+        cannot be read).
+        """
+        if action != "run" or not isinstance(content, str):
+            return {}
+        try:
+            parsed = self._parse_run_command(content)
+        except ValueError:
+            return {"script": None, "config": None, "estimated_s": None}
+        try:
+            with open(parsed["config"], "r", encoding="utf-8") as f:
+                config = json.load(f)
+        except (OSError, ValueError):
+            config = None
+        estimate = self.time_estimator.estimate_config(config, parsed["args"], name=parsed["name"])
+        return {"script": parsed["name"], "config": config,
+                "estimated_s": estimate["seconds"] if estimate else None}
+
     def handle_user_input(self, user_message: str):
         """
         Process user prompt: log it, build the prompt, call the LLM, parse and execute actions.
+
+        Returns:
+            List of the action types the LLM response contained, in order.
         """
+        with self.tracer.span("turn"):
+            action_types = self._handle_user_input(user_message)
+        self.tracer.flush()
+        return action_types
+
+    def _handle_user_input(self, user_message: str):
+        self._add_user_message(user_message)
+        return self._step()[0]
+
+    def _add_user_message(self, user_message: str):
         print(f"\n[Agent] Processing user input: '{user_message[:50]}{'...' if len(user_message) > 50 else ''}'")  
         self._log("user", user_message)
         self.conversation_history.append({"role": "user", "content": user_message})
-        
+
+    def run_autonomous(self, goal: str, max_steps: int = DEFAULT_MAX_STEPS,
+                       time_budget_s: float = DEFAULT_TIME_BUDGET_S) -> dict:
+        """
+        ReAct loop: send the goal, then keep feeding the results of each step's actions back
+        to the model (no user turn in between) until it answers with only messages, or the
+        step or time budget runs out. Ctrl+C stops the loop after the current step.
+
+        Args:
+            goal: The user message that starts the task.
+            max_steps: Maximum LLM steps (each step is one LLM call plus its actions).
+            time_budget_s: No new step is started after this many seconds.
+
+        Returns:
+            {"status": "done", "step_limit", "time_limit", "interrupted" or "error",
+             "steps": [{"step", "actions", "prompt_s", "llm_s", "actions_s", "total_s"}, ...],
+             "elapsed_s", "error"}.
+        """
+        start = time.perf_counter()
+        steps, status, error = [], "step_limit", None
+        note = None
+        with self.tracer.span("autonomous", max_steps=max_steps) as span:
+            self._add_user_message(goal)
+            try:
+                for step in range(1, max_steps + 1):
+                    elapsed = time.perf_counter() - start
+                    if step > 1 and elapsed >= time_budget_s:
+                        status = "time_limit"
+                        break
+                    with self.tracer.span("step", step=step):
+                        action_types, timing = self._step(step_note=note)
+                    steps.append(dict(step=step, actions=action_types, **timing))
+                    print(f"[Agent] Step {step}/{max_steps}: {', '.join(action_types) or 'no actions'} "
+                          f"(prompt {timing['prompt_s']:.2f} s, LLM {timing['llm_s']:.2f} s, "
+                          f"actions {timing['actions_s']:.2f} s)")
+                    self._log("agent", f"Autonomous step {step}", action="autonomous_step", latency=timing["total_s"],
+                              step=step, actions=action_types, timing=timing)
+                    self.tracer.flush()
+                    if all(a_type == "message" for a_type in action_types):
+                        status = "done"
+                        break
+                    remaining = time_budget_s - (time.perf_counter() - start)
+                    note = AUTONOMOUS_NOTE.format(step=step + 1, max_steps=max_steps,
+                                                  minutes=max(0.0, remaining) / 60, goal=goal)
+                    if not self.interactive:
+                        note += " No user is available; permission requests are decided by the lab's policy."
+            except KeyboardInterrupt:
+                status = "interrupted"
+            except Exception as e:
+                status, error = "error", f"{type(e).__name__}: {e}"
+            span.set(status=status, steps=len(steps))
+        elapsed = time.perf_counter() - start
+        msg = f"[Agent] Autonomous run {status} after {len(steps)} steps in {elapsed:.1f} s" + (f": {error}" if error else "")
+        print(msg)
+        self._log("agent", msg, action="autonomous_end", latency=elapsed, status=status)
+        self.tracer.flush()
+        return {"status": status, "steps": steps, "elapsed_s": elapsed, "error": error}
+
+    def _step(self, step_note: str = None):
+        """
+        One LLM step: build the prompt from the conversation so far, call the LLM, and
+        parse and execute the actions.
+
+        Args:
+            step_note: Instruction appended to this prompt only (not to the history).
+
+        Returns:
+            Tuple of (action types in order, {"prompt_s", "llm_s", "actions_s", "total_s"}).
+        """
+        step_start = time.perf_counter()
         self._log("agent", "Building prompt with RAG context")
-        full_prompt = self._build_prompt()
+        with self.tracer.span("build_prompt"):
+            full_prompt = self._build_prompt()
+        if step_note:
+            full_prompt += f"\n\n{step_note}"
         
         print("[Agent] Calling LLM with enhanced prompt...")
-        llm_response = call_llm(
-            user_prompt=full_prompt,
-            system_message=self.system_instruction,
-            #model = "deepseek-chat",
-            max_tokens=3000,
-            temperature=0.7
-        )
-        self._log("assistant", llm_response)
+        llm_start = time.perf_counter()
+        with self.tracer.span("call_llm", candidates=self.plan_candidates) as span:
+            if self.plan_candidates > 1:
+                llm_response, calls = self._explore_plans(full_prompt)
+            else:
+                calls = [self._call_llm_counted(full_prompt)]
+                llm_response = calls[0][0]
+            if self.tracer.enabled:
+                self._trace_llm_usage(span, full_prompt, calls)
+        self._log("assistant", llm_response, action="llm_response", latency=time.perf_counter() - llm_start)
         self.conversation_history.append({"role": "assistant", "content": llm_response})
         chain_of_thought = self._parse_think(llm_response)
         if chain_of_thought:
             self._log("assistant", f"(THINK) {chain_of_thought}")
             self.conversation_history.append({"role": "assistant", "content": f"(THINK) {chain_of_thought}"})
 
-        actions = self._parse_actions(llm_response)
+        with self.tracer.span("parse_actions"):
+            blocks = self._parse_actions(llm_response)
+        actions = self._usable_actions(full_prompt, llm_response, blocks)
+        llm_s = time.perf_counter() - llm_start   # including any action repair call
 
+        actions_start = time.perf_counter()
+        action_types = []
         for action_dict in actions:
-            a_type = action_dict.get("type", "").lower()
-            content = action_dict.get("content", "")
-
-            if a_type == "message":
-                self._action_message(content)
-            elif a_type == "read":
-                self._action_read_file(content)
-            elif a_type == "write":
-                if self.ask_human_for_permission(f"Write file: {content}"):
-                    self._action_write_file(content)
-                else:
-                    print("[System] Write denied by user.")
-                    self._log("action", f"WRITE DENIED for {content}")
-                    self.conversation_history.append({
-                        "role": "assistant",
-                        "content": f"[Agent] WRITE DENIED for {content}"
-                    })
-            elif a_type == "run":
-                if self.ask_human_for_permission(f"Run command: {content}"):
-                    self._action_run_command(content)
-                else:
-                    print("[System] Run denied by user.")
-                    self._log("action", f"RUN DENIED for {content}")
-                    self.conversation_history.append({
-                        "role": "assistant",
-                        "content": f"[Agent] RUN DENIED for {content}"
-                    })
-            elif a_type == "vision":
-                if self.ask_human_for_permission(f"Analyze plot: {content}"):
-                    self._action_vision(content)
-                else:
-                    print("[System] Vision analysis denied by user.")
-                    self._log("action", f"VISION DENIED for {content}")
-                    self.conversation_history.append({
-                        "role": "assistant",
-                        "content": f"[Agent] VISION DENIED for {content}"
-                    })
+            a_type = action_dict["type"]
+            action_types.append(a_type)
+            with self.tracer.span(f"action.{a_type}"):
+                self._dispatch_action(a_type, action_dict.get("content", ""))
+
+        self._checkpoint_turns()
+        end = time.perf_counter()
+        return action_types, {"prompt_s": llm_start - step_start, "llm_s": llm_s,
+                              "actions_s": end - actions_start, "total_s": end - step_start}
+
+    def _call_llm(self, prompt: str) -> str:
+        """
+        One LLM call. With native tools, the tool calls are returned as <action> blocks
+        appended to the response text, so both protocols are handled alike from here on.
+        """
+        if not self.native_tools:
+            return call_llm(user_prompt=prompt, system_message=self.system_instruction,
+                            max_tokens=3000, temperature=0.7)
+        reply = call_llm_tools(user_prompt=prompt, tools=ACTION_TOOLS, system_message=self.system_instruction,
+                               max_tokens=3000, temperature=0.7)
+        return render_actions(reply["text"], [tool_call_to_action(c["name"], c["input"]) for c in reply["tool_calls"]])
+
+    def _call_llm_counted(self, prompt: str):
+        """
+        _call_llm plus the token usage the engine reported for it, read on the calling
+        thread (last_usage() is per thread). Returns (response, usage or None).
+        """
+        response = self._call_llm(prompt)
+        last_usage = getattr(call_llm_tools if self.native_tools else call_llm, "last_usage", None)
+        return response, last_usage() if callable(last_usage) else None
+
+    def _explore_plans(self, prompt: str):
+        """
+        Request plan_candidates responses to the same prompt concurrently and return the
+        one whose plan takes the least instrument time among those that run the scripts most
+        candidates run and have enough information gain (plan_explorer.choose_plan). The
+        comparison is added to the conversation.
+
+        Returns:
+            Tuple of (chosen response, [(response, usage)] of every candidate that answered).
+        """
+        with ThreadPoolExecutor(max_workers=self.plan_candidates, thread_name_prefix="plan") as pool:
+            futures = [pool.submit(self._call_llm_counted, prompt) for _ in range(self.plan_candidates)]
+        calls, errors = [], []
+        for future in futures:
+            try:
+                calls.append(future.result())
+            except Exception as e:
+                errors.append(e)
+        responses = [response for response, _ in calls]
+        if not responses:
+            raise errors[0]
+
+        scorer = PlanScorer(self.config_store, self.config_dir, self.time_estimator)
+        scores = [scorer.score([b["action"] for b in self._parse_actions(r) if b["action"]]) for r in responses]
+        chosen = choose_plan(scores, self.min_gain_fraction)
+        msg = (f"[System] Compared {len(responses)} candidate plans"
+               + (f" ({len(errors)} LLM calls failed)" if errors else "")
+               + f", executing plan {chosen + 1}:\n{format_scores(scores, chosen)}")
+        print(msg)
+        self._log("agent", msg, action="plan_candidates", chosen=chosen, scores=scores)
+        self.conversation_history.append({"role": "assistant", "content": msg})
+        self.tracer.count("plan_candidates", len(responses))
+        return responses[chosen], calls
+
+    def _usable_actions(self, prompt: str, response: str, blocks):
+        """
+        The actions to execute from a response's parsed action blocks.
+
+        If a block cannot be used, the blocks before it are kept and the model is told what
+        is wrong and asked, within the same turn, to resend that block and the ones after it
+        (up to MAX_ACTION_REPAIRS times). Blocks that are still unusable are reported in the
+        conversation and not executed.
+        """
+        actions = []
+        for attempt in range(MAX_ACTION_REPAIRS + 1):
+            failed = [b for b in blocks if b["error"]]
+            if not failed:
+                return actions + [b["action"] for b in blocks]
+            first = failed[0]["block"]
+            actions += [b["action"] for b in blocks if b["block"] < first]
+            msg = (f"[System] {len(failed)} action block(s) could not be used, so block {first} and the blocks "
+                   f"after it were not executed:\n{format_parse_errors(blocks)}")
+            print(msg)
+            self._log("action", msg, action="action_parse_error")
+            self.conversation_history.append({"role": "assistant", "content": msg})
+            self.tracer.count("action_parse_errors", len(failed))
+            if attempt == MAX_ACTION_REPAIRS:
+                break
+            kept = ("" if first == 1 else "Block 1 will be executed as it is. " if first == 2
+                    else f"Blocks 1-{first - 1} will be executed as they are. ")
+            repair_prompt = (f"{prompt}\nAssistant: {response}\n{msg}\n\n{kept}Reply with only the corrected "
+                             f"<action> block {first} and the blocks after it.")
+            repair_start = time.perf_counter()
+            with self.tracer.span("repair_actions"):
+                response = self._call_llm(repair_prompt)
+            self._log("assistant", response, action="llm_response", latency=time.perf_counter() - repair_start)
+            self.conversation_history.append({"role": "assistant", "content": response})
+            blocks = self._parse_actions(response)
+        return actions
+
+    def _trace_llm_usage(self, span, prompt: str, calls):
+        """
+        Record bytes and tokens of the LLM calls of one step (one per plan candidate) on its
+        span, summed, and in the tracer counters. `calls` holds (response, usage) pairs, with
+        the usage engines report through `last_usage()`; without it tokens are estimated at
+        4 bytes each.
+        """
+        prompt_bytes = len(prompt.encode("utf-8")) + len(self.system_instruction.encode("utf-8"))
+        totals = {"sent": 0, "received": 0, "input": 0, "output": 0}
+        sources = set()
+        for response, usage in calls:
+            sent, received = prompt_bytes, len(response.encode("utf-8"))
+            if usage:
+                tokens_in, tokens_out, source = usage.get("input_tokens", 0), usage.get("output_tokens", 0), "reported"
+            else:
+                tokens_in, tokens_out, source = sent // 4, received // 4, "estimated"
+            self.tracer.count("llm_bytes_sent", sent)
+            self.tracer.count("llm_bytes_received", received)
+            self.tracer.count("llm_tokens", tokens_in, direction="input", source=source)
+            self.tracer.count("llm_tokens", tokens_out, direction="output", source=source)
+            totals["sent"] += sent
+            totals["received"] += received
+            totals["input"] += tokens_in
+            totals["output"] += tokens_out
+            sources.add(source)
+        span.set(bytes_sent=totals["sent"], bytes_received=totals["received"], input_tokens=totals["input"],
+                 output_tokens=totals["output"], llm_calls=len(calls),
+                 token_source=sources.pop() if len(sources) == 1 else "mixed")
+
+    def _dispatch_action(self, a_type: str, content):
+        """
+        Execute one parsed action, asking permission first where required.
+        """
+        if a_type == "message":
+            self._action_message(content)
+        elif a_type == "read":
+            self._action_read_file(content)
+        elif a_type == "write":
+            if self.ask_human_for_permission(f"Write file: {content}", action="write", content=content):
+                self._action_write_file(content)
+            else:
+                print("[System] Write denied by user.")
+                self._log("action", f"WRITE DENIED for {content}")
+                self.conversation_history.append({
+                    "role": "assistant",
+                    "content": f"[Agent] WRITE DENIED for {content}"
+                })
+        elif a_type == "plan":
+            self._action_plan(content)
+        elif a_type == "patch":
+            if self.ask_human_for_permission(f"Patch config: {content}", action="patch", content=content):
+                self._action_patch_config(content)
+            else:
+                print("[System] Patch denied by user.")
+                self._log("action", f"PATCH DENIED for {content}")
+                self.conversation_history.append({
+                    "role": "assistant",
+                    "content": f"[Agent] PATCH DENIED for {content}"
+                })
+        elif a_type == "run":
+            if self.ask_human_for_permission(f"Run command: {content}", action="run", content=content):
+                self._action_run_command(content)
             else:
-                print(f"[System] Unknown action type: {a_type}")
-                self._log("action", f"Unknown action {a_type}")
+                print("[System] Run denied by user.")
+                self._log("action", f"RUN DENIED for {content}")
                 self.conversation_history.append({
                     "role": "assistant",
-                    "content": f"[Agent] Unknown action {a_type}"
+                    "content": f"[Agent] RUN DENIED for {content}"
                 })
+        elif a_type == "vision":
+            if self.ask_human_for_permission(f"Analyze plot: {content}", action="vision", content=content):
+                self._action_vision(content)
+            else:
+                print("[System] Vision analysis denied by user.")
+                self._log("action", f"VISION DENIED for {content}")
+                self.conversation_history.append({
+                    "role": "assistant",
+                    "content": f"[Agent] VISION DENIED for {content}"
+                })
+        else:
+            print(f"[System] Unknown action type: {a_type}")
+            self._log("action", f"Unknown action {a_type}")
+            self.conversation_history.append({
+                "role": "assistant",
+                "content": f"[Agent] Unknown action {a_type}"
+            })
 
     def _parse_actions(self, llm_text: str):
         """
-        Return a list of JSON objects found in <action>...</action> blocks.
+        Return the <action> blocks of a response with their action or parse error
+        (see action_protocol.parse_action_blocks).
         """
-        pattern = r"<action>(.*?)</action>"
-        matches = re.findall(pattern, llm_text, flags=re.DOTALL)
-        actions = []
-        for m in matches:
-            try:
-                a_dict = json.loads(m.strip())
-                actions.append(a_dict)
-            except json.JSONDecodeError:
-                pass
-        return actions
+        return parse_action_blocks(llm_text)
 
     def _action_message(self, message_content: str):
         """
@@ -363,33 +809,72 @@ In order to execute the script, you may use one of two cases. The first case is
 
     def _action_read_file(self, filepath: str):
         """
-        Read a file from allowed directories (configs\\ or data\\).
+        Read a file from allowed directories (configs/ or data/).
         """
         self._log("action", f"READ: {filepath}")
-        allowed_prefixes = [self.config_dir, os.path.join(self.default_dir, 'configs'), self.data_dir]
+        path = to_path(filepath)
 
-        if not any(filepath.startswith(p) for p in allowed_prefixes):
+        if not is_within(path, self.config_dir, os.path.join(self.default_dir, 'configs'), self.data_dir):
             msg = f"[System] READ denied: {filepath} is not in allowed directories."
             print(msg)
             self._log("action", msg)
             self.conversation_history.append({"role": "assistant", "content": msg})
             return
-        if not os.path.exists(filepath):
+        if not path.exists():
             msg = f"[System] File not found: {filepath}"
             print(msg)
             self._log("action", msg)
             self.conversation_history.append({"role": "assistant", "content": msg})
             return
-        with open(filepath, 'r', encoding="utf-8") as f:
+        with open(path, 'r', encoding="utf-8") as f:
             content = f.read()
+        config_view = self._config_diff_view(filepath, content)
+        time_note = self._config_time_note(content)
+        if config_view is not None:
+            self.conversation_history.append({"role": "assistant", "content": config_view + time_note})
+            return
         self.conversation_history.append({
             "role": "assistant",
-            "content": f"(Read file) {filepath} with content:\n{content}"
+            "content": f"(Read file) {filepath} with content:\n{content}{time_note}"
         })
 
+    def _config_time_note(self, config) -> str:
+        """
+        A line with the estimated instrument time of a run with a config (dict or JSON
+        text), or "" if it is not a runner config.
+        """
+        if isinstance(config, str):
+            try:
+                config = json.loads(config)
+            except json.JSONDecodeError:
+                return ""
+        estimate = self.time_estimator.estimate_config(config) if isinstance(config, dict) else None
+        return f"\nEstimated instrument time per run: {format_estimate(estimate)}" if estimate else ""
+
+    def _config_diff_view(self, filepath: str, content: str):
+        """
+        For a config derived from one of the default configs, describe it as the
+        settings that differ from that default, which is much shorter than the file.
+        Returns None when the full content should be shown instead.
+        """
+        try:
+            config = json.loads(content)
+        except json.JSONDecodeError:
+            return None
+        default_path, changes = self.config_store.diff_from_default(config)
+        if default_path is None or to_path(default_path).resolve() == to_path(filepath).resolve():
+            return None
+        digest = self.config_store.put(config, name=str(to_path(filepath)))
+        diff_text = format_diff(changes, strip_prefix=2) if changes else "(no changes)"
+        if len(diff_text) >= len(content):
+            return None
+        self._log("action", f"READ CONFIG DIFF: {filepath} vs {default_path} ({len(changes)} changes)")
+        return (f"(Read config) {filepath} [config {digest[:12]}] is {default_path} with these settings changed "
+                f"(paths relative to scripts.<script>):\n{diff_text}")
+
     def _action_write_file(self, content: dict):
         """
-        Write JSON data to a file in allowed directories (configs\\ or data\\).
+        Write JSON data to a file in allowed directories (configs/ or data/).
         """
         self._log("action", f"WRITE file with content: {json.dumps(content, indent=2)}")
         if not isinstance(content, dict):
@@ -406,72 +891,262 @@ In order to execute the script, you may use one of two cases. The first case is
             self._log("action", msg)
             self.conversation_history.append({"role": "assistant", "content": msg})
             return
-        allowed_prefixes = [self.config_dir, self.data_dir]
-        if not any(filepath.startswith(p) for p in allowed_prefixes):
+        path = to_path(filepath)
+        if not is_within(path, self.config_dir, self.data_dir):
             msg = f"[System] WRITE denied: {filepath} is not in allowed directories."
             print(msg)
             self._log("action", msg)
             self.conversation_history.append({"role": "assistant", "content": msg})
             return
-        os.makedirs(os.path.dirname(filepath), exist_ok=True)
-        with open(filepath, "w", encoding="utf-8") as f:
+        # The full file is written even for stored configs: the runner and the other
+        # readers take paths, and run directories stay readable without the store
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
             json.dump(filedata, f, indent=2)
         msg = f"[System] Wrote file: {filepath}"
+        default_path, changes = self.config_store.diff_from_default(filedata)
+        if default_path is not None:
+            digest = self.config_store.put(filedata, name=str(path))
+            msg += f" (config {digest[:12]}, {len(changes)} settings differ from {os.path.basename(default_path)})"
+        msg += self._config_time_note(filedata)
         print(msg)
         self._log("action", msg)
         self.conversation_history.append({"role": "assistant", "content": msg})
 
-    def _parse_run_command(self, command: str) -> dict:
+    def _action_patch_config(self, content: dict):
+        """
+        Derive a config from a base config plus a few changed settings, check it
+        against the default config and write it to the configs/ directory.
+
+        content: {"base": <config path or config id>, "changes": {<dotted path>: value},
+                  "merge": <JSON merge patch>, "path": <output path, optional>}
+        """
+        self._log("action", f"PATCH: {json.dumps(content)}")
+
+        def report(msg):
+            print(msg)
+            self._log("action", msg)
+            self.conversation_history.append({"role": "assistant", "content": msg})
+
+        if not isinstance(content, dict) or not content.get("base"):
+            report("[System] Patch error: content must be a dict with 'base' and 'changes' (or 'merge').")
+            return
+        base_ref = str(content["base"])
+        changes, merge = content.get("changes") or {}, content.get("merge") or {}
+        if not isinstance(changes, dict) or not isinstance(merge, dict):
+            report("[System] Patch error: 'changes' must map setting paths to values and 'merge' must be an object.")
+            return
+
+        base_path = to_path(base_ref)
+        digest = self.config_store.resolve(base_ref) if not base_path.exists() else None
+        if digest:
+            base = self.config_store.get(digest)
+        elif not is_within(base_path, self.config_dir, os.path.join(self.default_dir, 'configs')):
+            report(f"[System] PATCH denied: base {base_ref} is not in allowed directories or a known config id.")
+            return
+        elif not base_path.exists():
+            report(f"[System] Patch error: base config not found: {base_ref}")
+            return
+        else:
+            try:
+                with open(base_path, "r", encoding="utf-8") as f:
+                    base = json.load(f)
+            except json.JSONDecodeError as e:
+                report(f"[System] Patch error: base config {base_ref} is not valid JSON: {e}")
+                return
+
+        config, issues = self.config_store.patch(base, changes=changes, merge=merge)
+        issues = issues or self.config_validator.validate(config)
+        if issues:
+            report("[System] PATCH rejected, nothing was written:\n" + format_issues(issues))
+            return
+
+        new_digest = self.config_store.put(config)
+        filepath = content.get("path")
+        if not filepath:
+            default_path = self.config_store.default_for(config)[0]
+            stem = os.path.splitext(os.path.basename(default_path))[0].replace("default_", "", 1)
+            filepath = os.path.join(self.config_dir, f"{stem}_{new_digest[:10]}.json")
+        path = to_path(filepath)
+        if not is_within(path, self.config_dir):
+            report(f"[System] PATCH denied: {filepath} is not in the run's configs directory ({self.config_dir}).")
+            return
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(config, f, indent=2)
+        self.config_store.put(config, name=str(path))
+        report(f"[System] Patched config written to: {filepath} (config {new_digest[:12]}, "
+               f"{len(changes) + len(merge)} changes applied to {base_ref})" + self._config_time_note(config))
+
+    def _action_plan(self, content: dict):
+        """
+        Order NV candidates for measurement (least galvo travel, optimize only when
+        drift requires it) and report the projected instrument time.
+
+        content: {"candidates": [{"x", "y", "label"}], "start": {"x", "y"}, "measurements": [...]}
         """
-        Parse the run command to extract the script and config file.
-        Expected format:
-            py experiment_scripts\\<script_name>.py --config <config_file> [--output-dir <output_directory>]
-        where <script_name> is one of ESR, find_nv, galvo_scan, or optimize.
-        """
-        # More flexible pattern to handle different path formats and whitespace variations
-        pattern = r"py\s+(?P<path>(?:projects[\\/])?(?:experiment_scripts|NVExperiment[\\/]scripts)[\\/](ESR\.py|find_nv\.py|galvo_scan\.py|optimize\.py))\s+--config\s+(?P<config>[\w\\./-]+)(?:\s+--output-dir\s+(?P<output_dir>[\w\\./-]+))?"
-        m = re.search(pattern, command)
-        if m:
-            result = {"script": m.group("path"), "config": m.group("config")}
-            if m.group("output_dir"):
-                result["output_dir"] = m.group("output_dir")
-            return result
+        self._log("action", f"PLAN: {json.dumps(content)}")
+        candidates = content.get("candidates") if isinstance(content, dict) else None
+        if not isinstance(candidates, list) or not all(
+                isinstance(c, dict) and isinstance(c.get("x"), (int, float)) and isinstance(c.get("y"), (int, float))
+                for c in candidates):
+            msg = "[System] Plan error: content.candidates must be a list of {\"x\": ..., \"y\": ...} positions."
         else:
-            # More informative error message that includes the command that failed to parse
-            allowed_scripts = "ESR.py, find_nv.py, galvo_scan.py, or optimize.py"
-            error_msg = f"Run command parsing error for command: '{command}'. \nCommand must be in the format: py experiment_scripts/<script_name>.py --config <config_file> [--output-dir <output_directory>] \nwhere <script_name> is one of {allowed_scripts}"
-            raise ValueError(error_msg)
+            start = content.get("start")
+            if not (isinstance(start, dict) and isinstance(start.get("x"), (int, float)) and isinstance(start.get("y"), (int, float))):
+                start = None
+            measurements = content.get("measurements") or ["find_nv", "ESR"]
+            drift = current_drift_model(self.catalog)
+            plan = plan_schedule(candidates, start=start, measurements=measurements,
+                                 durations=self.time_estimator.default_durations(self.config_store),
+                                 drift_rate=drift.rate_per_hour() if drift.fits else DEFAULT_DRIFT_RATE,
+                                 drift_tolerance=self.drift_threshold,
+                                 time_since_optimize=self._time_since_optimize())
+            msg = "[System] Measurement plan:\n" + format_schedule(plan)
+        print(msg)
+        self._log("action", msg)
+        self.conversation_history.append({"role": "assistant", "content": msg})
+
+    def _redundant_optimize(self, config_path):
+        """
+        Whether an optimize run with this config can be skipped: only if the last optimize
+        used the same config, no find_nv or galvo_scan run has moved the galvo since, and
+        the drift model fitted around that optimize's position predicts less drift than
+        drift_threshold.
 
+        Returns:
+            Tuple of (skip, reason, DriftModel or None).
+        """
+        last = self.catalog.query_experiments(script="optimize", status="ok", limit=1)
+        if not last:
+            return False, "no earlier optimize", None
+        last = last[0]
+        try:
+            with open(config_path, "r", encoding="utf-8") as f:
+                digest = config_hash(json.load(f))
+        except (OSError, ValueError):
+            return False, "config could not be read", None
+        if last["config_hash"] != digest:
+            return False, "the last optimize used a different config", None
+        moves = [row for row in self.catalog.query_experiments(since=last["started_at"])
+                 if row["script"] in ("find_nv", "galvo_scan") and row["started_at"] > last["started_at"]]
+        if moves:
+            return False, f"{moves[0]['script']} has moved the galvo since the last optimize", None
+        near = (last["x"], last["y"]) if last["x"] is not None and last["y"] is not None else None
+        drift = DriftModel(observations_from_catalog(self.catalog, near=near)) if near else current_drift_model(self.catalog)
+        needed, reason = drift.should_optimize(threshold=self.drift_threshold)
+        if needed:
+            return False, reason, drift
+        return True, f"the last optimize used the same config, nothing has moved the galvo since, and {reason}", drift
+
+    def _time_since_optimize(self) -> float:
+        """Seconds since the last successful optimize run ended (infinite if there was none)."""
+        last = self.catalog.query_experiments(script="optimize", status="ok", limit=1)
+        if not last:
+            return float("inf")
+        return max(0.0, time.time() - last[0]["started_at"] - (last[0]["duration_s"] or 0.0))
+
+    def _parse_run_command(self, command: str) -> dict:
+        """
+        Parse the run command into the script, config, output directory and other runner
+        arguments (see agent_paths.parse_run_command). Expected format:
+            python projects/NVExperiment/scripts/<script_name>.py --config <config_file> [--output-dir <output_directory>]
+        where <script_name> is one of ESR, find_nv, galvo_scan, or optimize; either path separator works.
+        """
+        return parse_run_command(command)
 
     def _action_run_command(self, command: str):
         """
-        Run a shell command (only if in 'scripts\\' directory and is one of the allowed scripts), capturing output.
+        Run one of the allowed experiment scripts in the scripts/ directory with this
+        Python interpreter (no shell), capturing output.
         """
         self._log("action", f"RUN: {command}")
         try:
             parsed = self._parse_run_command(command)
-            allowed_scripts = [f"{self.default_dir}\\scripts\\ESR.py", f"{self.default_dir}\\scripts\\find_nv.py", 
-                               f"{self.default_dir}\\scripts\\galvo_scan.py", f"{self.default_dir}\\scripts\\optimize.py"]
-            script_normalized = parsed["script"].replace("/", "\\")
-
-            if script_normalized not in allowed_scripts:
+            allowed_script = to_path(self.scripts_dir) / f"{parsed['name']}.py"
+            if parsed["script"].resolve() != allowed_script.resolve():
                 raise ValueError("Command not allowed: script not among allowed options.")
-            
-            # Ensure the data directory exists
+            # argparse also takes unambiguous prefixes ("--no-q", "--prio")
+            queue_options = [arg for arg in parsed["args"] if len(arg.split("=", 1)[0]) > 2 and arg.startswith("--")
+                             and any(option.startswith(arg.split("=", 1)[0]) for option in QUEUE_OPTIONS)]
+            if queue_options:
+                raise ValueError(f"Command not allowed: {', '.join(queue_options)} would bypass the instrument "
+                                 f"queue; runs from the agent always wait their turn. Remove the option and run again.")
+
+            # Skip an optimize run the drift model says is unnecessary, unless forced
+            force = "--force" in parsed["args"]
+            parsed["args"] = [arg for arg in parsed["args"] if arg != "--force"]
+            script_name = parsed["name"]
+            if script_name == "optimize" and self.skip_redundant_optimize and not force:
+                skip, reason, drift = self._redundant_optimize(parsed["config"])
+                if skip:
+                    predicted = ", ".join(f"{axis}={value:.4f}" for axis, value in drift.predict().items())
+                    msg = (f"[System] Optimize skipped, nothing was run and the stage was not moved: {reason}. "
+                           f"The stage is still where the last optimize left it; the drift model puts the NV at "
+                           f"{predicted} now. Append --force to the command to optimize anyway.")
+                    print(msg)
+                    self._log("action", msg, action="optimize_skipped")
+                    self.conversation_history.append({"role": "assistant", "content": msg})
+                    return
+
+            # Check the config against its schema before launching anything
+            issues = self.config_validator.validate_file(str(parsed["config"]))
+            if issues:
+                msg = (f"[System] RUN blocked, config {parsed['config']} failed validation (nothing was launched). "
+                       f"Fix these settings and run again:\n{format_issues(issues)}")
+                print(msg)
+                self._log("action", msg, action="run_blocked", issues=issues)
+                self.conversation_history.append({"role": "assistant", "content": msg})
+                return
+
+            # Estimate the instrument time; long runs are flagged before they start
+            with open(parsed["config"], "r", encoding="utf-8") as f:
+                estimate = self.time_estimator.estimate_config(json.load(f), parsed["args"], name=script_name)
+            if estimate is not None:
+                long_run = estimate["seconds"] > self.long_run_warning_s
+                msg = (f"[System] Warning: long run, estimated instrument time {format_estimate(estimate)} "
+                       f"(more than {format_duration(self.long_run_warning_s)})" if long_run
+                       else f"[System] Estimated instrument time: {format_estimate(estimate)}")
+                print(msg)
+                self._log("action", msg, action="run_estimate", estimated_s=estimate["seconds"], long_run=long_run)
+                self.conversation_history.append({"role": "assistant", "content": msg})
+
+            # Ensure the data directory exists; results go there if the command does not say otherwise
             os.makedirs(self.data_dir, exist_ok=True)
+            if parsed["output_dir"] is None:
+                parsed["output_dir"] = to_path(self.data_dir)
+            argv = run_argv(parsed)
+            self._log("action", f"Running command: {subprocess.list2cmdline(argv)}")
             
-            # Log the command as is - the agent should have included the output directory
-            self._log("action", f"Running command: {command}")
-            
-            result = subprocess.run(command, shell=True, check=True, capture_output=True)
+            try:
+                # Timed from when the instruments are free, not from when the run was requested
+                with self.instrument_lock:
+                    run_started_at = time.time()
+                    run_start = time.perf_counter()
+                    with self.tracer.span("subprocess", script=script_name):
+                        result = subprocess.run(argv, check=True, capture_output=True)
+            except subprocess.CalledProcessError as e:
+                self.catalog.record_experiment(self.run_dir, script_name, str(parsed["config"]), run_started_at,
+                                               time.perf_counter() - run_start, output=(e.stdout or b"").decode(),
+                                               status="error", args=parsed["args"])
+                raise
+            run_duration = time.perf_counter() - run_start
             stdout_text = result.stdout.decode()
             stderr_text = result.stderr.decode()
             out_msg = "[System] Command output:\n" + stdout_text
             if stderr_text:
                 out_msg += "\n[System] Command errors:\n" + stderr_text
+            # Compared with the estimate without the time spent waiting for the instruments
+            out_msg += f"\n[System] Run took {format_duration(max(0.0, run_duration - queue_wait(stdout_text)))}" + (
+                f" (estimated {format_duration(estimate['seconds'])})" if estimate is not None else "")
             print(out_msg)
-            self._log("action", f"RUN OUTPUT: {stdout_text}")
+            self._log("action", f"RUN OUTPUT: {stdout_text}", latency=run_duration)
             self.conversation_history.append({"role": "assistant", "content": out_msg})
+            self.catalog.record_experiment(self.run_dir, script_name, str(parsed["config"]), run_started_at,
+                                           run_duration, output=stdout_text, args=parsed["args"])
+            self.time_estimator.calibrate()
+            self.catalog.index_files(self.run_dir, self.base_dir)
+            self.artifacts.add_from_output(stdout_text)
         except Exception as e:
             err_msg = f"[System] Error running command: {str(e)}"
             print(err_msg)
@@ -490,33 +1165,29 @@ In order to execute the script, you may use one of two cases. The first case is
 
     def _action_vision(self, filepath: str):
         """
-        Analyze a plot image from the data\\ directory using the vision model, including conversation context.
+        Analyze a plot image from the data/ directory using the vision model, including conversation context.
         """
         self._log("action", f"VISION: {filepath}")
         
-        # Handle both absolute paths and relative paths
-        if not os.path.isabs(filepath):
-            # If it's just a filename, assume it's in the current run's data directory
-            if os.path.basename(filepath) == filepath:
-                filepath = os.path.join(self.data_dir, filepath)
-            # If it starts with 'projects/data/' or similar patterns, convert to the correct path
-            elif any(filepath.startswith(prefix) for prefix in ['projects/data/', 'projects\\data\\', 'data/', 'data\\']):
-                plot_filename = os.path.basename(filepath)
-                filepath = os.path.join(self.data_dir, plot_filename)
-            # Handle paths that might be in the format projects/NVExperiment/runs/run_*/data/
-            elif 'NVExperiment/runs/' in filepath.replace('\\', '/') or 'data' in filepath:
-                # Try to extract just the filename if it's a complex path
-                plot_filename = os.path.basename(filepath)
-                filepath = os.path.join(self.data_dir, plot_filename)
-        
+        # Relative paths (a bare file name, data/..., projects/NVExperiment/runs/run_*/data/...)
+        # refer to a plot in the current run's data directory
+        path = to_path(filepath)
+        if not path.is_absolute() and (len(path.parts) == 1 or "data" in path.parts or "runs" in path.parts):
+            path = to_path(self.data_dir) / path.name
+        filepath = str(path)
+
         # Check if the file is in the allowed data directory
-        if not filepath.startswith(self.data_dir):
+        if not is_within(path, self.data_dir):
             msg = f"[System] VISION denied: {filepath} is not in the allowed data directory ({self.data_dir})."
             print(msg)
             self._log("action", msg)
             self.conversation_history.append({"role": "assistant", "content": msg})
             return
             
+        if not os.path.exists(filepath) and os.path.exists(filepath + ".pending"):
+            self._render_pending_plot(filepath)
+            self.artifacts.add(filepath)
+
         if not os.path.exists(filepath):
             msg = f"[System] File not found: {filepath}"
             print(msg)
@@ -525,26 +1196,40 @@ In order to execute the script, you may use one of two cases. The first case is
             return
 
         vision_context = self._build_vision_context()
-        analysis = call_vision(filepath, additional_context=vision_context)
+        vision_start = time.perf_counter()
+        with self.tracer.span("call_vision", plot=os.path.basename(filepath)):
+            analysis = call_vision(filepath, additional_context=vision_context)
+        self.tracer.count("vision_bytes_sent", os.path.getsize(filepath))
         msg = f"[System] Vision analysis result:\n{analysis}"
         print(msg)
-        self._log("action", msg)
+        self._log("action", msg, action="vision_result", latency=time.perf_counter() - vision_start)
+        self.artifacts.mark_analyzed(filepath, analysis)
+        self.vision_events.append({"plot": filepath, "result": analysis, "timestamp": self._current_timestamp()})
         self.conversation_history.append({"role": "assistant", "content": msg})
     
+    def _render_pending_plot(self, plot_path: str):
+        """
+        Render a plot the experiment runner deferred (it left a `.pending` marker
+        next to the plot path) so it can be analyzed right away.
+        """
+        marker_path = plot_path + ".pending"
+        render_script = os.path.join(self.default_dir, "scripts", "render_plot.py")
+        print(f"[System] Rendering deferred plot: {plot_path}")
+        self._log("action", f"RENDER PENDING PLOT: {plot_path}")
+        with self.tracer.span("subprocess", script="render_plot"):
+            result = subprocess.run([sys.executable, render_script, "--marker", marker_path], capture_output=True)
+        if result.returncode != 0 and not os.path.exists(plot_path):
+            self._log("action", f"RENDER FAILED: {result.stderr.decode(errors='replace')}")
+
     def _get_available_plots(self):
         """
-        Scan the data directory for plot files and return their paths.
-        
+        Return the paths of this run's plots from the artifact index.
+        Plots the runner deferred are listed too; they are rendered on first vision request.
+
         Returns:
             List of plot file paths
         """
-        plot_files = []
-        if os.path.exists(self.data_dir):
-            for filename in os.listdir(self.data_dir):
-                if filename.endswith('.png') and any(plot_type in filename for plot_type in 
-                                                  ['ESR', 'FindNV', 'GalvoScan', 'Optimization']):
-                    plot_files.append(os.path.join(self.data_dir, filename))
-        return plot_files
+        return [entry["path"] for entry in self.artifacts.plots()]
     
     def _get_relevant_plots(self, query):
         """
@@ -556,8 +1241,6 @@ In order to execute the script, you may use one of two cases. The first case is
         Returns:
             List of relevant plot paths
         """
-        relevant_plots = []
-        
         # Define keywords for each plot type
         plot_keywords = {
             'ESR': ['esr', 'electron spin resonance', 'frequency', 'spectrum'],
@@ -573,16 +1256,8 @@ In order to execute the script, you may use one of two cases. The first case is
             if any(keyword in query_lower for keyword in keywords):
                 matching_types.append(plot_type)
         
-        # Get all plots in the data directory
-        available_plots = self._get_available_plots()
-        
-        # Filter for relevant plots
-        for plot_path in available_plots:
-            plot_filename = os.path.basename(plot_path)
-            if any(plot_type in plot_filename for plot_type in matching_types) or not matching_types:
-                relevant_plots.append(plot_path)
-        
-        return relevant_plots
+        # All plots if no type matched
+        return [entry["path"] for entry in self.artifacts.plots(matching_types or None)]
     
     def _track_analyzed_plots(self):
         """
@@ -591,23 +1266,7 @@ In order to execute the script, you may use one of two cases. The first case is
         Returns:
             Dictionary mapping plot filenames to their analysis status
         """
-        analyzed_plots = {}
-        
-        # Get all plots in the data directory
-        available_plots = self._get_available_plots()
-        for plot_path in available_plots:
-            plot_filename = os.path.basename(plot_path)
-            analyzed_plots[plot_filename] = False
-        
-        # Check which plots have been analyzed
-        for turn in self.conversation_history:
-            if "VISION:" in turn.get("content", ""):
-                plot_path = turn["content"].split("VISION:")[1].strip()
-                plot_filename = os.path.basename(plot_path)
-                if plot_filename in analyzed_plots:
-                    analyzed_plots[plot_filename] = True
-        
-        return analyzed_plots
+        return {entry["filename"]: entry["analyzed"] for entry in self.artifacts.plots()}
     
     def _suggest_unanalyzed_plots(self):
         """
@@ -616,14 +1275,7 @@ In order to execute the script, you may use one of two cases. The first case is
         Returns:
             List of unanalyzed plot paths
         """
-        analyzed_plots = self._track_analyzed_plots()
-        unanalyzed_plots = []
-        
-        for plot_filename, analyzed in analyzed_plots.items():
-            if not analyzed:
-                unanalyzed_plots.append(os.path.join(self.data_dir, plot_filename))
-        
-        return unanalyzed_plots
+        return [entry["path"] for entry in self.artifacts.plots(analyzed=False)]
     
     def _get_rag_context(self, query, top_k=3):
         """
@@ -647,7 +1299,16 @@ In order to execute the script, you may use one of two cases. The first case is
                             for f in os.listdir(self.embeddings_dir) 
                             if f.endswith('.json')]
         
-        if not embeddings_files:
+        # Turns of this and earlier sessions embedded incrementally (session_*.vec.jsonl)
+        results = []
+        try:
+            with self.tracer.span("search_sessions"):
+                results.extend(search_sessions(query, self.embeddings_dir, embed_text, top_k=top_k))
+        except Exception as e:
+            print(f"[RAG] Error searching session embeddings: {str(e)}")
+            self._log("rag", f"Error searching session embeddings: {str(e)}")
+
+        if not embeddings_files and not results:
             print(f"[RAG] No embedding files found in {self.embeddings_dir}")
             return ""
         
@@ -655,11 +1316,11 @@ In order to execute the script, you may use one of two cases. The first case is
         self._log("rag", f"Searching {len(embeddings_files)} embedding files for query: {query}")
         
         # Search for similar contexts across all embedding files
-        results = []
         for embedding_file in embeddings_files:
             try:
                 print(f"[RAG] Searching file: {os.path.basename(embedding_file)}")
-                similar_contexts = search_similar(query, embedding_file, top_k=top_k)
+                with self.tracer.span("search_similar", file=os.path.basename(embedding_file)):
+                    similar_contexts = search_similar(query, embedding_file, top_k=top_k)
                 if similar_contexts:
                     print(f"[RAG] Found {len(similar_contexts)} relevant contexts in {os.path.basename(embedding_file)}")
                     results.extend(similar_contexts)
@@ -669,9 +1330,11 @@ In order to execute the script, you may use one of two cases. The first case is
                 print(f"[RAG] Error searching embeddings file {embedding_file}: {str(e)}")
                 self._log("rag", f"Error searching embeddings file {embedding_file}: {str(e)}")
         
-        # Sort by similarity score and take top_k
+        # Sort by similarity score and take top_k, dropping text found both in a session
+        # file and in the conversation file saved at the end of that session
         results.sort(key=lambda x: x["score"], reverse=True)
-        results = results[:top_k]
+        seen = set()
+        results = [r for r in results if not (r["text"] in seen or seen.add(r["text"]))][:top_k]
         
         # Format the results
         if not results:
@@ -700,62 +1363,66 @@ In order to execute the script, you may use one of two cases. The first case is
         
         return "\n\n".join(context_text)
     
-    def save_conversation_embeddings(self):
+    def _plot_metadata(self) -> str:
+        """The plots of this run, each marked analyzed or not by the vision events ("" if none)."""
+        available_plots = self._get_available_plots()
+        if not available_plots:
+            return ""
+        analyzed_plots = {os.path.basename(event["plot"]) for event in self.vision_events}
+        lines = ["Available plots in this session:"]
+        for plot_path in available_plots:
+            plot_filename = os.path.basename(plot_path)
+            status = "Analyzed" if plot_filename in analyzed_plots else "Not analyzed"
+            lines.append(f"- {plot_filename} ({status}): {plot_path}")
+        return "\n".join(lines)
+
+    def save_conversation_embeddings(self, background: bool = False):
         """
         Embed the entire conversation history and save to the embeddings directory.
         Also include references to any plots that were analyzed.
+
+        Args:
+            background: Do not wait for the embedding model. The session embedder has already
+                embedded every turn, so only the plot metadata is queued to it; without a session
+                embedder the conversation text is written to `conversation_<timestamp>.txt.pending`
+                and embedded in a detached worker (rag_engine.py --embed-pending).
         """
         if not self.conversation_history:
             print("[Embeddings] No conversation history to save")
             return
+
+        if background and self.session_embedder is not None:
+            self._checkpoint_turns()
+            plots = self._plot_metadata()
+            if plots:
+                self.session_embedder.append("plots", plots)
+            print(f"[Embeddings] Conversation already embedded turn by turn"
+                  + (", plot metadata queued" if plots else ""))
+            self._log("embeddings", "Queued plot metadata to the session embedder" if plots
+                      else "Conversation already embedded turn by turn")
+            return
         
         print(f"[Embeddings] Preparing to save conversation with {len(self.conversation_history)} turns")
         self._log("embeddings", f"Saving conversation with {len(self.conversation_history)} turns")
         
-        # Format conversation for embedding
+        # Format conversation for embedding and count message types in one pass
         conversation_text = []
-        
-        # Track which plots have been analyzed in this conversation
-        analyzed_plots = set()
-        
-        # Count message types for logging
         user_messages = 0
         assistant_messages = 0
-        vision_analyses = 0
-        
         for turn in self.conversation_history:
             role = turn["role"]
-            content = turn["content"]
-            conversation_text.append(f"{role}: {content}")
-            
-            # Count message types
+            conversation_text.append(f"{role}: {turn['content']}")
             if role == "user":
                 user_messages += 1
             elif role == "assistant":
                 assistant_messages += 1
-            
-            # Check if this is a vision analysis result
-            if role == "assistant" and "[System] Vision analysis result:" in content:
-                vision_analyses += 1
-                # Extract the plot filename from previous messages
-                for i in range(len(self.conversation_history)):
-                    if (i < len(self.conversation_history) - 1 and 
-                        "VISION:" in self.conversation_history[i].get("content", "")):
-                        plot_path = self.conversation_history[i]["content"].split("VISION:")[1].strip()
-                        plot_filename = os.path.basename(plot_path)
-                        analyzed_plots.add(plot_filename)
-        
-        print(f"[Embeddings] Conversation summary: {user_messages} user messages, {assistant_messages} assistant responses, {vision_analyses} vision analyses")
+
+        print(f"[Embeddings] Conversation summary: {user_messages} user messages, {assistant_messages} assistant responses, {len(self.vision_events)} vision analyses")
         
         # Add references to all plots in the data directory
-        available_plots = self._get_available_plots()
-        if available_plots:
-            print(f"[Embeddings] Including {len(available_plots)} plots in embedding data")
-            conversation_text.append("\nAvailable plots in this session:")
-            for plot_path in available_plots:
-                plot_filename = os.path.basename(plot_path)
-                status = "Analyzed" if plot_filename in analyzed_plots else "Not analyzed"
-                conversation_text.append(f"- {plot_filename} ({status}): {plot_path}")
+        plots = self._plot_metadata()
+        if plots:
+            conversation_text.append("\n" + plots)
         else:
             print("[Embeddings] No plots available to include in embedding data")
         
@@ -765,28 +1432,34 @@ In order to execute the script, you may use one of two cases. The first case is
         # Generate a timestamp for the embedding file
         timestamp = self._current_timestamp_for_filename()
         embedding_file = os.path.join(self.embeddings_dir, f"conversation_{timestamp}.json")
+
+        if background:
+            pending_file = os.path.join(self.embeddings_dir, f"conversation_{timestamp}.txt.pending")
+            try:
+                with open(pending_file + ".tmp", "w", encoding="utf-8") as f:
+                    f.write(full_text)
+                os.replace(pending_file + ".tmp", pending_file)
+                worker = os.path.join(os.path.dirname(os.path.abspath(__file__)), "rag_engine.py")
+                cmd = [sys.executable, worker, "--embed-pending", self.embeddings_dir]
+                kwargs = {"stdout": subprocess.DEVNULL, "stderr": subprocess.DEVNULL, "stdin": subprocess.DEVNULL}
+                if os.name == "nt":
+                    kwargs["creationflags"] = subprocess.DETACHED_PROCESS | subprocess.CREATE_NEW_PROCESS_GROUP
+                else:
+                    kwargs["start_new_session"] = True
+                subprocess.Popen(cmd, **kwargs)
+                print(f"[Embeddings] Conversation queued for embedding: {embedding_file}")
+                self._log("embeddings", f"Queued conversation for background embedding: {pending_file}")
+            except Exception as e:
+                print(f"[Embeddings] Error queuing embeddings: {str(e)}")
+                self._log("embeddings", f"Error queuing embeddings: {str(e)}")
+            return
         
         # Save the embeddings
         try:
-            # Count existing embedding files before saving
-            existing_files = [f for f in os.listdir(self.embeddings_dir) if f.endswith('.json')]
-            print(f"[Embeddings] Current embedding files count: {len(existing_files)}")
-            
-            # Save the new embeddings
             save_embeddings(full_text, embedding_file)
-            
-            # Verify the file was created
             if os.path.exists(embedding_file):
                 print(f"[Embeddings] Successfully saved conversation to {embedding_file}")
                 self._log("embeddings", f"Successfully saved conversation to {embedding_file}")
-                
-                # Count embedding files after saving to confirm a new one was added
-                updated_files = [f for f in os.listdir(self.embeddings_dir) if f.endswith('.json')]
-                print(f"[Embeddings] Updated embedding files count: {len(updated_files)}")
-                if len(updated_files) > len(existing_files):
-                    print("[Embeddings] Confirmed: New embedding file was created")
-                else:
-                    print("[Embeddings] Warning: No new embedding file was created")
             else:
                 print(f"[Embeddings] Warning: Failed to verify creation of {embedding_file}")
         except Exception as e:
@@ -795,9 +1468,18 @@ In order to execute the script, you may use one of two cases. The first case is
 
 
 if __name__ == "__main__":
-    agent = NVExperimentAgent()
+    # NV_AGENT_TRACE=1 writes spans to logs/trace_<ts>.jsonl; NV_AGENT_METRICS_PORT also serves /metrics
+    metrics_port = os.environ.get("NV_AGENT_METRICS_PORT")
+    # NV_AGENT_PLAN_CANDIDATES=N compares N concurrent responses per step (see plan_explorer)
+    agent = NVExperimentAgent(trace=os.environ.get("NV_AGENT_TRACE") == "1",
+                              metrics_port=int(metrics_port) if metrics_port else None,
+                              plan_candidates=int(os.environ.get("NV_AGENT_PLAN_CANDIDATES", 1)))
+    # NV_AGENT_AUTONOMOUS=1 runs every message as an autonomous task (see run_autonomous);
+    # otherwise prefix a message with /auto
+    autonomous = os.environ.get("NV_AGENT_AUTONOMOUS") == "1"
+    max_steps = int(os.environ.get("NV_AGENT_MAX_STEPS", DEFAULT_MAX_STEPS))
     print("=== NV Experiment Agent CLI ===")
-    print("Type 'exit' to quit.\n")
+    print("Type 'exit' to quit, '/auto <task>' to let the agent work on a task without prompting after each step.\n")
     
     # Print information about the embeddings directory
     print(f"[Embeddings] Using embeddings directory: {agent.embeddings_dir}")
@@ -813,20 +1495,26 @@ if __name__ == "__main__":
             user_in = input("You: ")
             if user_in.lower() in ["quit", "exit"]:
                 print("\n[Embeddings] Saving conversation embeddings and plot metadata before exit...")
-                agent.save_conversation_embeddings()
+                agent.save_conversation_embeddings(background=True)
                 print("Goodbye!")
                 break
-            agent.handle_user_input(user_in)
+            if autonomous or user_in.startswith("/auto "):
+                agent.run_autonomous(user_in[len("/auto "):] if user_in.startswith("/auto ") else user_in,
+                                     max_steps=max_steps)
+            else:
+                agent.handle_user_input(user_in)
     except KeyboardInterrupt:
         print("\n\n[Embeddings] Detected keyboard interrupt. Saving conversation embeddings before exit...")
-        agent.save_conversation_embeddings()
+        agent.save_conversation_embeddings(background=True)
         print("Goodbye!")
     except Exception as e:
         print(f"\n\n[Error] An unexpected error occurred: {str(e)}")
         print("[Embeddings] Attempting to save conversation embeddings before exit...")
         try:
-            agent.save_conversation_embeddings()
+            agent.save_conversation_embeddings(background=True)
         except Exception as save_error:
             print(f"[Embeddings] Failed to save embeddings: {str(save_error)}")
         print("Goodbye!")
+    finally:
+        agent.close()
 
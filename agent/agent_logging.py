@@ -0,0 +1,175 @@
+import os
+import re
+import json
+import queue
+import atexit
+import threading
+from datetime import datetime
+
+FSYNC_POLICIES = ("never", "batch", "always")
+
+# Legacy free-text entries: "[2025-05-14 08:29:41] USER: message" (continuation lines follow)
+LEGACY_LINE = re.compile(r"^\[(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2})\] ([A-Z_]+): ?(.*)$")
+# Action type from messages like "READ: path", "RUN OUTPUT: ...", "(ASK PERMISSION) ..."
+ACTION_PREFIX = re.compile(r"^\(?([A-Z][A-Z _]*[A-Z])\)?:?\s")
+
+_STOP = object()
+
+
+def infer_action(content: str):
+    """
+    Derive an action type ("read", "run_output", "ask_permission", ...) from the
+    upper-case prefix the agent puts on action log messages.
+    """
+    m = ACTION_PREFIX.match(content or "")
+    if not m:
+        return None
+    return m.group(1).strip().lower().replace(" ", "_")
+
+
+class StructuredLogWriter:
+    """
+    Background JSON-lines log writer.
+
+    Records are queued by write() and written by a single thread that keeps the
+    file open, so logging never blocks the agent on disk I/O. The queue is
+    drained in batches; each batch is flushed to the OS together.
+
+    Args:
+        path: Log file path (JSON lines).
+        run_id: Identifier stored in every record (the agent's run directory name).
+        fsync: "never" (flush to the OS only), "batch" (fsync after every batch)
+            or "always" (fsync after every record).
+        batch_size: Maximum number of records written per batch.
+        flush_interval: Seconds the writer waits for more records before flushing a partial batch.
+    """
+
+    def __init__(self, path: str, run_id: str = None, fsync: str = "batch",
+                 batch_size: int = 64, flush_interval: float = 0.5):
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"fsync must be one of {FSYNC_POLICIES}, got {fsync!r}")
+        self.path = path
+        self.run_id = run_id
+        self.fsync = fsync
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue()
+        self._closed = False
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._fh = open(path, "a", encoding="utf-8")
+        self._thread = threading.Thread(target=self._run, name="agent-log-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def write(self, role: str, content: str, action: str = None, latency: float = None, **fields):
+        """
+        Queue one record. Returns immediately.
+        """
+        if self._closed:
+            return
+        record = {
+            "ts": datetime.now().isoformat(timespec="milliseconds"),
+            "run_id": self.run_id,
+            "role": role,
+            "action": action,
+            "latency_s": round(latency, 4) if latency is not None else None,
+            "content": content,
+        }
+        record.update(fields)
+        self._queue.put(record)
+
+    def flush(self, timeout: float = 5.0):
+        """
+        Block until every record queued so far has been written.
+        """
+        if self._closed:
+            return
+        done = threading.Event()
+        self._queue.put(done)
+        done.wait(timeout)
+
+    def close(self):
+        """
+        Write out everything still queued and close the file.
+        """
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(_STOP)
+        self._thread.join(timeout=10)
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            batch = [self._queue.get()]
+            try:
+                while len(batch) < self.batch_size:
+                    batch.append(self._queue.get(timeout=self.flush_interval))
+            except queue.Empty:
+                pass
+
+            waiters = []
+            for item in batch:
+                if item is _STOP:
+                    stopping = True
+                elif isinstance(item, threading.Event):
+                    waiters.append(item)
+                else:
+                    self._fh.write(json.dumps(item, ensure_ascii=False, default=str) + "\n")
+                    if self.fsync == "always":
+                        self._fh.flush()
+                        os.fsync(self._fh.fileno())
+            self._fh.flush()
+            if self.fsync == "batch":
+                os.fsync(self._fh.fileno())
+            for waiter in waiters:
+                waiter.set()
+        self._fh.close()
+
+
+def parse_log(path: str):
+    """
+    Read an agent log, either JSON lines written by StructuredLogWriter or a legacy
+    free-text `agent_history_*.log` file, and yield records in the structured format.
+
+    Legacy entries have no run id or latency; the run id is derived from the file name
+    when possible, and the action type is inferred from the message prefix.
+    """
+    legacy_run_id = None
+    m = re.search(r"agent_history_(\d{8}_\d{6})", os.path.basename(path))
+    if m:
+        legacy_run_id = f"run_{m.group(1)}"
+
+    current = None
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        for line in f:
+            stripped = line.rstrip("\n")
+            if stripped.startswith("{"):
+                try:
+                    record = json.loads(stripped)
+                except json.JSONDecodeError:
+                    record = None
+                if isinstance(record, dict) and "role" in record:
+                    if current is not None:
+                        yield current
+                        current = None
+                    yield record
+                    continue
+            m = LEGACY_LINE.match(stripped)
+            if m:
+                if current is not None:
+                    yield current
+                ts, role, content = m.groups()
+                role = role.lower()
+                current = {
+                    "ts": datetime.strptime(ts, "%Y-%m-%d %H:%M:%S").isoformat(timespec="milliseconds"),
+                    "run_id": legacy_run_id,
+                    "role": role,
+                    "action": infer_action(content) if role == "action" else None,
+                    "latency_s": None,
+                    "content": content,
+                }
+            elif current is not None:
+                current["content"] += "\n" + stripped
+    if current is not None:
+        yield current
@@ -0,0 +1,128 @@
+"""
+OS-independent paths and run commands for the agent.
+
+Paths reach the agent with either separator: the system prompt, the LLM and the logs
+recorded on the lab PC all mix "projects\\NVExperiment\\configs\\x.json" and
+"projects/NVExperiment/configs/x.json". Every path from an action goes through
+to_path(), which accepts both, and directory permissions are checked on resolved paths
+with is_within() rather than by string prefix.
+
+Run actions are parsed into their parts (script, config, output directory, other runner
+arguments) and executed as an argument list with the agent's own interpreter, so no
+shell is involved and the same command works on Windows, macOS and Linux:
+
+    parsed = parse_run_command(r"py projects\\NVExperiment\\scripts\\ESR.py --config c.json --sweep adaptive")
+    subprocess.run(run_argv(parsed), capture_output=True)
+
+Usage (show how a command is parsed):
+  python agent_paths.py "py projects\\NVExperiment\\scripts\\ESR.py --config c.json --output-dir d"
+"""
+import os
+import sys
+import shlex
+import argparse
+from pathlib import Path
+
+RUN_SCRIPTS = ("ESR", "find_nv", "galvo_scan", "optimize")
+
+# Accepted in front of the script; the command always runs with sys.executable
+INTERPRETERS = ("py", "py3", "python", "python3", "python.exe", "python3.exe", "py.exe")
+
+
+def to_path(text) -> Path:
+    """A Path from a string with / or \\ separators (Paths are returned unchanged)."""
+    if isinstance(text, Path):
+        return text
+    return Path(str(text).strip().replace("\\", "/"))
+
+
+def prompt_path(path) -> str:
+    """A path as written in prompts and messages: forward slashes, which every OS accepts."""
+    return to_path(path).as_posix()
+
+
+def is_within(path, *directories) -> bool:
+    """Whether `path` is inside (or is) one of `directories`, after resolving both."""
+    target = to_path(path).resolve()
+    for directory in directories:
+        try:
+            target.relative_to(to_path(directory).resolve())
+            return True
+        except ValueError:
+            continue
+    return False
+
+
+def _is_interpreter(token: str) -> bool:
+    name = os.path.basename(token).lower()
+    return name in INTERPRETERS or token == sys.executable
+
+
+def parse_run_command(command: str) -> dict:
+    """
+    Parse a run action.
+
+    Args:
+        command: "[py|python] <path>/<script>.py --config <file> [--output-dir <dir>] [runner options]",
+            with either path separator; paths with spaces must be quoted.
+
+    Returns:
+        Dict with "name" (e.g. "ESR"), "script", "config" and "output_dir" (Paths; output_dir
+        may be None) and "args" (the remaining runner arguments, in order).
+
+    Raises:
+        ValueError: If the command does not have this form.
+    """
+    usage = (f"Run command parsing error for command: '{command}'.\nCommand must be in the format: "
+             f"python projects/NVExperiment/scripts/<script_name>.py --config <config_file> "
+             f"[--output-dir <output_directory>] [options]\nwhere <script_name> is one of "
+             f"{', '.join(s + '.py' for s in RUN_SCRIPTS)}")
+    try:
+        tokens = shlex.split(str(command).replace("\\", "/"))
+    except ValueError:
+        raise ValueError(usage)
+    if tokens and _is_interpreter(tokens[0]):
+        tokens = tokens[1:]
+    if not tokens or not tokens[0].endswith(".py") or to_path(tokens[0]).stem not in RUN_SCRIPTS:
+        raise ValueError(usage)
+
+    parsed = {"name": to_path(tokens[0]).stem, "script": to_path(tokens[0]),
+              "config": None, "output_dir": None, "args": []}
+    rest = iter(tokens[1:])
+    for token in rest:
+        option, _, value = token.partition("=")
+        if option in ("--config", "--output-dir"):
+            value = value or next(rest, "")
+            if not value or value.startswith("--"):
+                raise ValueError(f"{usage}\n{option} needs a value.")
+            parsed["config" if option == "--config" else "output_dir"] = to_path(value)
+        else:
+            parsed["args"].append(token)
+    if parsed["config"] is None:
+        raise ValueError(usage)
+    return parsed
+
+
+def run_argv(parsed: dict, python: str = None) -> list:
+    """The argument list that runs a parsed command with `python` (default: sys.executable)."""
+    argv = [python or sys.executable, str(parsed["script"]), "--config", str(parsed["config"])]
+    if parsed.get("output_dir") is not None:
+        argv += ["--output-dir", str(parsed["output_dir"])]
+    return argv + list(parsed.get("args", []))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Show how the agent parses a run command")
+    parser.add_argument("command", help="Run action content")
+    args = parser.parse_args()
+    try:
+        parsed = parse_run_command(args.command)
+    except ValueError as e:
+        print(e)
+        sys.exit(1)
+    print(f"script: {parsed['name']} ({parsed['script']})")
+    print(f"argv:   {run_argv(parsed)}")
+
+
+if __name__ == "__main__":
+    main()
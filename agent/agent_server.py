@@ -0,0 +1,386 @@
+#!/usr/bin/env python3
+"""
+Local multi-session server for the agent.
+
+Hosts many agent sessions in one process. Each session is its own NVExperimentAgent
+(conversation, run directory, logs and permission tally), while the
+expensive parts are shared:
+  - the embedding model and the RAG indexes (process-wide in rag_engine and session_embeddings),
+  - the LLM client and its connection pool (anthropic_engine.get_client),
+  - the run catalog, the config validator and the config store (whose refs.json all
+    sessions update),
+  - one instrument lock, so experiments from different sessions run one at a time.
+
+Turns run in a thread pool; a session handles one turn at a time, different sessions in
+parallel. Nobody can be asked on the server console, so permission requests are decided
+by the permission policy ("ask" rules are denied).
+
+HTTP (JSON bodies and responses):
+  POST   /sessions                   create a session -> {"session", "run_dir"}
+  GET    /sessions                   list sessions
+  POST   /sessions/<id>/messages     {"message": "..."} -> turn result; with "autonomous": true
+                                     (optional "max_steps", "time_budget_s") the agent keeps
+                                     acting on its results until done (run_autonomous)
+  GET    /sessions/<id>/history      conversation history
+  DELETE /sessions/<id>              close a session
+  GET    /status                     sessions, running turns, instrument state
+WebSocket:
+  /sessions/<id>/ws                  send {"message": "..."}, receive {"type": "turn", ...}
+
+A turn result is {"turn", "actions" (action types), "history" (entries the turn added),
+"duration_s"}; autonomous turns add "status" and "steps" (per-step actions and latencies).
+
+Usage:
+  py agent/agent_server.py [--host 127.0.0.1] [--port 8765] [--workers 8] [--max-sessions 16] [--policy policy.json]
+"""
+import os
+import re
+import json
+import time
+import uuid
+import base64
+import struct
+import asyncio
+import hashlib
+import argparse
+import functools
+import itertools
+import threading
+from http import HTTPStatus
+from concurrent.futures import ThreadPoolExecutor
+
+from agent import NVExperimentAgent, DEFAULT_MAX_STEPS, DEFAULT_TIME_BUDGET_S
+from run_catalog import RunCatalog
+from config_schema import ConfigValidator
+from config_store import ConfigStore
+from permission_policy import PermissionPolicy
+
+DEFAULT_PORT = 8765
+MAX_BODY = 1 << 20
+WS_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+SESSION_ROUTE = re.compile(r"^/sessions/(?P<id>[0-9a-f]+)(?P<sub>/messages|/history|/ws)?/?$")
+
+
+class HTTPError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+class Session:
+    """One agent and the bookkeeping the server needs for it."""
+
+    def __init__(self, session_id: str, agent: NVExperimentAgent):
+        self.id = session_id
+        self.agent = agent
+        self.lock = asyncio.Lock()
+        self.created = time.time()
+        self.last_active = self.created
+        self.turns = 0
+
+    def info(self) -> dict:
+        return {"session": self.id, "run_dir": self.agent.base_dir, "turns": self.turns,
+                "busy": self.lock.locked(), "created": self.created, "last_active": self.last_active}
+
+
+class AgentServer:
+    """
+    Session registry plus the shared resources handed to every agent.
+
+    Args:
+        policy: Permission policy dictionary (permission_policy.DEFAULT_POLICY if None).
+        workers: Threads running turns (at most this many turns run at once).
+        max_sessions: Limit on open sessions.
+    """
+
+    def __init__(self, policy: dict = None, workers: int = 8, max_sessions: int = 16):
+        default_dir = os.path.join("projects", "NVExperiment")
+        self.policy = policy
+        self.max_sessions = max_sessions
+        self.sessions = {}
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="agent-turn")
+        self.catalog = RunCatalog(os.path.join(default_dir, "run_catalog.sqlite"))
+        self.catalog.backfill(os.path.join(default_dir, "runs"))
+        self.config_validator = ConfigValidator(os.path.join(default_dir, "configs"))
+        self.config_store = ConfigStore(os.path.join(default_dir, "config_store"), os.path.join(default_dir, "configs"))
+        self.instrument_lock = threading.Lock()
+        self._running_turns = 0
+
+    async def _in_thread(self, fn, *args, **kwargs):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, functools.partial(fn, *args, **kwargs))
+
+    # ------------------------------------------------------------------ sessions
+
+    async def create_session(self) -> Session:
+        if len(self.sessions) >= self.max_sessions:
+            raise HTTPError(503, f"Session limit ({self.max_sessions}) reached")
+        session_id = uuid.uuid4().hex[:8]
+        agent = await self._in_thread(
+            NVExperimentAgent, interactive=False, run_suffix=session_id,
+            permission_policy=PermissionPolicy(self.policy, validator=self.config_validator),
+            catalog=self.catalog, config_validator=self.config_validator, instrument_lock=self.instrument_lock,
+            config_store=self.config_store)
+        session = Session(session_id, agent)
+        self.sessions[session_id] = session
+        print(f"[Server] Session {session_id} opened ({agent.base_dir})")
+        return session
+
+    def get_session(self, session_id: str) -> Session:
+        session = self.sessions.get(session_id)
+        if session is None:
+            raise HTTPError(404, f"No session {session_id}")
+        return session
+
+    async def run_turn(self, session: Session, message: str, options: dict = None) -> dict:
+        """
+        Run one turn of a session in the thread pool and return what it added.
+        options: the request body; "autonomous", "max_steps" and "time_budget_s" select an
+        autonomous turn.
+        """
+        options = options or {}
+        if not isinstance(message, str) or not message.strip():
+            raise HTTPError(400, 'Expected {"message": "<text>"}')
+        try:
+            max_steps = int(options.get("max_steps", DEFAULT_MAX_STEPS))
+            time_budget_s = float(options.get("time_budget_s", DEFAULT_TIME_BUDGET_S))
+        except (TypeError, ValueError):
+            raise HTTPError(400, '"max_steps" and "time_budget_s" must be numbers')
+        async with session.lock:
+            if self.sessions.get(session.id) is not session:
+                raise HTTPError(410, f"Session {session.id} was closed")
+            agent = session.agent
+            before = len(agent.conversation_history)
+            start = time.perf_counter()
+            self._running_turns += 1
+            extra = {}
+            try:
+                if options.get("autonomous"):
+                    result = await self._in_thread(agent.run_autonomous, message,
+                                                   max_steps=max_steps, time_budget_s=time_budget_s)
+                    action_types = [a_type for step in result["steps"] for a_type in step["actions"]]
+                    extra = {"status": result["status"], "steps": result["steps"]}
+                else:
+                    action_types = await self._in_thread(agent.handle_user_input, message)
+            finally:
+                self._running_turns -= 1
+            session.turns += 1
+            session.last_active = time.time()
+            return {"session": session.id, "turn": session.turns, "actions": action_types,
+                    "history": agent.conversation_history[before:], "duration_s": time.perf_counter() - start,
+                    **extra}
+
+    async def close_session(self, session_id: str):
+        session = self.get_session(session_id)
+        async with session.lock:
+            self.sessions.pop(session_id, None)
+            await self._in_thread(session.agent.save_conversation_embeddings, background=True)
+            await self._in_thread(session.agent.close)
+        print(f"[Server] Session {session_id} closed")
+
+    def status(self) -> dict:
+        return {"sessions": len(self.sessions), "max_sessions": self.max_sessions,
+                "running_turns": self._running_turns, "instrument_busy": self.instrument_lock.locked()}
+
+    async def shutdown(self):
+        for session_id in list(self.sessions):
+            await self.close_session(session_id)
+        self.executor.shutdown(wait=True)
+        self.catalog.close()
+
+    # ------------------------------------------------------------------ HTTP
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            request = await _read_request(reader)
+            if request is None:
+                return
+            method, path, headers, body = request
+            m = SESSION_ROUTE.match(path)
+            if m and m.group("sub") == "/ws" and headers.get("upgrade", "").lower() == "websocket":
+                session = self.get_session(m.group("id"))
+                await self._websocket(session, headers, reader, writer)
+                return
+            status, payload = await self._route(method, path, m, body)
+        except HTTPError as e:
+            status, payload = e.status, {"error": e.message}
+        except (asyncio.IncompleteReadError, ConnectionError):
+            writer.close()
+            return
+        except Exception as e:
+            status, payload = 500, {"error": f"{type(e).__name__}: {e}"}
+        _write_response(writer, status, payload)
+        try:
+            await writer.drain()
+        except ConnectionError:
+            pass
+        writer.close()
+
+    async def _route(self, method, path, m, body):
+        if path.rstrip("/") == "/status" and method == "GET":
+            return 200, self.status()
+        if path.rstrip("/") == "/sessions":
+            if method == "POST":
+                session = await self.create_session()
+                return 201, session.info()
+            if method == "GET":
+                return 200, [s.info() for s in self.sessions.values()]
+        if m:
+            session_id, sub = m.group("id"), m.group("sub")
+            if sub is None and method == "GET":
+                return 200, self.get_session(session_id).info()
+            if sub is None and method == "DELETE":
+                await self.close_session(session_id)
+                return 200, {"session": session_id, "closed": True}
+            if sub == "/history" and method == "GET":
+                return 200, self.get_session(session_id).agent.conversation_history
+            if sub == "/messages" and method == "POST":
+                session = self.get_session(session_id)
+                request = _json_body(body)
+                return 200, await self.run_turn(session, request.get("message"), request)
+        raise HTTPError(404 if method in ("GET", "POST", "DELETE") else 405, f"No route for {method} {path}")
+
+    # ------------------------------------------------------------------ WebSocket
+
+    async def _websocket(self, session, headers, reader, writer):
+        key = headers.get("sec-websocket-key")
+        if not key:
+            raise HTTPError(400, "Missing Sec-WebSocket-Key")
+        accept = base64.b64encode(hashlib.sha1((key + WS_GUID).encode("ascii")).digest()).decode("ascii")
+        writer.write(("HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+                      f"Sec-WebSocket-Accept: {accept}\r\n\r\n").encode("ascii"))
+        await writer.drain()
+        try:
+            while True:
+                opcode, payload = await _ws_receive(reader)
+                if opcode == 0x8:   # close
+                    writer.write(_ws_frame(0x8, payload[:2]))
+                    break
+                if opcode == 0x9:   # ping
+                    writer.write(_ws_frame(0xA, payload))
+                elif opcode == 0x1:
+                    try:
+                        request = _json_body(payload)
+                        result = await self.run_turn(session, request.get("message"), request)
+                        reply = {"type": "turn", **result}
+                    except HTTPError as e:
+                        reply = {"type": "error", "error": e.message}
+                    except Exception as e:
+                        reply = {"type": "error", "error": f"{type(e).__name__}: {e}"}
+                    writer.write(_ws_frame(0x1, json.dumps(reply, default=str).encode("utf-8")))
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+
+def _json_body(body: bytes) -> dict:
+    try:
+        data = json.loads(body.decode("utf-8") or "{}")
+    except (UnicodeDecodeError, json.JSONDecodeError):
+        raise HTTPError(400, "Body must be JSON")
+    if not isinstance(data, dict):
+        raise HTTPError(400, "Body must be a JSON object")
+    return data
+
+
+async def _read_request(reader):
+    line = await reader.readline()
+    if not line:
+        return None
+    parts = line.decode("latin-1").split()
+    if len(parts) < 2:
+        raise HTTPError(400, "Malformed request line")
+    method, target = parts[0].upper(), parts[1]
+    headers = {}
+    while True:
+        header = await reader.readline()
+        if header in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = header.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    length = int(headers.get("content-length") or 0)
+    if length > MAX_BODY:
+        raise HTTPError(413, "Body too large")
+    body = await reader.readexactly(length) if length else b""
+    return method, target.split("?", 1)[0], headers, body
+
+
+def _write_response(writer, status: int, payload):
+    body = json.dumps(payload, default=str).encode("utf-8")
+    head = (f"HTTP/1.1 {status} {HTTPStatus(status).phrase}\r\nContent-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n")
+    writer.write(head.encode("ascii") + body)
+
+
+async def _ws_receive(reader):
+    """Read one (possibly fragmented) message; returns (opcode, payload)."""
+    message_opcode, parts = None, []
+    while True:
+        first, second = await reader.readexactly(2)
+        fin, opcode = first & 0x80, first & 0x0F
+        length = second & 0x7F
+        if length == 126:
+            length = struct.unpack("!H", await reader.readexactly(2))[0]
+        elif length == 127:
+            length = struct.unpack("!Q", await reader.readexactly(8))[0]
+        if length > MAX_BODY:
+            raise ValueError("WebSocket frame too large")
+        mask = await reader.readexactly(4) if second & 0x80 else None
+        payload = await reader.readexactly(length)
+        if mask:
+            payload = bytes(b ^ m for b, m in zip(payload, itertools.cycle(mask)))
+        if opcode >= 0x8:   # control frames are never fragmented
+            return opcode, payload
+        if opcode:
+            message_opcode = opcode
+        parts.append(payload)
+        if fin:
+            return message_opcode, b"".join(parts)
+
+
+def _ws_frame(opcode: int, payload: bytes) -> bytes:
+    n = len(payload)
+    if n < 126:
+        header = struct.pack("!BB", 0x80 | opcode, n)
+    elif n < 1 << 16:
+        header = struct.pack("!BBH", 0x80 | opcode, 126, n)
+    else:
+        header = struct.pack("!BBQ", 0x80 | opcode, 127, n)
+    return header + payload
+
+
+async def serve(host: str, port: int, server: AgentServer):
+    listener = await asyncio.start_server(server.handle_connection, host, port)
+    print(f"[Server] Listening on http://{host}:{port} (sessions: POST /sessions)")
+    try:
+        async with listener:
+            await listener.serve_forever()
+    finally:
+        await server.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve many agent sessions from one process")
+    parser.add_argument("--host", default="127.0.0.1", help="Interface to listen on (default: local only)")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--workers", type=int, default=8, help="Turns that can run at the same time")
+    parser.add_argument("--max-sessions", type=int, default=16)
+    parser.add_argument("--policy", default=None, help="Permission policy JSON (default: permission_policy.DEFAULT_POLICY)")
+    args = parser.parse_args()
+
+    policy = None
+    if args.policy:
+        with open(args.policy, "r", encoding="utf-8") as f:
+            policy = json.load(f)
+    server = AgentServer(policy=policy, workers=args.workers, max_sessions=args.max_sessions)
+    try:
+        asyncio.run(serve(args.host, args.port, server))
+    except KeyboardInterrupt:
+        print("\n[Server] Stopped.")
+
+
+if __name__ == "__main__":
+    main()
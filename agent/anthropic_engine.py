@@ -4,6 +4,7 @@ import anthropic
 import base64
 from mimetypes import guess_type
 import os
+import threading
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -15,6 +16,23 @@ ANTHROPIC_API_KEY = os.environ["ANTHROPIC_API_KEY"]
 DEFAULT_MODEL = "claude-3-5-sonnet-20241022"
 sonnet_new = "claude-3-7-sonnet-20250219"
 
+_client = None
+_client_lock = threading.Lock()
+_local = threading.local()
+
+
+def get_client():
+    """
+    One client per process: its HTTP connection pool is reused by every call,
+    including calls from concurrent sessions (the client is thread-safe).
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = anthropic.Anthropic(api_key=ANTHROPIC_API_KEY)
+    return _client
+
 def call_llm(
     user_prompt: str,
     system_message: str = "You are a helpful assistant to atomic physicist.",
@@ -36,7 +54,7 @@ def call_llm(
       The LLM's text completion/response as a Python string.
     """
 
-    client = anthropic.Anthropic(api_key=ANTHROPIC_API_KEY)
+    client = get_client()
 
     # The method name `client.messages.create(...)` and the parameter structure 
     # may differ depending on your library version. 
@@ -62,16 +80,73 @@ def call_llm(
         ]
     )
 
+    _record_usage(response)
+
     # The returned object presumably has a 'content' attribute for the text:
     return response.content[0].text
 
 
+def call_llm_tools(
+    user_prompt: str,
+    tools,
+    system_message: str = "You are a helpful assistant to atomic physicist.",
+    model: str = DEFAULT_MODEL,
+    max_tokens: int = 1024,
+    temperature: float = 0.7
+) -> dict:
+    """
+    Like call_llm, but offers the model tools and returns its tool calls as well.
+
+    Args:
+      user_prompt: The text from the user.
+      tools: Tool definitions ({"name", "description", "input_schema"}), e.g. action_protocol.ACTION_TOOLS.
+      system_message, model, max_tokens, temperature: As for call_llm.
+
+    Returns:
+      {"text": the text blocks joined, "tool_calls": [{"id", "name", "input"}, ...] in order}.
+    """
+    response = get_client().messages.create(
+        model=model,
+        max_tokens=max_tokens,
+        temperature=temperature,
+        system=system_message,
+        tools=tools,
+        messages=[{"role": "user", "content": [{"type": "text", "text": user_prompt}]}],
+    )
+    _record_usage(response)
+    text, tool_calls = [], []
+    for block in response.content:
+        if block.type == "text":
+            text.append(block.text)
+        elif block.type == "tool_use":
+            tool_calls.append({"id": block.id, "name": block.name, "input": block.input})
+    return {"text": "\n".join(text), "tool_calls": tool_calls}
+
+
+def _record_usage(response):
+    # Token usage of this thread's last call, read by the agent's tracing
+    usage = getattr(response, "usage", None)
+    _local.usage = None if usage is None else {
+        "input_tokens": getattr(usage, "input_tokens", 0),
+        "output_tokens": getattr(usage, "output_tokens", 0),
+    }
+
+
+def last_usage():
+    """Token usage ({"input_tokens", "output_tokens"}) of the calling thread's last call_llm, or None."""
+    return getattr(_local, "usage", None)
+
+
+call_llm.last_usage = last_usage
+call_llm_tools.last_usage = last_usage
+
+
 def call_vision(image_path: str, additional_context: str = "Describe this image.") -> str:
     """
     Reads an image, encodes it in base64, determines its media type,
     and calls Anthropic's vision interface with an additional text prompt that includes conversation context.
     """
-    client = anthropic.Anthropic(api_key=ANTHROPIC_API_KEY)
+    client = get_client()
     with open(image_path, "rb") as img_file:
         image_data = img_file.read()
     encoded_data = base64.standard_b64encode(image_data).decode('utf-8')
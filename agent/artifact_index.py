@@ -0,0 +1,164 @@
+import os
+import re
+import threading
+from datetime import datetime
+
+from run_catalog import SAVED_DATA, SAVED_PLOT
+
+# File name prefix written by the experiment runner -> (kind, plot type)
+ARTIFACT_PREFIXES = {
+    "ESR_plot": ("plot", "ESR"),
+    "FindNV_plot": ("plot", "FindNV"),
+    "GalvoScan_plot": ("plot", "GalvoScan"),
+    "Optimization_plot": ("plot", "Optimization"),
+    "esr_data": ("data", "ESR"),
+    "FindNV_data": ("data", "FindNV"),
+    "GalvoScan_data": ("data", "GalvoScan"),
+    "optimization_data": ("data", "Optimization"),
+}
+PLOT_TYPES = ("ESR", "FindNV", "GalvoScan", "Optimization")
+
+PENDING_SUFFIX = ".pending"
+TIMESTAMP = re.compile(r"_(\d{8}_\d{6})(?:_|\.)")
+
+
+def classify(filename: str):
+    """
+    Return (kind, plot type) for a runner output file name, or None if it is not one.
+    Plots that are still pending (`<plot>.png.pending`) classify as plots.
+    """
+    if filename.endswith(".png" + PENDING_SUFFIX):
+        filename = filename[:-len(PENDING_SUFFIX)]
+    if filename.endswith(".png"):
+        kind = "plot"
+    elif filename.endswith(".json"):
+        kind = "data"
+    else:
+        return None
+    for prefix, (prefix_kind, plot_type) in ARTIFACT_PREFIXES.items():
+        if prefix_kind == kind and filename.startswith(prefix):
+            return kind, plot_type
+    # Older runs saved plots without the runner's prefixes (e.g. "ESR_spot1.png")
+    if kind == "plot":
+        for plot_type in PLOT_TYPES:
+            if plot_type in filename:
+                return kind, plot_type
+    return None
+
+
+class ArtifactIndex:
+    """
+    In-memory index of the plots and data files in a run's data directory.
+
+    Entries are added as runs report their outputs (add_from_output) and marked
+    analyzed when vision runs (mark_analyzed), so lookups by plot type, timestamp or
+    analysis status never list the directory. As a fallback for files written by other
+    processes (the background plot renderer, a manual run), refresh() rescans the
+    directory, but only when its modification time has changed since the last scan.
+
+    Args:
+        data_dir: The run's data directory.
+    """
+
+    def __init__(self, data_dir: str):
+        self.data_dir = data_dir
+        self._lock = threading.Lock()
+        self._entries = {}   # filename -> entry dict
+        self._by_type = {("plot", t): {} for t in PLOT_TYPES}
+        self._by_type.update({("data", t): {} for t in PLOT_TYPES})
+        self._dir_mtime = None
+        self.refresh()
+
+    def _add(self, path: str):
+        filename = os.path.basename(path)
+        pending = filename.endswith(PENDING_SUFFIX)
+        if pending:
+            filename = filename[:-len(PENDING_SUFFIX)]
+        info = classify(filename)
+        if info is None:
+            return None
+        entry = self._entries.get(filename)
+        if entry is None:
+            kind, plot_type = info
+            m = TIMESTAMP.search(filename)
+            entry = {
+                "path": os.path.join(self.data_dir, filename),
+                "filename": filename,
+                "kind": kind,
+                "type": plot_type,
+                "timestamp": datetime.strptime(m.group(1), "%Y%m%d_%H%M%S") if m else None,
+                "pending": pending,
+                "analyzed": False,
+                "analysis": None,
+            }
+            self._entries[filename] = entry
+            self._by_type[info][filename] = entry
+        elif not pending:
+            entry["pending"] = False
+        return entry
+
+    def add(self, path: str):
+        """Index one output file (a plot, a `.pending` plot marker or a data sidecar)."""
+        with self._lock:
+            return self._add(path)
+
+    def add_from_output(self, output: str):
+        """Index the data and plot files a runner reported in its stdout."""
+        with self._lock:
+            for pattern in (SAVED_DATA, SAVED_PLOT):
+                for m in pattern.finditer(output or ""):
+                    path = m.group("path")
+                    pending = "will be rendered" in m.group(0) and \
+                        not os.path.exists(os.path.join(self.data_dir, os.path.basename(path)))
+                    self._add(path + PENDING_SUFFIX if pending else path)
+
+    def refresh(self, force: bool = False):
+        """
+        Pick up files written outside the agent. The directory is only listed when its
+        modification time changed since the last scan (or `force` is set).
+        """
+        try:
+            mtime = os.stat(self.data_dir).st_mtime_ns
+        except OSError:
+            return
+        if not force and mtime == self._dir_mtime:
+            return
+        with self._lock:
+            names = set(os.listdir(self.data_dir))
+            for filename in names:
+                self._add(filename)
+            for filename, entry in self._entries.items():
+                if entry["pending"] and filename in names:
+                    entry["pending"] = False
+            self._dir_mtime = mtime
+
+    def mark_analyzed(self, path: str, analysis: str = None):
+        """Record that a plot was analyzed with vision (indexing it if it is new)."""
+        with self._lock:
+            entry = self._add(path)
+            if entry is not None:
+                entry["analyzed"] = True
+                entry["analysis"] = analysis
+                entry["analyzed_at"] = datetime.now()
+            return entry
+
+    def get(self, filename: str):
+        """Entry for a file name (or path), or None."""
+        self.refresh()
+        return self._entries.get(os.path.basename(filename))
+
+    def plots(self, plot_types=None, analyzed: bool = None):
+        """
+        Plots, oldest first, optionally filtered by plot type(s) and analysis status.
+        """
+        self.refresh()
+        types = PLOT_TYPES if plot_types is None else [plot_types] if isinstance(plot_types, str) else plot_types
+        entries = [e for t in types for e in self._by_type.get(("plot", t), {}).values()
+                   if analyzed is None or e["analyzed"] == analyzed]
+        return sorted(entries, key=lambda e: (e["timestamp"] or datetime.min, e["filename"]))
+
+    def latest(self, plot_type: str, kind: str = "plot"):
+        """Most recent plot (or data file, kind="data") of a type, or None."""
+        self.refresh()
+        entries = self._by_type.get((kind, plot_type), {}).values()
+        return max(entries, key=lambda e: (e["timestamp"] or datetime.min, e["filename"]), default=None)
@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+Unattended agent sessions: work through a list of goals under a permission policy.
+
+Goals come from a task file, or from stdin with "-" (processed as they arrive), one per
+line. A line may also be JSON, {"goal": "...", "max_turns": 6}. Blank lines and lines
+starting with # are skipped.
+
+Each goal is run with the agent's autonomous loop (NVExperimentAgent.run_autonomous): the
+results of every step are fed back to the model until it answers with only messages
+(done, or waiting for the user) or max_turns steps are used, and the next goal starts.
+Permission requests are decided by the policy (permission_policy.DEFAULT_POLICY unless
+--policy is given); nothing is asked on the console.
+
+At the end a results summary is printed and written as JSON: per goal the turns, actions,
+experiments run (from the run catalog), permission decisions, errors and time, plus
+totals and throughput.
+
+Usage:
+  py agent/batch_agent.py tasks.txt [--policy policy.json] [--max-turns 10] [--plan-candidates 3] [--summary summary.json]
+  type goals.txt | py agent/batch_agent.py -
+"""
+import os
+import sys
+import json
+import time
+import argparse
+from datetime import datetime
+
+from agent import NVExperimentAgent
+from permission_policy import PermissionPolicy
+
+DEFAULT_MAX_TURNS = 10
+
+
+def read_goals(stream):
+    """
+    Yield goal dictionaries ({"goal": ..., "max_turns": ...}) from a line stream.
+    """
+    for line in stream:
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        if line.startswith("{"):
+            try:
+                item = json.loads(line)
+            except json.JSONDecodeError:
+                item = None
+            if isinstance(item, dict) and item.get("goal"):
+                yield item
+                continue
+        yield {"goal": line}
+
+
+def run_goal(agent, goal: str, max_turns: int) -> dict:
+    """
+    Drive the agent toward one goal.
+
+    Returns:
+        Result dictionary for the summary.
+    """
+    started_at = time.time()
+    policy = agent.permission_policy
+    decisions_before = len(policy.decisions) if policy else 0
+    result = agent.run_autonomous(goal, max_steps=max_turns, time_budget_s=float("inf"))
+    if result["status"] == "interrupted":
+        raise KeyboardInterrupt
+    error = result["error"]
+    if error:
+        print(f"[Batch] Goal failed: {error}")
+    action_counts = {}
+    for step in result["steps"]:
+        for a_type in step["actions"]:
+            action_counts[a_type] = action_counts.get(a_type, 0) + 1
+
+    experiments = agent.catalog.query_experiments(run_id=agent.run_dir, since=started_at)
+    denied = [reason for _, decision, reason in (policy.decisions[decisions_before:] if policy else [])
+              if decision != "allow"]
+    return {
+        "goal": goal,
+        "status": "error" if error else ("done" if result["status"] == "done" else "turn_limit"),
+        "turns": len(result["steps"]),
+        "actions": action_counts,
+        "experiments": [{"script": e["script"], "status": e["status"], "duration_s": e["duration_s"]}
+                        for e in reversed(experiments)],
+        "denied": denied,
+        "error": error,
+        "duration_s": result["elapsed_s"],
+        "llm_s": sum(step["llm_s"] for step in result["steps"]),
+    }
+
+
+def summarize(results, elapsed: float, policy) -> dict:
+    experiments = [e for r in results for e in r["experiments"]]
+    instrument_s = sum(e["duration_s"] or 0.0 for e in experiments)
+    return {
+        "goals": len(results),
+        "done": sum(r["status"] == "done" for r in results),
+        "turn_limit": sum(r["status"] == "turn_limit" for r in results),
+        "errors": sum(r["status"] == "error" for r in results),
+        "turns": sum(r["turns"] for r in results),
+        "experiments": len(experiments),
+        "failed_experiments": sum(e["status"] != "ok" for e in experiments),
+        "instrument_s": instrument_s,
+        "elapsed_s": elapsed,
+        "instrument_utilization": instrument_s / elapsed if elapsed else 0.0,
+        "goals_per_hour": len(results) / elapsed * 3600 if elapsed else 0.0,
+        "experiments_per_hour": len(experiments) / elapsed * 3600 if elapsed else 0.0,
+        "permissions": policy.summary() if policy else {},
+    }
+
+
+def format_summary(summary: dict, results) -> str:
+    lines = [f"{summary['goals']} goals: {summary['done']} done, {summary['turn_limit']} at the turn limit, "
+             f"{summary['errors']} failed; {summary['turns']} turns, {summary['experiments']} experiments "
+             f"({summary['failed_experiments']} failed) in {summary['elapsed_s'] / 60:.1f} min "
+             f"({summary['experiments_per_hour']:.1f} experiments/h, "
+             f"instrument busy {summary['instrument_utilization']:.0%})"]
+    for i, r in enumerate(results, 1):
+        scripts = ", ".join(e["script"] for e in r["experiments"]) or "no experiments"
+        lines.append(f"  {i}. [{r['status']}] {r['goal'][:60]} - {r['turns']} turns, {scripts}, "
+                     f"{r['duration_s']:.0f} s" + (f", {len(r['denied'])} denied" if r["denied"] else ""))
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the agent unattended on a list of goals")
+    parser.add_argument("tasks", help="Task file with one goal per line, or - for stdin")
+    parser.add_argument("--policy", default=None, help="Permission policy JSON (default: permission_policy.DEFAULT_POLICY)")
+    parser.add_argument("--max-turns", type=int, default=DEFAULT_MAX_TURNS, help="Turns per goal")
+    parser.add_argument("--plan-candidates", type=int, default=1,
+                        help="Responses compared per step; the plan with the least instrument time is run")
+    parser.add_argument("--summary", default=None, help="Summary JSON path (default: the run's logs directory)")
+    args = parser.parse_args()
+
+    agent = NVExperimentAgent(interactive=False, plan_candidates=args.plan_candidates)
+    validator = agent.config_validator
+    agent.permission_policy = (PermissionPolicy.from_file(args.policy, validator) if args.policy
+                               else PermissionPolicy(validator=validator))
+    print(f"[Batch] Run directory: {agent.base_dir}")
+
+    start = time.perf_counter()
+    results = []
+    stream = sys.stdin if args.tasks == "-" else open(args.tasks, "r", encoding="utf-8")
+    try:
+        for item in read_goals(stream):
+            print(f"\n[Batch] Goal {len(results) + 1}: {item['goal']}")
+            results.append(run_goal(agent, item["goal"], int(item.get("max_turns", args.max_turns))))
+    except KeyboardInterrupt:
+        print("\n[Batch] Interrupted, writing the summary of the goals so far.")
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+        summary = summarize(results, time.perf_counter() - start, agent.permission_policy)
+        summary_path = args.summary or os.path.join(
+            agent.logs_dir, f"batch_summary_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+        with open(summary_path, "w", encoding="utf-8") as f:
+            json.dump({"run_dir": agent.base_dir, "summary": summary, "goals": results}, f, indent=2)
+        print("\n[Batch] " + format_summary(summary, results))
+        print(f"[Batch] Summary written to {summary_path}")
+        agent.save_conversation_embeddings(background=True)
+        agent.close()
+    sys.exit(1 if summary["errors"] else 0)
+
+
+if __name__ == "__main__":
+    main()
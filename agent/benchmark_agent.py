@@ -0,0 +1,431 @@
+#!/usr/bin/env python3
+"""
+Latency benchmark for NVExperimentAgent.
+
+Replays recorded sessions through `NVExperimentAgent.handle_user_input`: the user
+messages and the LLM responses are taken from agent history logs (agent_history_new.log
+by default, or every recorded run with --all-runs), the LLM is a local
+mock that returns the recorded responses (optionally after a fixed delay), and
+experiments run against the simulated toolkit in agent/sim_toolkit. Nothing calls an
+API or touches an instrument, so runs are repeatable.
+
+Each turn is split into exclusive time per stage:
+  prompt_build, rag, llm, parse, actions, logging, embedding, other
+(a stage nested in another, e.g. logging inside an action, is charged to the inner one).
+Results are written as JSON; pass an earlier result with --compare to see regressions.
+
+The agent works on a copy of projects/NVExperiment (configs and scripts) in a temporary
+directory, so the repository's runs, catalog and embeddings are not modified. Recorded
+sessions use the lab PC's layout (e.g. "py experiment_scripts\\ESR.py --config configs\\x.json"
+run from the project directory); their script, config and data paths are rewritten to the
+workspace's, so the recorded runs execute against the simulated toolkit. A benchmark in
+which no run reaches the toolkit only times rejected commands and fails.
+
+Usage:
+  python agent/benchmark_agent.py [LOG ...] [--all-runs] [--max-turns 20] [--llm-latency 0.5] [--mock-embeddings]
+                                  [--output bench.json] [--compare baseline.json [--max-regression 20]]
+"""
+import os
+import re
+import sys
+import glob
+import json
+import time
+import shutil
+import hashlib
+import argparse
+import tempfile
+import functools
+import statistics
+
+import numpy as np
+
+AGENT_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(AGENT_DIR)
+SIM_TOOLKIT = os.path.join(AGENT_DIR, "sim_toolkit")
+PROJECT_DIR = os.path.join(REPO_ROOT, "projects", "NVExperiment")
+
+STAGES = ["prompt_build", "rag", "llm", "parse", "actions", "logging", "embedding", "other"]
+
+# Agent methods timed as each stage; every `_action_*` method counts as "actions"
+METHOD_STAGES = {
+    "_build_prompt": "prompt_build",
+    "_get_rag_context": "rag",
+    "_get_relevant_plots": "rag",
+    "_parse_actions": "parse",
+    "_parse_think": "parse",
+    "ask_human_for_permission": "actions",
+    "_log": "logging",
+    "_checkpoint_turns": "embedding",
+}
+
+# Changes smaller than this are timer noise and never count as regressions
+MIN_REGRESSION_S = 0.001
+
+RUN_DIR_PATTERN = re.compile(r"run_\d{8}_\d{6}")
+
+# Relative script, config and data paths of recorded sessions (with either separator,
+# JSON-escaped or not), e.g. experiment_scripts\\ESR.py or configs/default_esr_config.json
+RECORDED_PATH_PATTERN = re.compile(r"(?<![\w./\\-])(experiment_scripts|scripts|configs|data)[\\/]+(default_)?")
+
+sys.path.insert(0, AGENT_DIR)
+from agent_logging import parse_log
+
+
+def load_session(log_path: str):
+    """
+    Extract the (user message, LLM response) pairs of a recorded session.
+
+    Args:
+        log_path: Agent history log (JSON lines or legacy text).
+
+    Returns:
+        List of (user_message, llm_response) tuples. Permission answers are not turns.
+    """
+    turns = []
+    pending = None
+    for record in parse_log(log_path):
+        content = record.get("content") or ""
+        if record["role"] == "user" and not content.startswith("(permission)"):
+            pending = content
+        elif (record["role"] == "assistant" and pending is not None and not content.startswith("(THINK)")
+              and ("<think>" in content or "<action>" in content)):
+            turns.append((pending, content))
+            pending = None
+    return turns
+
+
+DEFAULT_LOG = os.path.join(REPO_ROOT, "agent_history_new.log")
+
+
+def run_logs():
+    """All recorded run session logs in the repository, oldest first."""
+    return sorted(glob.glob(os.path.join(PROJECT_DIR, "runs", "run_*", "logs", "agent_history_*")))
+
+
+class ReplayLLM:
+    """
+    Mock for call_llm: returns the recorded responses in order, with the recorded run
+    directory replaced by the current one and recorded relative paths rewritten to the
+    agent's directories (see use_agent_paths), so paths in actions resolve.
+    """
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.responses = []
+        self.run_dir = None
+        self.dirs = {}
+        self.calls = 0
+
+    def use_agent_paths(self, agent):
+        """Rewrite recorded paths to this agent's run, scripts and configs directories."""
+        from agent_paths import prompt_path
+        self.run_dir = agent.run_dir
+        self.dirs = {
+            "experiment_scripts": prompt_path(agent.scripts_dir),
+            "scripts": prompt_path(agent.scripts_dir),
+            "configs": prompt_path(agent.config_dir),
+            "default_configs": prompt_path(os.path.join(agent.default_dir, "configs")),
+            "data": prompt_path(agent.data_dir),
+        }
+
+    def _rewrite_path(self, match):
+        folder, default = match.group(1), match.group(2) or ""
+        if folder == "configs" and default:
+            folder = "default_configs"
+        return self.dirs[folder] + "/" + default
+
+    def queue(self, response: str):
+        self.responses.append(response)
+
+    def __call__(self, user_prompt, system_message=None, **kwargs):
+        self.calls += 1
+        if self.latency > 0:
+            time.sleep(self.latency)
+        if not self.responses:
+            return "<think>No recorded response left.</think>"
+        response = self.responses.pop(0)
+        if self.run_dir:
+            response = RUN_DIR_PATTERN.sub(self.run_dir, response)
+        if self.dirs:
+            response = RECORDED_PATH_PATTERN.sub(self._rewrite_path, response)
+        return response
+
+    def tool_reply(self, user_prompt, tools=None, **kwargs):
+        """Mock for call_llm_tools: the recorded response as text, without tool calls."""
+        return {"text": self(user_prompt, **kwargs), "tool_calls": []}
+
+
+def mock_vision(image_path, additional_context=None):
+    return f"(benchmark) No analysis: {os.path.basename(image_path)} was not sent to a vision model."
+
+
+class HashEmbedder:
+    """
+    Deterministic stand-in for the sentence-transformer model: hashed bag of words,
+    L2-normalized, with the same `encode` interface and dimension.
+    """
+
+    def __init__(self, dimension: int = 384):
+        self.dimension = dimension
+
+    def _encode_one(self, text):
+        vector = np.zeros(self.dimension, dtype=np.float32)
+        for token in re.findall(r"\w+", text.lower()):
+            digest = hashlib.md5(token.encode("utf-8")).digest()
+            vector[int.from_bytes(digest[:4], "little") % self.dimension] += 1.0
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def encode(self, text):
+        if isinstance(text, str):
+            return self._encode_one(text)
+        return np.array([self._encode_one(t) for t in text], dtype=np.float32)
+
+
+class StageTimer:
+    """
+    Exclusive wall time per stage. Wrapped callables push their stage on entry; time is
+    always charged to the innermost active stage.
+    """
+
+    def __init__(self):
+        self.totals = {}
+        self._stack = []
+        self._mark = 0.0
+
+    def _charge(self, now):
+        if self._stack:
+            stage = self._stack[-1]
+            self.totals[stage] = self.totals.get(stage, 0.0) + now - self._mark
+        self._mark = now
+
+    def wrap(self, stage: str, fn):
+        @functools.wraps(fn)
+        def timed(*args, **kwargs):
+            self._charge(time.perf_counter())
+            self._stack.append(stage)
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self._charge(time.perf_counter())
+                self._stack.pop()
+        return timed
+
+    def take(self) -> dict:
+        """Return the totals since the last call and reset them."""
+        totals, self.totals = self.totals, {}
+        return totals
+
+
+def prepare_workspace(with_embeddings: bool) -> str:
+    """
+    Create a temporary working directory with a copy of the project configs and scripts
+    (and optionally the recorded conversation embeddings).
+    """
+    workspace = tempfile.mkdtemp(prefix="nv_agent_bench_")
+    project = os.path.join(workspace, "projects", "NVExperiment")
+    ignore = shutil.ignore_patterns("__pycache__")
+    shutil.copytree(os.path.join(PROJECT_DIR, "configs"), os.path.join(project, "configs"), ignore=ignore)
+    shutil.copytree(os.path.join(PROJECT_DIR, "scripts"), os.path.join(project, "scripts"), ignore=ignore)
+    if with_embeddings and os.path.isdir(os.path.join(PROJECT_DIR, "embeddings")):
+        shutil.copytree(os.path.join(PROJECT_DIR, "embeddings"), os.path.join(project, "embeddings"))
+    return workspace
+
+
+def instrument(agent, agent_module, timer: StageTimer, llm: ReplayLLM):
+    """
+    Replace the LLM calls with mocks and wrap the agent's stages with the timer.
+    Permission prompts are answered "yes" through the module's `input`.
+    """
+    agent_module.call_llm = timer.wrap("llm", llm)
+    agent_module.call_llm_tools = timer.wrap("llm", llm.tool_reply)
+    agent_module.call_vision = timer.wrap("llm", mock_vision)
+    agent_module.input = lambda prompt="": "yes"
+    for name in dir(agent):
+        stage = METHOD_STAGES.get(name, "actions" if name.startswith("_action_") else None)
+        if stage:
+            setattr(agent, name, timer.wrap(stage, getattr(agent, name)))
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, max(0, int(round(fraction * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+def summarize(turns):
+    """Mean, p50, p95 and total seconds per stage (and for the whole turn)."""
+    summary = {}
+    for stage in STAGES + ["total"]:
+        values = [turn["stages"].get(stage, 0.0) if stage != "total" else turn["total"] for turn in turns]
+        summary[stage] = {
+            "mean": statistics.fmean(values) if values else 0.0,
+            "p50": percentile(values, 0.5),
+            "p95": percentile(values, 0.95),
+            "total": sum(values),
+        }
+    return summary
+
+
+def run_benchmark(logs, max_turns=None, llm_latency=0.0, mock_embeddings=False,
+                  with_embeddings=False, time_scale=0.0, trace=False, keep=False):
+    """
+    Replay the sessions in `logs` and time every turn.
+
+    Args:
+        logs: Agent history log paths; each log is replayed as one agent session.
+        max_turns: Stop after this many turns in total.
+        llm_latency: Seconds the mock LLM sleeps per call.
+        mock_embeddings: Use the hashed bag-of-words embedder instead of the sentence transformer.
+        with_embeddings: Start from a copy of the recorded conversation embeddings.
+        time_scale: SIM_TIME_SCALE for the simulated instruments (0 = no instrument delays).
+        trace: Run the agent with tracing enabled (to measure its overhead).
+        keep: Keep the temporary workspace.
+
+    Returns:
+        Result dictionary with per-turn stage times, the number of runs that reached the
+        simulated toolkit ("runs": {"ok", "error"}) and a summary.
+    """
+    workspace = prepare_workspace(with_embeddings)
+    os.environ.setdefault("ANTHROPIC_API_KEY", "benchmark")  # anthropic_engine reads it at import
+    os.environ["NV_TOOLKIT_PATH"] = SIM_TOOLKIT
+    os.environ["SIM_STATE"] = os.path.join(workspace, "sim_state.json")
+    os.environ["SIM_TIME_SCALE"] = str(time_scale)
+    cwd = os.getcwd()
+    os.chdir(workspace)
+    try:
+        import rag_engine
+        if mock_embeddings:
+            rag_engine.set_model(HashEmbedder())
+        import agent as agent_module
+
+        turns = []
+        runs = {"ok": 0, "error": 0}
+        for log_path in logs:
+            session = load_session(log_path)
+            if not session:
+                continue
+            llm = ReplayLLM(latency=llm_latency)
+            timer = StageTimer()
+            agent = agent_module.NVExperimentAgent(trace=trace)
+            llm.use_agent_paths(agent)
+            instrument(agent, agent_module, timer, llm)
+            try:
+                for user_message, response in session:
+                    if max_turns is not None and len(turns) >= max_turns:
+                        break
+                    llm.queue(response)
+                    timer.take()
+                    start = time.perf_counter()
+                    agent.handle_user_input(user_message)
+                    total = time.perf_counter() - start
+                    stages = timer.take()
+                    stages["other"] = max(0.0, total - sum(stages.values()))
+                    turns.append({
+                        "session": os.path.basename(log_path),
+                        "turn": len(turns),
+                        "user": user_message[:80],
+                        "llm_calls": llm.calls,
+                        "total": total,
+                        "stages": stages,
+                    })
+            finally:
+                # Runs that reached the simulated toolkit (rejected commands are never recorded)
+                for status in ("ok", "error"):
+                    runs[status] += len(agent.catalog.query_experiments(run_id=agent.run_dir, status=status))
+                agent.close()
+            if max_turns is not None and len(turns) >= max_turns:
+                break
+    finally:
+        os.chdir(cwd)
+        if not keep:
+            shutil.rmtree(workspace, ignore_errors=True)
+
+    return {
+        "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "settings": {"logs": [os.path.basename(p) for p in logs], "max_turns": max_turns,
+                     "llm_latency": llm_latency, "mock_embeddings": mock_embeddings,
+                     "with_embeddings": with_embeddings, "time_scale": time_scale, "trace": trace},
+        "workspace": workspace if keep else None,
+        "turns": turns,
+        "runs": runs,
+        "summary": summarize(turns),
+    }
+
+
+def format_summary(result) -> str:
+    runs = result.get("runs", {})
+    lines = [f"{len(result['turns'])} turns, {runs.get('ok', 0)} simulated runs ({runs.get('error', 0)} failed)",
+             f"{'stage':<14}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}{'total s':>10}"]
+    for stage, s in result["summary"].items():
+        lines.append(f"{stage:<14}{s['mean'] * 1e3:>10.1f}{s['p50'] * 1e3:>10.1f}{s['p95'] * 1e3:>10.1f}{s['total']:>10.2f}")
+    return "\n".join(lines)
+
+
+def compare(result, baseline, max_regression=None):
+    """
+    Compare the stage means with a baseline result.
+
+    Returns:
+        Tuple of (report text, list of stages whose mean grew by more than max_regression percent
+        and by at least MIN_REGRESSION_S).
+    """
+    lines = [f"{'stage':<14}{'base ms':>10}{'now ms':>10}{'change':>10}"]
+    regressions = []
+    for stage, s in result["summary"].items():
+        base = baseline.get("summary", {}).get(stage)
+        if base is None:
+            continue
+        change = (s["mean"] - base["mean"]) / base["mean"] * 100 if base["mean"] else 0.0
+        flag = ""
+        if (max_regression is not None and change > max_regression
+                and s["mean"] - base["mean"] >= MIN_REGRESSION_S):
+            regressions.append(stage)
+            flag = "  REGRESSION"
+        lines.append(f"{stage:<14}{base['mean'] * 1e3:>10.1f}{s['mean'] * 1e3:>10.1f}{change:>+9.1f}%{flag}")
+    return "\n".join(lines), regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay recorded sessions against a mock LLM and simulated instruments")
+    parser.add_argument("logs", nargs="*", help="Agent history logs to replay (default: agent_history_new.log)")
+    parser.add_argument("--all-runs", action="store_true", help="Replay the logs of every recorded run")
+    parser.add_argument("--max-turns", type=int, default=None, help="Stop after this many turns")
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="Seconds the mock LLM waits per call")
+    parser.add_argument("--mock-embeddings", action="store_true", help="Use a hashed bag-of-words embedder instead of the sentence transformer")
+    parser.add_argument("--with-embeddings", action="store_true", help="Start from a copy of the recorded conversation embeddings")
+    parser.add_argument("--time-scale", type=float, default=0.0, help="Fraction of simulated instrument time to actually wait")
+    parser.add_argument("--trace", action="store_true", help="Enable the agent's tracing")
+    parser.add_argument("--output", default=None, help="Write the JSON result here")
+    parser.add_argument("--compare", default=None, help="Baseline JSON result to compare with")
+    parser.add_argument("--max-regression", type=float, default=None, help="Exit with status 1 if a stage mean grew by more than this percentage")
+    parser.add_argument("--keep", action="store_true", help="Keep the temporary workspace")
+    args = parser.parse_args()
+
+    logs = [os.path.abspath(p) for p in args.logs] or (run_logs() if args.all_runs else [DEFAULT_LOG])
+    result = run_benchmark(logs, max_turns=args.max_turns, llm_latency=args.llm_latency,
+                           mock_embeddings=args.mock_embeddings, with_embeddings=args.with_embeddings,
+                           time_scale=args.time_scale, trace=args.trace, keep=args.keep)
+    print("\n[Benchmark] " + format_summary(result).replace("\n", "\n[Benchmark] "))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=1)
+        print(f"[Benchmark] Results written to {args.output}")
+    if args.compare:
+        with open(args.compare, "r") as f:
+            baseline = json.load(f)
+        report, regressions = compare(result, baseline, args.max_regression)
+        print("[Benchmark] Compared with " + args.compare + "\n" + report)
+        if regressions:
+            print(f"[Benchmark] Regressions: {', '.join(regressions)}")
+            sys.exit(1)
+    if not result["runs"]["ok"] + result["runs"]["error"]:
+        print("[Benchmark] No run reached the simulated toolkit; the replayed run commands were all rejected")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
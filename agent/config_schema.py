@@ -0,0 +1,280 @@
+import os
+import json
+import time
+import argparse
+
+# Analog output range of the NI6353 channels driving the galvo mirrors (V)
+GALVO_LIMIT = 10.0
+
+# Physical bounds per script key: dotted setting path -> (min, max, unit).
+# Paths are relative to scripts.<script key>; None leaves a side unbounded.
+BOUNDS = {
+    "esr_RnS": {
+        "settings.power_out": (-60.0, 10.0, "dBm"),
+        "settings.esr_avg": (1, 10000, "averages"),
+        "settings.freq_start": (1e6, 6e9, "Hz"),
+        "settings.freq_stop": (1e6, 6e9, "Hz"),
+        "settings.freq_points": (2, 5000, "points"),
+        "settings.integration_time": (1e-5, 10.0, "s"),
+        "settings.num_samps_per_pt": (1, 1000000, "samples"),
+        "settings.mw_generator_switching_time": (0.0, 1.0, "s"),
+        "settings.fit_constants.num_of_peaks": (-1, 8, "peaks"),
+        "settings.fit_constants.zfs": (2.5e9, 3.2e9, "Hz"),
+    },
+    "find_nv": {
+        "settings.initial_point.x": (-GALVO_LIMIT, GALVO_LIMIT, "V"),
+        "settings.initial_point.y": (-GALVO_LIMIT, GALVO_LIMIT, "V"),
+        "settings.sweep_range": (1e-3, 2 * GALVO_LIMIT, "V"),
+        "settings.num_points": (2, 1000, "points"),
+        "settings.nv_size": (1, 1000, "pixels"),
+        "settings.min_mass": (0, None, "counts"),
+        "settings.number_of_attempts": (1, 100, "attempts"),
+    },
+    "galvo_scan": {
+        "settings.point_a.x": (-GALVO_LIMIT, GALVO_LIMIT, "V"),
+        "settings.point_a.y": (-GALVO_LIMIT, GALVO_LIMIT, "V"),
+        "settings.point_b.x": (-2 * GALVO_LIMIT, 2 * GALVO_LIMIT, "V"),
+        "settings.point_b.y": (-2 * GALVO_LIMIT, 2 * GALVO_LIMIT, "V"),
+        "settings.num_points.x": (1, 2000, "points"),
+        "settings.num_points.y": (1, 2000, "points"),
+        "settings.time_per_pt": (1e-5, 10.0, "s"),
+        "settings.settle_time": (0.0, 1.0, "s"),
+    },
+    "optimize": {
+        "settings.sweep_range.x": (0.0, 2 * GALVO_LIMIT, "V"),
+        "settings.sweep_range.y": (0.0, 2 * GALVO_LIMIT, "V"),
+        "settings.sweep_range.z": (0.0, 10.0, "V"),
+        "settings.num_points.x": (1, 1000, "points"),
+        "settings.num_points.y": (1, 1000, "points"),
+        "settings.num_points.z": (1, 1000, "points"),
+        "settings.time_per_pt.galvo": (1e-5, 10.0, "s"),
+        "settings.time_per_pt.z-piezo": (1e-5, 10.0, "s"),
+        "settings.settle_time.galvo": (0.0, 1.0, "s"),
+        "settings.settle_time.z-piezo": (0.0, 5.0, "s"),
+    },
+}
+
+# Settings that only accept a fixed set of values
+CHOICES = {
+    "esr_RnS": {
+        "settings.range_type": ("start_stop", "center_range"),
+        "settings.daq_type": ("PCI", "cDAQ"),
+    },
+    "galvo_scan": {
+        "settings.RoI_mode": ("corner", "center"),
+        "settings.ending_behavior": ("return_to_start", "return_to_origin", "leave_at_corner"),
+        "settings.daq_type": ("PCI", "cDAQ"),
+    },
+}
+
+
+def _issue(path, message, value=None, **extra):
+    issue = {"path": path, "message": message, "value": value}
+    issue.update(extra)
+    return issue
+
+
+def format_issues(issues) -> str:
+    """Render validation issues as one "- path = value: message" line each."""
+    lines = []
+    for issue in issues:
+        shown = f" = {json.dumps(issue['value'])}" if issue.get("value") is not None else ""
+        lines.append(f"- {issue['path']}{shown}: {issue['message']}")
+    return "\n".join(lines)
+
+
+def _same_kind(value, reference) -> bool:
+    if reference is None:
+        return True
+    if isinstance(reference, bool) or isinstance(value, bool):
+        return isinstance(value, bool) and isinstance(reference, bool)
+    if isinstance(reference, (int, float)):
+        return isinstance(value, (int, float))
+    return isinstance(value, type(reference))
+
+
+def check_structure(config, template, path=()):
+    """
+    Check that a config block only uses keys that exist in the template (the default
+    config block), with values of the same kind (number, bool, string, object, list).
+    An empty object in the template (e.g. instrument "settings": {}) accepts any keys.
+
+    Returns:
+        List of issue dicts ({"path", "message", "value"}).
+    """
+    if not isinstance(config, dict):
+        return [_issue(".".join(path) or "config", "expected an object", config)]
+    issues = []
+    for key, value in config.items():
+        key_path = path + (str(key),)
+        name = ".".join(key_path)
+        if key not in template:
+            issues.append(_issue(name, "unknown setting (not in the default config)"))
+        elif isinstance(template[key], dict):
+            if not isinstance(value, dict):
+                issues.append(_issue(name, "expected an object", value))
+            elif template[key]:
+                issues.extend(check_structure(value, template[key], key_path))
+        elif not _same_kind(value, template[key]):
+            issues.append(_issue(name, f"expected {type(template[key]).__name__} like {json.dumps(template[key])}",
+                                 value))
+    return issues
+
+
+def _galvo_extent(settings):
+    # The scan must stay inside the galvo range: corner mode spans point_a..point_b,
+    # center mode spans point_a +/- point_b / 2
+    issues = []
+    a, b = settings.get("point_a") or {}, settings.get("point_b") or {}
+    for axis in ("x", "y"):
+        if not isinstance(a.get(axis), (int, float)) or not isinstance(b.get(axis), (int, float)):
+            continue
+        if settings.get("RoI_mode") == "center":
+            low, high = a[axis] - abs(b[axis]) / 2, a[axis] + abs(b[axis]) / 2
+        else:
+            low, high = min(a[axis], b[axis]), max(a[axis], b[axis])
+        if low < -GALVO_LIMIT or high > GALVO_LIMIT:
+            issues.append(_issue(f"settings.point_b.{axis}",
+                                 f"scan spans {low:g} to {high:g} V on {axis}, outside the galvo range "
+                                 f"+/-{GALVO_LIMIT:g} V", b[axis]))
+    return issues
+
+
+def _esr_range(settings):
+    start, stop = settings.get("freq_start"), settings.get("freq_stop")
+    if settings.get("range_type", "start_stop") == "start_stop" and \
+            isinstance(start, (int, float)) and isinstance(stop, (int, float)) and start >= stop:
+        return [_issue("settings.freq_stop", f"must be greater than freq_start ({start:g} Hz)", stop)]
+    return []
+
+
+def _find_nv_extent(settings):
+    point, half = settings.get("initial_point") or {}, settings.get("sweep_range")
+    issues = []
+    if not isinstance(half, (int, float)):
+        return issues
+    for axis in ("x", "y"):
+        centre = point.get(axis)
+        if isinstance(centre, (int, float)) and abs(centre) + half / 2 > GALVO_LIMIT:
+            issues.append(_issue("settings.sweep_range",
+                                 f"sweep around {axis}={centre:g} V leaves the galvo range +/-{GALVO_LIMIT:g} V", half))
+    return issues
+
+
+# Checks that involve more than one setting, given the script's settings block
+CROSS_CHECKS = {
+    "esr_RnS": (_esr_range,),
+    "find_nv": (_find_nv_extent,),
+    "galvo_scan": (_galvo_extent,),
+}
+
+
+class ConfigValidator:
+    """
+    Validates experiment configs before they are run.
+
+    The default config for each script is the template: a config may only use keys
+    the default has, with values of the same kind. On top of that, settings are
+    checked against physical bounds (BOUNDS), allowed values (CHOICES) and
+    cross-setting rules (CROSS_CHECKS). Everything is compiled once into flat lists
+    of (key path, check) per script, so validating a config takes microseconds.
+
+    Args:
+        defaults_dir: Directory holding the default_*_config.json files.
+    """
+
+    def __init__(self, defaults_dir: str):
+        self.templates = {}
+        self.checks = {}
+        for filename in sorted(os.listdir(defaults_dir)):
+            if not (filename.startswith("default_") and filename.endswith(".json")):
+                continue
+            with open(os.path.join(defaults_dir, filename), "r", encoding="utf-8") as f:
+                scripts = json.load(f).get("scripts", {})
+            for key, block in scripts.items():
+                self.templates[key] = block
+                self.checks[key] = self._compile(key)
+
+    @staticmethod
+    def _compile(key):
+        compiled = []
+        for dotted, (low, high, unit) in BOUNDS.get(key, {}).items():
+            compiled.append((dotted, tuple(dotted.split(".")), "range", (low, high, unit)))
+        for dotted, allowed in CHOICES.get(key, {}).items():
+            compiled.append((dotted, tuple(dotted.split(".")), "choice", allowed))
+        return compiled
+
+    def validate(self, config):
+        """
+        Validate a full config (the {"scripts": {<key>: {...}}} dictionary).
+
+        Returns:
+            List of issue dicts with "path" (relative to scripts.<key>), "message" and
+            "value"; empty if the config can be run.
+        """
+        scripts = config.get("scripts") if isinstance(config, dict) else None
+        if not isinstance(scripts, dict) or len(scripts) != 1:
+            return [_issue("scripts", "config must contain exactly one script block under \"scripts\"")]
+        key, block = next(iter(scripts.items()))
+        if key not in self.templates:
+            return [_issue(f"scripts.{key}", f"unknown script; expected one of {', '.join(sorted(self.templates))}")]
+
+        issues = check_structure(block, self.templates[key])
+        for dotted, keys, kind, rule in self.checks[key]:
+            node = block
+            for k in keys:
+                node = node.get(k) if isinstance(node, dict) else None
+            if node is None:
+                continue
+            if kind == "range":
+                low, high, unit = rule
+                if not isinstance(node, (int, float)) or isinstance(node, bool):
+                    continue   # reported by check_structure
+                if (low is not None and node < low) or (high is not None and node > high):
+                    lo = "-inf" if low is None else f"{low:g}"
+                    hi = "inf" if high is None else f"{high:g}"
+                    issues.append(_issue(dotted, f"must be between {lo} and {hi} {unit}", node,
+                                         min=low, max=high))
+            elif node not in rule:
+                issues.append(_issue(dotted, f"must be one of {', '.join(rule)}", node, allowed=list(rule)))
+        settings = block.get("settings")
+        if isinstance(settings, dict):
+            for check in CROSS_CHECKS.get(key, ()):
+                issues.extend(check(settings))
+        return issues
+
+    def validate_file(self, path: str):
+        """Validate a config file; unreadable or invalid JSON is reported as an issue."""
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                config = json.load(f)
+        except OSError as e:
+            return [_issue("config", f"cannot read {path}: {e}")]
+        except json.JSONDecodeError as e:
+            return [_issue("config", f"invalid JSON in {path}: {e}")]
+        return self.validate(config)
+
+
+def main():
+    """
+    Usage:
+      python agent/config_schema.py configs_OLD/*.json
+    """
+    parser = argparse.ArgumentParser(description='Validate experiment configs')
+    parser.add_argument('paths', nargs='+', help='Config files to check')
+    parser.add_argument('--defaults', default=os.path.join('projects', 'NVExperiment', 'configs'))
+    args = parser.parse_args()
+
+    validator = ConfigValidator(args.defaults)
+    for path in args.paths:
+        start = time.perf_counter()
+        issues = validator.validate_file(path)
+        elapsed_us = (time.perf_counter() - start) * 1e6
+        status = "OK" if not issues else f"{len(issues)} issues"
+        print(f"[Validate] {path}: {status} ({elapsed_us:.0f} us)")
+        if issues:
+            print(format_issues(issues))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,401 @@
+import os
+import json
+import hashlib
+import argparse
+import tempfile
+import threading
+from contextlib import contextmanager
+
+# Sentinel for "key not present" in diffs
+MISSING = object()
+
+
+def config_hash(config) -> str:
+    """
+    Content hash of a config: sha256 of its canonical JSON (sorted keys, no whitespace).
+    """
+    canonical = json.dumps(config, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+@contextmanager
+def _file_lock(path):
+    # Exclusive lock across processes (and across threads, each opening its own handle)
+    with open(path, "a+b") as f:
+        if os.name == "nt":
+            import msvcrt
+            while True:
+                try:
+                    f.seek(0)
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)   # retries for 10 s, then raises
+                    break
+                except OSError:
+                    continue
+            try:
+                yield
+            finally:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+def _write_json(path: str, data, **dump_args):
+    # Write through a temporary file of our own in the same directory, then replace
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path) or ".", prefix=os.path.basename(path) + ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f, **dump_args)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+def merge_patch(target, patch):
+    """
+    Apply a JSON merge patch (RFC 7386): dicts are merged recursively, a None value
+    deletes the key, anything else replaces the target value. Returns a new object.
+    """
+    if not isinstance(patch, dict):
+        return json.loads(json.dumps(patch))
+    result = dict(target) if isinstance(target, dict) else {}
+    for key, value in patch.items():
+        if value is None:
+            result.pop(key, None)
+        else:
+            result[key] = merge_patch(result.get(key), value)
+    return result
+
+
+def make_merge_patch(source, target):
+    """
+    Build the smallest merge patch turning `source` into `target`.
+
+    Merge patches cannot set a value to null; callers should check the round trip
+    (ConfigStore.put falls back to storing the full config).
+    """
+    if not isinstance(source, dict) or not isinstance(target, dict):
+        return target
+    patch = {}
+    for key in source:
+        if key not in target:
+            patch[key] = None
+    for key, value in target.items():
+        if key not in source:
+            patch[key] = value
+        elif source[key] != value:
+            if isinstance(source[key], dict) and isinstance(value, dict):
+                patch[key] = make_merge_patch(source[key], value)
+            else:
+                patch[key] = value
+    return patch
+
+
+def diff_configs(old, new, path=()):
+    """
+    List the differences between two configs.
+
+    Returns:
+        List of (path, old_value, new_value) tuples, where path is a tuple of keys and
+        a missing value is the MISSING sentinel.
+    """
+    if isinstance(old, dict) and isinstance(new, dict):
+        changes = []
+        for key in list(old) + [k for k in new if k not in old]:
+            changes.extend(diff_configs(old.get(key, MISSING), new.get(key, MISSING), path + (key,)))
+        return changes
+    if old == new and type(old) == type(new):
+        return []
+    return [(path, old, new)]
+
+
+def format_diff(changes, strip_prefix: int = 0) -> str:
+    """
+    Render diff_configs output as one "path: old -> new" line per change.
+
+    Args:
+        changes: Output of diff_configs.
+        strip_prefix: Number of leading path keys to drop (2 drops "scripts.<script key>").
+    """
+    def show(value):
+        return "(unset)" if value is MISSING else json.dumps(value)
+
+    lines = []
+    for path, old, new in changes:
+        name = ".".join(str(k) for k in path[strip_prefix:]) or ".".join(str(k) for k in path)
+        lines.append(f"{name}: {show(old)} -> {show(new)}")
+    return "\n".join(lines)
+
+
+def apply_changes(config, changes: dict, prefix=()):
+    """
+    Set values by dotted path, e.g. {"settings.freq_start": 2.85e9}.
+
+    Args:
+        config: Config to patch (not modified).
+        changes: {dotted path: value}. Paths are relative to `prefix`.
+        prefix: Key path the dotted paths are relative to, e.g. ("scripts", "esr_RnS").
+
+    Returns:
+        Tuple of (patched config, list of issues as {"path", "message", "value"} dicts).
+    """
+    result = json.loads(json.dumps(config))
+    errors = []
+    for dotted, value in changes.items():
+        keys = list(prefix) + [k for k in str(dotted).split(".") if k]
+        node = result
+        for key in keys[:-1]:
+            if not isinstance(node.get(key), dict):
+                errors.append({"path": dotted, "message": "no such setting", "value": value})
+                break
+            node = node[key]
+        else:
+            if keys[-1] not in node:
+                errors.append({"path": dotted, "message": "no such setting", "value": value})
+            else:
+                node[keys[-1]] = value
+    return result, errors
+
+
+def script_key(config):
+    """Return the script key of a config ("esr_RnS", "find_nv", ...) or None."""
+    scripts = config.get("scripts") if isinstance(config, dict) else None
+    if isinstance(scripts, dict) and len(scripts) == 1:
+        return next(iter(scripts))
+    return None
+
+
+class ConfigStore:
+    """
+    Content-addressed store of experiment configs.
+
+    Every config is identified by config_hash (the same hash the run catalog records),
+    so identical configs are stored once. The default configs are stored in full; any
+    other config is stored as a JSON merge patch against the default for its script,
+    which is usually a handful of settings instead of the whole instrument block.
+
+    Layout under `root`:
+        objects/<hash[:2]>/<hash>.json   {"base": <hash or null>, "patch": <merge patch or full config>}
+        refs.json                        {file path: hash} for every config put with a name
+        refs.json.lock                   lock held while refs.json is updated
+
+    One store can be shared by several agents (agent_server.py), and several processes may
+    use the same directory: refs.json is re-read and merged under a file lock on every
+    named put, and every file is written through its own temporary file.
+
+    The store indexes configs; it does not replace the files. Run directories keep a full
+    JSON copy of every config they use, because the runner, the validator, the catalog
+    and the read action take file paths, and a run directory copied off the lab PC has
+    to be readable without the store. The store adds its (small) objects on top of those
+    copies; what it saves is the tokens of sending whole configs to the model.
+
+    Args:
+        root: Store directory.
+        defaults_dir: Directory holding the default_*_config.json files.
+    """
+
+    def __init__(self, root: str, defaults_dir: str):
+        self.root = root
+        self.defaults_dir = defaults_dir
+        self.objects_dir = os.path.join(root, "objects")
+        self.refs_path = os.path.join(root, "refs.json")
+        os.makedirs(self.objects_dir, exist_ok=True)
+        self._cache = {}
+        self._refs_lock = threading.Lock()
+        self.defaults = {}   # script key -> (default path, config, hash)
+        if os.path.isdir(defaults_dir):
+            for filename in sorted(os.listdir(defaults_dir)):
+                if not (filename.startswith("default_") and filename.endswith(".json")):
+                    continue
+                path = os.path.join(defaults_dir, filename)
+                with open(path, "r", encoding="utf-8") as f:
+                    config = json.load(f)
+                key = script_key(config)
+                if key:
+                    self.defaults[key] = (path, config, self._write_object(None, config))
+
+    def _object_path(self, digest: str) -> str:
+        return os.path.join(self.objects_dir, digest[:2], f"{digest}.json")
+
+    def _write_object(self, base, config, patch=None) -> str:
+        digest = config_hash(config)
+        path = self._object_path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            _write_json(path, {"base": base, "patch": config if base is None else patch}, separators=(",", ":"))
+        self._cache[digest] = json.loads(json.dumps(config))
+        return digest
+
+    def default_for(self, config):
+        """Return (default path, default config, hash) for the config's script, or None."""
+        return self.defaults.get(script_key(config))
+
+    def put(self, config, name: str = None) -> str:
+        """
+        Store a config and return its hash. If `name` (usually the file path the
+        config was written to) is given, it is recorded in refs.json.
+        """
+        digest = config_hash(config)
+        if digest not in self._cache and not os.path.exists(self._object_path(digest)):
+            default = self.default_for(config)
+            patch = make_merge_patch(default[1], config) if default else None
+            if default and merge_patch(default[1], patch) == config:
+                self._write_object(default[2], config, patch)
+            else:
+                self._write_object(None, config)
+        if name is not None:
+            # Merge into the refs on disk, which other agents and processes may have changed
+            with self._refs_lock, _file_lock(self.refs_path + ".lock"):
+                refs = self.refs()
+                if refs.get(name) != digest:
+                    refs[name] = digest
+                    _write_json(self.refs_path, refs, indent=1, sort_keys=True)
+        return digest
+
+    def put_file(self, path: str) -> str:
+        """Store a config file (recorded in refs under its path) and return its hash."""
+        with open(path, "r", encoding="utf-8") as f:
+            return self.put(json.load(f), name=path)
+
+    def resolve(self, prefix: str):
+        """Return the full hash of the stored config whose hash starts with `prefix`, or None."""
+        prefix = prefix.lower()
+        if len(prefix) < 6 or any(c not in "0123456789abcdef" for c in prefix):
+            return None
+        prefix_dir = os.path.join(self.objects_dir, prefix[:2])
+        if os.path.isdir(prefix_dir):
+            for filename in os.listdir(prefix_dir):
+                if filename.startswith(prefix) and filename.endswith(".json"):
+                    return filename[:-len(".json")]
+        return None
+
+    def patch(self, base, changes: dict = None, merge: dict = None):
+        """
+        Derive a new config from `base`. The result is not validated; use
+        config_schema.ConfigValidator before running it.
+
+        Args:
+            base: Base config (dict).
+            changes: {dotted path: value}, paths relative to scripts.<script key>
+                (e.g. "settings.freq_start"), the same paths diffs are shown with.
+            merge: JSON merge patch applied to the whole config.
+
+        Returns:
+            Tuple of (config, issues) where issues lists changes that could not be applied.
+        """
+        key = script_key(base)
+        config, errors = base, []
+        if merge:
+            config = merge_patch(config, merge)
+        if changes:
+            config, errors = apply_changes(config, changes, prefix=("scripts", key) if key else ())
+        return config, errors
+
+    def get(self, digest: str):
+        """Return the full config for a hash (KeyError if it is not stored)."""
+        if digest in self._cache:
+            return self._cache[digest]
+        path = self._object_path(digest)
+        if not os.path.exists(path):
+            raise KeyError(f"Config {digest} is not in the store")
+        with open(path, "r", encoding="utf-8") as f:
+            obj = json.load(f)
+        config = obj["patch"] if obj["base"] is None else merge_patch(self.get(obj["base"]), obj["patch"])
+        self._cache[digest] = config
+        return config
+
+    def refs(self) -> dict:
+        """Return the {name: hash} map of named configs, as currently on disk."""
+        if not os.path.exists(self.refs_path):
+            return {}
+        with open(self.refs_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def diff_from_default(self, config):
+        """
+        Compare a config with the default for its script.
+
+        Returns:
+            Tuple of (default path, changes as returned by diff_configs), or (None, None)
+            if there is no default for the config's script.
+        """
+        default = self.default_for(config)
+        if default is None:
+            return None, None
+        return default[0], diff_configs(default[1], config)
+
+    def stats(self) -> dict:
+        """
+        Object count and bytes of the store's objects, plus the size the named configs take
+        as full files (the copies in the run directories, which are kept alongside).
+        """
+        objects, stored = 0, 0
+        for root, _, filenames in os.walk(self.objects_dir):
+            for filename in filenames:
+                objects += 1
+                stored += os.path.getsize(os.path.join(root, filename))
+        full = sum(len(json.dumps(self.get(d), indent=2)) for d in self.refs().values())
+        return {"objects": objects, "stored_bytes": stored, "named_configs": len(self.refs()),
+                "full_bytes": full}
+
+
+def _load(store: ConfigStore, ref: str):
+    # A file path or a (prefix of a) stored hash
+    if os.path.exists(ref):
+        with open(ref, "r", encoding="utf-8") as f:
+            return json.load(f)
+    digest = store.resolve(ref)
+    if digest:
+        return store.get(digest)
+    raise SystemExit(f"[Configs] Not a file or stored config: {ref}")
+
+
+def main():
+    """
+    Usage:
+      python agent/config_store.py import configs_OLD projects/NVExperiment/runs
+      python agent/config_store.py diff configs_OLD/esr_spot1.json configs_OLD/esr_spot1_config.json
+      python agent/config_store.py show <hash prefix>
+    """
+    parser = argparse.ArgumentParser(description='Content-addressed store of experiment configs')
+    parser.add_argument('command', choices=['import', 'diff', 'show'])
+    parser.add_argument('paths', nargs='*', help='Config files or directories (import), two configs (diff) or a hash (show)')
+    parser.add_argument('--store', default=os.path.join('projects', 'NVExperiment', 'config_store'))
+    parser.add_argument('--defaults', default=os.path.join('projects', 'NVExperiment', 'configs'))
+    args = parser.parse_args()
+
+    store = ConfigStore(args.store, args.defaults)
+    if args.command == 'import':
+        count = 0
+        for path in args.paths:
+            files = [path] if os.path.isfile(path) else [
+                os.path.join(root, f) for root, _, names in os.walk(path) for f in names if f.endswith('.json')]
+            for file_path in sorted(files):
+                try:
+                    store.put_file(file_path)
+                    count += 1
+                except (OSError, json.JSONDecodeError) as e:
+                    print(f"[Configs] Skipped {file_path}: {e}")
+        stats = store.stats()
+        print(f"[Configs] Imported {count} files: {stats['named_configs']} named configs in {stats['objects']} objects, "
+              f"{stats['stored_bytes']} bytes of objects next to {stats['full_bytes']} bytes of config files")
+    elif args.command == 'diff':
+        if len(args.paths) != 2:
+            parser.error('diff takes two configs')
+        changes = diff_configs(_load(store, args.paths[0]), _load(store, args.paths[1]))
+        print(format_diff(changes) if changes else "[Configs] No differences")
+    else:
+        if len(args.paths) != 1:
+            parser.error('show takes one hash')
+        print(json.dumps(_load(store, args.paths[0]), indent=2))
+
+
+if __name__ == "__main__":
+    main()
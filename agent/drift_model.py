@@ -0,0 +1,166 @@
+import os
+import time
+import argparse
+
+import numpy as np
+
+from run_catalog import RunCatalog, measured_position
+
+AXES = ("x", "y", "z")
+
+# Largest predicted position error (config units, V) accepted without re-optimizing
+DEFAULT_THRESHOLD = 0.01
+# Re-optimize anyway once the last optimize is this old (s)
+MAX_AGE = 2 * 3600.0
+# Only fit drift over this recent history (s)
+FIT_WINDOW = 6 * 3600.0
+
+
+class DriftModel:
+    """
+    Linear drift model of the NV position, fitted per axis to the positions found by
+    optimize (and find_nv) runs on the same NV.
+
+    Each axis is fitted as position = p0 + v * t by least squares over the last
+    FIT_WINDOW seconds. The predicted error at time t is how far the position is
+    expected to have moved since the last measured position, |v| * (t - t_last), plus
+    twice the fit residual.
+
+    Args:
+        observations: List of {"t": unix time, "x", "y", "z"} (axes may be missing/None).
+        min_points: Minimum observations per axis before a slope is trusted.
+    """
+
+    def __init__(self, observations, min_points: int = 3):
+        self.observations = sorted(observations, key=lambda o: o["t"])
+        self.min_points = min_points
+        self.fits = {}   # axis -> (velocity per s, intercept at t_ref, residual std, n)
+        self.last = {}   # axis -> (t, value) of the latest observation
+        if not self.observations:
+            return
+        t_end = self.observations[-1]["t"]
+        self.t_ref = t_end
+        for axis in AXES:
+            points = [(o["t"], o[axis]) for o in self.observations
+                      if o.get(axis) is not None and o["t"] >= t_end - FIT_WINDOW]
+            if not points:
+                continue
+            self.last[axis] = points[-1]
+            if len(points) < min_points:
+                continue
+            t = np.array([p[0] for p in points]) - self.t_ref
+            v = np.array([p[1] for p in points], dtype=float)
+            if np.ptp(t) <= 0:
+                continue
+            slope, intercept = np.polyfit(t, v, 1)
+            residual = float(np.std(v - (slope * t + intercept), ddof=1)) if len(points) > 2 else 0.0
+            self.fits[axis] = (float(slope), float(intercept), residual, len(points))
+
+    def rate_per_hour(self) -> float:
+        """Magnitude of the fitted drift velocity (V per hour), 0 if nothing is fitted."""
+        return float(np.sqrt(sum(fit[0] ** 2 for fit in self.fits.values()))) * 3600.0
+
+    def predict(self, t: float = None):
+        """Predicted position {axis: value} at time t (default now) for every observed axis."""
+        t = time.time() if t is None else t
+        predicted = {}
+        for axis, (t_last, value) in self.last.items():
+            if axis in self.fits:
+                predicted[axis] = value + self.fits[axis][0] * (t - t_last)
+            else:
+                predicted[axis] = value
+        return predicted
+
+    def predicted_error(self, t: float = None):
+        """
+        Predicted error {axis: V} of the last measured position at time t, or None for
+        an axis without a trusted fit.
+        """
+        t = time.time() if t is None else t
+        errors = {}
+        for axis, (t_last, _) in self.last.items():
+            fit = self.fits.get(axis)
+            errors[axis] = None if fit is None else abs(fit[0]) * (t - t_last) + 2 * fit[2]
+        return errors
+
+    def should_optimize(self, t: float = None, threshold: float = DEFAULT_THRESHOLD, max_age: float = MAX_AGE):
+        """
+        Decide whether an optimize run is needed.
+
+        Returns:
+            Tuple of (needed, reason string).
+        """
+        t = time.time() if t is None else t
+        if not self.last:
+            return True, "no earlier optimize result for this position"
+        age = t - max(t_last for t_last, _ in self.last.values())
+        if age > max_age:
+            return True, f"last optimize was {age / 60:.0f} min ago"
+        errors = self.predicted_error(t)
+        unknown = [axis for axis, error in errors.items() if error is None]
+        if unknown:
+            return True, f"not enough optimize history to model drift on {', '.join(unknown)}"
+        worst_axis = max(errors, key=errors.get)
+        if errors[worst_axis] > threshold:
+            return True, f"predicted drift on {worst_axis} is {errors[worst_axis]:.4f} V (threshold {threshold} V)"
+        return False, (f"predicted drift is at most {errors[worst_axis]:.4f} V on {worst_axis} "
+                       f"{age / 60:.0f} min after the last optimize (threshold {threshold} V)")
+
+
+def observations_from_catalog(catalog, near=None, radius: float = 0.5, since: float = None):
+    """
+    Positions measured by optimize and find_nv runs as drift observations, optionally
+    only those within `radius` of `near` = (x, y) (i.e. on the same NV).
+    """
+    since = time.time() - FIT_WINDOW if since is None else since
+    rows = []
+    for script in ("optimize", "find_nv"):
+        rows.extend(catalog.query_experiments(script=script, near=near, radius=radius if near else None,
+                                              since=since, status="ok"))
+    observations = []
+    for row in rows:
+        position = measured_position(row)
+        if not position:
+            continue
+        t = row["started_at"] + (row.get("duration_s") or 0.0)
+        observations.append(dict(position, t=t))
+    return observations
+
+
+def current_drift_model(catalog, radius: float = 0.5):
+    """
+    Drift model for the NV measured most recently: observations within `radius` of
+    the latest measured (x, y) position over the last FIT_WINDOW seconds.
+    """
+    observations = observations_from_catalog(catalog)
+    located = [o for o in observations if o.get("x") is not None and o.get("y") is not None]
+    if located:
+        latest = max(located, key=lambda o: o["t"])
+        observations = [o for o in observations
+                        if o.get("x") is None or np.hypot(o["x"] - latest["x"], o["y"] - latest["y"]) <= radius]
+    return DriftModel(observations)
+
+
+def main():
+    """
+    Usage:
+      python agent/drift_model.py [--near X Y] [--threshold 0.01]
+    """
+    parser = argparse.ArgumentParser(description='Predict NV drift from optimize history')
+    parser.add_argument('--db', default=os.path.join('projects', 'NVExperiment', 'run_catalog.sqlite'))
+    parser.add_argument('--near', type=float, nargs=2, default=None, metavar=('X', 'Y'))
+    parser.add_argument('--hours', type=float, default=FIT_WINDOW / 3600.0)
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD)
+    args = parser.parse_args()
+
+    catalog = RunCatalog(args.db)
+    observations = observations_from_catalog(catalog, near=args.near, since=time.time() - args.hours * 3600.0)
+    model = DriftModel(observations)
+    needed, reason = model.should_optimize(threshold=args.threshold)
+    print(f"[Drift] {len(observations)} observations, drift {model.rate_per_hour():.4f} V/h")
+    print(f"[Drift] Predicted position: {model.predict()}")
+    print(f"[Drift] Optimize {'needed' if needed else 'not needed'}: {reason}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+import math
+import argparse
+import json
+
+# Typical wall time per experiment (s), used when the run catalog has no history
+DEFAULT_DURATIONS = {"find_nv": 60.0, "optimize": 90.0, "ESR": 600.0, "galvo_scan": 120.0}
+
+# Galvo move cost: seconds per volt of travel (slew plus settling at the new position)
+GALVO_SECONDS_PER_VOLT = 0.05
+
+# Focus (z) drift assumed when no drift model is available: V per hour
+DEFAULT_DRIFT_RATE = 0.05
+DEFAULT_DRIFT_TOLERANCE = 0.03
+
+
+def _distance(a, b) -> float:
+    return math.hypot(a["x"] - b["x"], a["y"] - b["y"])
+
+
+def path_length(points, start=None) -> float:
+    """Total galvo travel (V) visiting `points` in order, from `start` if given."""
+    route = ([start] if start is not None else []) + list(points)
+    return sum(_distance(route[i], route[i + 1]) for i in range(len(route) - 1))
+
+
+def order_candidates(candidates, start=None):
+    """
+    Order candidate positions to keep galvo travel short: nearest-neighbour tour from
+    `start` (or the first candidate), improved with 2-opt moves until none helps.
+
+    Args:
+        candidates: List of dicts with "x" and "y" (galvo V); other keys are kept.
+        start: Current galvo position {"x", "y"}, or None.
+
+    Returns:
+        The candidates in visiting order (an open path, not a closed loop).
+    """
+    remaining = list(candidates)
+    if len(remaining) < 3:
+        if start is not None and len(remaining) == 2 and _distance(start, remaining[1]) < _distance(start, remaining[0]):
+            remaining.reverse()
+        return remaining
+
+    current = start if start is not None else remaining.pop(0)
+    route = [] if start is not None else [current]
+    while remaining:
+        nearest = min(range(len(remaining)), key=lambda i: _distance(current, remaining[i]))
+        current = remaining.pop(nearest)
+        route.append(current)
+
+    # 2-opt: reverse route[i..j] when that shortens the path. With a fixed start the
+    # first edge is start -> route[0]; otherwise route[0] is free too (i = 0 reverses a
+    # prefix of the path, which only changes the edge after nodes[j]).
+    nodes = ([start] if start is not None else []) + route
+    offset = 1 if start is not None else 0
+    improved = True
+    while improved:
+        improved = False
+        for i in range(offset, len(nodes) - 1):
+            for j in range(i + 1, len(nodes)):
+                before = ((_distance(nodes[i - 1], nodes[i]) if i > 0 else 0)
+                          + (_distance(nodes[j], nodes[j + 1]) if j + 1 < len(nodes) else 0))
+                after = ((_distance(nodes[i - 1], nodes[j]) if i > 0 else 0)
+                         + (_distance(nodes[i], nodes[j + 1]) if j + 1 < len(nodes) else 0))
+                if after < before - 1e-12:
+                    nodes[i:j + 1] = reversed(nodes[i:j + 1])
+                    improved = True
+    return nodes[offset:]
+
+
+def plan_schedule(candidates, start=None, measurements=("find_nv", "ESR"), durations=None,
+                  drift_rate: float = DEFAULT_DRIFT_RATE, drift_tolerance: float = DEFAULT_DRIFT_TOLERANCE,
+                  time_since_optimize: float = 0.0):
+    """
+    Plan measurements on many NV candidates.
+
+    Candidates are ordered to minimize galvo travel. An optimize run (focus) is
+    inserted before a candidate only when the drift predicted since the last
+    optimize, drift_rate * elapsed time, exceeds drift_tolerance, instead of before
+    every measurement.
+
+    Args:
+        candidates: List of {"x", "y", ["label"]} in galvo coordinates (V).
+        start: Current galvo position, or None.
+        measurements: Experiments run at every candidate, in order.
+        durations: {script: seconds} per experiment (defaults: DEFAULT_DURATIONS).
+        drift_rate: Predicted drift in V per hour.
+        drift_tolerance: Largest predicted drift (V) accepted without re-optimizing.
+        time_since_optimize: Seconds since the last optimize run.
+
+    Returns:
+        Dictionary with "steps" (one per candidate: label, x, y, experiments, start_s),
+        "optimize_runs", "travel_v", "unordered_travel_v" and "projected_s".
+    """
+    durations = dict(DEFAULT_DURATIONS, **(durations or {}))
+    labelled = [dict(c, label=c.get("label") or f"NV{i + 1}") for i, c in enumerate(candidates)]
+    ordered = order_candidates(labelled, start)
+
+    clock, since_optimize, optimize_runs = 0.0, time_since_optimize, 0
+    position = start
+    steps = []
+    for candidate in ordered:
+        travel = _distance(position, candidate) * GALVO_SECONDS_PER_VOLT if position is not None else 0.0
+        clock += travel
+        since_optimize += travel
+        # Re-optimize only if the focus would have drifted too far by the end of this candidate
+        block = sum(durations.get(m, 0.0) for m in measurements)
+        experiments = []
+        if drift_rate * (since_optimize + block) / 3600.0 > drift_tolerance:
+            experiments.append("optimize")
+            optimize_runs += 1
+            clock += durations["optimize"]
+            since_optimize = 0.0
+        steps.append({"label": candidate["label"], "x": candidate["x"], "y": candidate["y"],
+                      "experiments": experiments + list(measurements), "start_s": round(clock, 1)})
+        clock += block
+        since_optimize += block
+        position = candidate
+
+    return {
+        "steps": steps,
+        "optimize_runs": optimize_runs,
+        "travel_v": round(path_length(ordered, start), 4),
+        "unordered_travel_v": round(path_length(labelled, start), 4),
+        "projected_s": round(clock, 1),
+    }
+
+
+def format_schedule(plan) -> str:
+    """Render a plan_schedule result as text for the model."""
+    lines = []
+    for i, step in enumerate(plan["steps"], start=1):
+        lines.append(f"{i}. {step['label']} (x={step['x']:g}, y={step['y']:g}): {', '.join(step['experiments'])} "
+                     f"[starts at {step['start_s'] / 60:.1f} min]")
+    lines.append(f"Projected instrument time: {plan['projected_s'] / 60:.1f} min, "
+                 f"{plan['optimize_runs']} optimize runs, galvo travel {plan['travel_v']:.3f} V "
+                 f"(in the given order: {plan['unordered_travel_v']:.3f} V)")
+    return "\n".join(lines)
+
+
+def main():
+    """
+    Usage:
+      python agent/nv_scheduler.py candidates.json [--start X Y] [--measure find_nv ESR]
+    where candidates.json is a list of {"x": ..., "y": ..., "label": ...}.
+    """
+    parser = argparse.ArgumentParser(description='Plan measurements over NV candidates')
+    parser.add_argument('candidates', help='JSON file with a list of {"x", "y", "label"}')
+    parser.add_argument('--start', type=float, nargs=2, default=None, metavar=('X', 'Y'))
+    parser.add_argument('--measure', nargs='+', default=['find_nv', 'ESR'])
+    parser.add_argument('--drift-rate', type=float, default=DEFAULT_DRIFT_RATE, help='V per hour')
+    parser.add_argument('--drift-tolerance', type=float, default=DEFAULT_DRIFT_TOLERANCE, help='V')
+    args = parser.parse_args()
+
+    with open(args.candidates, "r") as f:
+        candidates = json.load(f)
+    start = {"x": args.start[0], "y": args.start[1]} if args.start else None
+    plan = plan_schedule(candidates, start=start, measurements=args.measure,
+                         drift_rate=args.drift_rate, drift_tolerance=args.drift_tolerance)
+    print(format_schedule(plan))
+
+
+if __name__ == "__main__":
+    main()
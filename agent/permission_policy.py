@@ -0,0 +1,185 @@
+"""
+Declarative permission policy for unattended agent sessions.
+
+Instead of asking on the console, each action that needs permission is decided by a
+rule per action type:
+
+    {
+      "default": "deny",
+      "actions": {
+        "read": "allow",
+        "vision": "allow",
+        "write": "allow",
+        "patch": "allow",
+        "run": {
+          "decision": "allow",
+          "scripts": ["ESR", "find_nv", "galvo_scan", "optimize"],
+          "validate": true,
+          "limits": {"esr_RnS": {"settings.esr_avg": [1, 500]}},
+          "max_minutes": 30
+        }
+      }
+    }
+
+A rule is "allow", "deny" or "ask" (ask on the console; denied when nobody is there),
+or an object with a "decision" and conditions. A run is only allowed when its script
+is listed, its config passes the config validator ("validate") and the configured
+settings are within "limits" (paths relative to scripts.<script key>, as in
+config_schema.BOUNDS; null leaves a side open) and, with "max_minutes", its estimated
+instrument time (time_estimator) is not longer. A failed condition denies the action.
+
+Usage:
+  python permission_policy.py policy.json --run "py projects\\NVExperiment\\scripts\\ESR.py --config c.json --output-dir d"
+"""
+import os
+import json
+import argparse
+
+from run_catalog import SCRIPT_KEYS
+
+DECISIONS = ("allow", "deny", "ask")
+
+# Overnight characterization: everything the agent does is allowed, runs only with
+# configs that pass validation
+DEFAULT_POLICY = {
+    "default": "deny",
+    "actions": {
+        "read": "allow",
+        "vision": "allow",
+        "write": "allow",
+        "patch": "allow",
+        "run": {"decision": "allow", "scripts": sorted(SCRIPT_KEYS), "validate": True, "limits": {}},
+    },
+}
+
+
+def _get_path(block, path: str):
+    value = block
+    for key in path.split("."):
+        if not isinstance(value, dict) or key not in value:
+            return None
+        value = value[key]
+    return value
+
+
+class PermissionPolicy:
+    """
+    Decides permission requests from a policy dictionary (see the module docstring).
+
+    Args:
+        policy: Policy dictionary; DEFAULT_POLICY if None.
+        validator: config_schema.ConfigValidator used by run rules with "validate".
+    """
+
+    def __init__(self, policy: dict = None, validator=None):
+        self.policy = DEFAULT_POLICY if policy is None else policy
+        self.validator = validator
+        self.default = self.policy.get("default", "deny")
+        self.rules = self.policy.get("actions", {})
+        for action, rule in list(self.rules.items()) + [("default", self.default)]:
+            decision = rule.get("decision", "allow") if isinstance(rule, dict) else rule
+            if decision not in DECISIONS:
+                raise ValueError(f"Policy rule for '{action}' must be one of {DECISIONS}, got {decision!r}")
+        # (action, decision, reason) of every request, for the session summary
+        self.decisions = []
+
+    @classmethod
+    def from_file(cls, path: str, validator=None):
+        with open(path, "r", encoding="utf-8") as f:
+            return cls(json.load(f), validator=validator)
+
+    def decide(self, action: str, script: str = None, config=None, estimated_s: float = None):
+        """
+        Decide a permission request.
+
+        Args:
+            action: Action type ("read", "write", "patch", "run", "vision", ...).
+            script: For runs, the runner script name (e.g. "ESR").
+            config: For runs, the loaded config dictionary (None if it could not be read).
+            estimated_s: For runs, the estimated instrument time (None if unknown).
+
+        Returns:
+            Tuple of (decision, reason) with decision "allow", "deny" or "ask".
+        """
+        rule = self.rules.get(action, self.default)
+        if isinstance(rule, dict):
+            decision, reason = self._check_conditions(action, rule, script, config, estimated_s)
+        else:
+            decision, reason = rule, f"policy: {action} -> {rule}"
+        self.decisions.append((action, decision, reason))
+        return decision, reason
+
+    def _check_conditions(self, action, rule, script, config, estimated_s):
+        decision = rule.get("decision", "allow")
+        if action != "run" or decision != "allow":
+            return decision, f"policy: {action} -> {decision}"
+        scripts = rule.get("scripts")
+        if scripts is not None and script not in scripts:
+            return "deny", f"policy: script {script} is not in the allowed scripts ({', '.join(scripts)})"
+        if config is None:
+            return "deny", "policy: the run's config could not be read"
+        if rule.get("validate", True) and self.validator is not None:
+            issues = self.validator.validate(config)
+            if issues:
+                return "deny", f"policy: config fails validation ({issues[0]['path']}: {issues[0]['message']})"
+        key = SCRIPT_KEYS.get(script)
+        block = config.get("scripts", {}).get(key, {}) if isinstance(config, dict) else {}
+        for path, (low, high) in rule.get("limits", {}).get(key, {}).items():
+            value = _get_path(block, path)
+            if not isinstance(value, (int, float)):
+                continue
+            if (low is not None and value < low) or (high is not None and value > high):
+                return "deny", f"policy: {path} = {value:g} is outside the allowed range [{low}, {high}]"
+        max_minutes = rule.get("max_minutes")
+        if max_minutes is not None and estimated_s is not None and estimated_s > max_minutes * 60:
+            return "deny", f"policy: estimated {estimated_s / 60:.1f} min is longer than the allowed {max_minutes} min"
+        return "allow", f"policy: {script} run with a config within bounds"
+
+    def summary(self) -> dict:
+        """Counts of decisions per action, e.g. {"run": {"allow": 3, "deny": 1}}."""
+        counts = {}
+        for action, decision, _ in self.decisions:
+            counts.setdefault(action, {}).setdefault(decision, 0)
+            counts[action][decision] += 1
+        return counts
+
+
+def main():
+    from config_schema import ConfigValidator
+    from agent_paths import parse_run_command
+    from run_catalog import RunCatalog
+    from time_estimator import TimeEstimator
+
+    parser = argparse.ArgumentParser(description="Check what a permission policy decides")
+    parser.add_argument("policy", nargs="?", default=None, help="Policy JSON file (default: the built-in policy)")
+    parser.add_argument("--action", default="run", help="Action type")
+    parser.add_argument("--run", default=None, help="Run command to check")
+    parser.add_argument("--defaults-dir", default=os.path.join("projects", "NVExperiment", "configs"))
+    parser.add_argument("--db", default=os.path.join("projects", "NVExperiment", "run_catalog.sqlite"))
+    args = parser.parse_args()
+
+    validator = ConfigValidator(args.defaults_dir)
+    policy = PermissionPolicy.from_file(args.policy, validator) if args.policy else PermissionPolicy(validator=validator)
+    script = config = estimated_s = None
+    if args.run:
+        try:
+            parsed = parse_run_command(args.run)
+        except ValueError as e:
+            parsed = None
+            print(e)
+        if parsed:
+            script = parsed["name"]
+            try:
+                with open(parsed["config"], "r", encoding="utf-8") as f:
+                    config = json.load(f)
+            except (OSError, ValueError):
+                config = None
+            estimator = TimeEstimator(RunCatalog(args.db) if os.path.exists(args.db) else None)
+            estimate = estimator.estimate_config(config, parsed["args"], name=script)
+            estimated_s = estimate["seconds"] if estimate else None
+    decision, reason = policy.decide(args.action, script=script, config=config, estimated_s=estimated_s)
+    print(f"{decision}: {reason}")
+
+
+if __name__ == "__main__":
+    main()
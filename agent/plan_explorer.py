@@ -0,0 +1,219 @@
+"""
+Choose among several candidate plans for the same step.
+
+When a task is ambiguous (e.g. "check whether this NV has a strain splitting"), the model
+commits to one of many reasonable plans: a long high-average ESR, a coarse sweep first,
+a galvo scan before anything else. With plan exploration the agent requests N responses
+to the same prompt concurrently, and this module scores each one locally, without
+running anything:
+
+- instrument time: the configs each run action would use are worked out from the plan's
+  own write/patch actions or the files on disk, and their runs are estimated by
+  time_estimator (from settings like esr_avg, freq_points and time_per_pt, calibrated on
+  the durations of earlier runs).
+- information gain: bits per measured point, N/2 * log2(1 + SNR^2), with the SNR^2 taken
+  proportional to the integration time per point, expressed in runs of the script's
+  default config (1.0 = as informative as the default config).
+
+Gains of different scripts are not comparable (a default galvo scan and a default ESR
+both score 1.0), so choose_plan() only compares candidates that run the same scripts:
+it takes the plan most candidates agree on (the scripts they run, or none for plans
+that only message or write), keeps the candidates of that plan whose gain is at least
+min_gain_fraction of the best one and picks the fastest of them. The concurrency of the
+LLM calls is spent on shorter experiments rather than on more tokens.
+
+Usage (score saved responses):
+  python plan_explorer.py response1.txt response2.txt [--config-dir projects/NVExperiment/runs/<run>/configs]
+"""
+import os
+import json
+import math
+import argparse
+
+from action_protocol import parse_action_blocks
+from agent_paths import to_path, parse_run_command
+from config_store import ConfigStore, config_hash
+from nv_scheduler import DEFAULT_DURATIONS
+from run_catalog import RunCatalog, SCRIPT_KEYS
+from time_estimator import TimeEstimator, FIND_NV_TIME_PER_PT, esr_passes, optimize_axes
+
+# Integration time per point (s) for an SNR of 1: ESR dip contrast, and counts per pixel
+ESR_NOISE_S = 0.5
+PIXEL_NOISE_S = 0.001
+
+# Candidates whose gain is at least this fraction of the best candidate's are "good enough"
+DEFAULT_MIN_GAIN_FRACTION = 0.5
+
+
+def _bits(points: float, integration_s: float, noise_s: float) -> float:
+    return points / 2 * math.log2(1 + max(0.0, integration_s) / noise_s)
+
+
+def information_bits(name: str, settings: dict, args=()) -> float:
+    """Information of one run in bits: N/2 * log2(1 + SNR^2) over its measured points."""
+    s = settings
+    if name == "ESR":
+        return sum(_bits(points, averages * s.get("integration_time", 0.05), ESR_NOISE_S)
+                   for points, averages in esr_passes(s, args))
+    if name == "galvo_scan":
+        return _bits(s["num_points"]["x"] * s["num_points"]["y"], s.get("time_per_pt", 0.002), PIXEL_NOISE_S)
+    if name == "find_nv":
+        return _bits(int(s.get("num_points", 61)) ** 2, FIND_NV_TIME_PER_PT, PIXEL_NOISE_S)
+    if name == "optimize":
+        return sum(_bits(points, per_point, PIXEL_NOISE_S) for points, per_point, _ in optimize_axes(s))
+    raise ValueError(f"Unknown script: {name}")
+
+
+class PlanScorer:
+    """
+    Scores a plan (the actions of one response) by instrument time and information gain.
+
+    Args:
+        store: ConfigStore, for the default configs, config ids and patching.
+        config_dir: The run's configs/ directory, where patch actions without a path write.
+        estimator: time_estimator.TimeEstimator (default: nominal estimates only).
+    """
+
+    def __init__(self, store: ConfigStore, config_dir: str, estimator: TimeEstimator = None):
+        self.store = store
+        self.config_dir = config_dir
+        self.estimator = estimator or TimeEstimator()
+        # Time of a run whose config cannot be worked out: that of the default config
+        self.durations = dict(DEFAULT_DURATIONS, **self.estimator.default_durations(store))
+        # Bits of a run of each script's default config, the unit of gain
+        self.reference_bits = {}
+        for name, key in SCRIPT_KEYS.items():
+            default = store.defaults.get(key)
+            if default:
+                self.reference_bits[name] = information_bits(name, default[1]["scripts"][key]["settings"])
+
+    def _load(self, ref, files: dict):
+        # A config written earlier in the plan, a file on disk or a stored config id
+        path = to_path(ref)
+        key = str(path.resolve())
+        if key in files:
+            return files[key]
+        if path.is_file():
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    return json.load(f)
+            except (OSError, json.JSONDecodeError):
+                return None
+        digest = self.store.resolve(str(ref))
+        return self.store.get(digest) if digest else None
+
+    def _apply(self, action: dict, files: dict):
+        # Record the config a write or patch action would produce
+        content = action["content"]
+        if action["type"] == "write":
+            files[str(to_path(content["path"]).resolve())] = content["data"]
+            return
+        base = self._load(content["base"], files)
+        if not isinstance(base, dict):
+            return
+        config, issues = self.store.patch(base, changes=content.get("changes") or {},
+                                          merge=content.get("merge") or {})
+        if issues:
+            return
+        path = content.get("path")
+        if not path:
+            default = self.store.default_for(config)
+            if default is None:
+                return
+            stem = os.path.splitext(os.path.basename(default[0]))[0].replace("default_", "", 1)
+            path = os.path.join(self.config_dir, f"{stem}_{config_hash(config)[:10]}.json")
+        files[str(to_path(path).resolve())] = config
+
+    def score(self, actions) -> dict:
+        """
+        Returns:
+            {"runs": [{"script", "config", "seconds", "gain", "estimated"}], "seconds", "gain"},
+            where "estimated" is False for runs whose config could not be worked out (their
+            time and gain are those of the default config).
+        """
+        files, runs = {}, []
+        for action in actions:
+            if action["type"] in ("write", "patch"):
+                self._apply(action, files)
+            elif action["type"] == "run":
+                try:
+                    parsed = parse_run_command(action["content"])
+                except ValueError:
+                    continue
+                name = parsed["name"]
+                config = self._load(parsed["config"], files)
+                run = {"script": name, "config": str(parsed["config"]), "seconds": self.durations.get(name, 0.0),
+                       "gain": 1.0, "estimated": False}
+                try:
+                    settings = config["scripts"][SCRIPT_KEYS[name]]["settings"]
+                    run["seconds"] = self.estimator.estimate(name, settings, parsed["args"])["seconds"]
+                    run["gain"] = information_bits(name, settings, parsed["args"]) / self.reference_bits[name]
+                    run["estimated"] = True
+                except (TypeError, KeyError, ValueError, ZeroDivisionError):
+                    pass
+                runs.append(run)
+        return {"runs": runs, "seconds": sum(r["seconds"] for r in runs), "gain": sum(r["gain"] for r in runs)}
+
+
+def plan_scripts(score: dict) -> tuple:
+    """The scripts a scored plan runs, sorted and without repeats (() if it runs none)."""
+    return tuple(sorted({r["script"] for r in score["runs"]}))
+
+
+def choose_plan(scores, min_gain_fraction: float = DEFAULT_MIN_GAIN_FRACTION) -> int:
+    """
+    Index of the plan to execute. Only plans that run the same scripts are compared:
+    the scripts most candidates run are chosen (ties go to the earlier plan), then the
+    fastest of those candidates whose gain is at least min_gain_fraction of their best
+    gain (ties go to the higher gain, then the earlier plan). Among plans that run
+    nothing, the first one is kept.
+    """
+    if not scores:
+        return 0
+    groups = {}
+    for i, s in enumerate(scores):
+        groups.setdefault(plan_scripts(s), []).append(i)
+    group = max(groups.values(), key=lambda members: (len(members), -members[0]))
+    best_gain = max(scores[i]["gain"] for i in group)
+    if best_gain <= 0:
+        return group[0]
+    eligible = [i for i in group if scores[i]["gain"] >= min_gain_fraction * best_gain]
+    return min(eligible, key=lambda i: (scores[i]["seconds"], -scores[i]["gain"], i))
+
+
+def format_scores(scores, chosen: int) -> str:
+    """
+    One line per candidate plan, for the conversation and the logs. Gains are only given
+    for the plans compared with the chosen one (those running the same scripts).
+    """
+    lines = []
+    compared = plan_scripts(scores[chosen]) if scores else ()
+    for i, s in enumerate(scores):
+        runs = ", ".join(r["script"] + ("" if r["estimated"] else "?") for r in s["runs"]) or "no runs"
+        gain = f", gain {s['gain']:.2f}" if plan_scripts(s) == compared else ", other scripts"
+        lines.append(f"{'*' if i == chosen else ' '} plan {i + 1}: {runs}; {s['seconds'] / 60:.1f} min of "
+                     f"instrument time{gain}")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Score candidate plans by instrument time and information gain")
+    parser.add_argument("responses", nargs="+", help="Text files with one LLM response each")
+    parser.add_argument("--config-dir", default=os.path.join("projects", "NVExperiment", "configs"))
+    parser.add_argument("--min-gain-fraction", type=float, default=DEFAULT_MIN_GAIN_FRACTION)
+    args = parser.parse_args()
+
+    default_dir = os.path.join("projects", "NVExperiment")
+    store = ConfigStore(os.path.join(default_dir, "config_store"), os.path.join(default_dir, "configs"))
+    db = os.path.join(default_dir, "run_catalog.sqlite")
+    scorer = PlanScorer(store, args.config_dir, TimeEstimator(RunCatalog(db) if os.path.exists(db) else None))
+    scores = []
+    for path in args.responses:
+        with open(path, "r", encoding="utf-8") as f:
+            blocks = parse_action_blocks(f.read())
+        scores.append(scorer.score([b["action"] for b in blocks if b["action"]]))
+    print(format_scores(scores, choose_plan(scores, args.min_gain_fraction)))
+
+
+if __name__ == "__main__":
+    main()
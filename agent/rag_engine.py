@@ -1,11 +1,47 @@
 import os
 import json
+import argparse
+import tempfile
+import threading
 import numpy as np
-from sentence_transformers import SentenceTransformer
 import faiss
 
-# Initialize the embedding model
-model = SentenceTransformer('all-MiniLM-L6-v2')
+MODEL_NAME = 'all-MiniLM-L6-v2'
+
+# The embedding model is loaded on first use; set_model() replaces it (e.g. for benchmarks).
+# One instance serves every session in the process.
+_model = None
+_model_lock = threading.Lock()
+
+# path -> ((mtime, size), chunks, FAISS index); conversation files are written once, so their
+# chunks are embedded and indexed once per process instead of on every query
+_chunk_cache = {}
+
+def get_model():
+    """
+    Get the embedding model, loading it on first use.
+
+    Returns:
+        Object with an `encode(text_or_list)` method
+    """
+    global _model
+    if _model is None:
+        with _model_lock:
+            if _model is None:
+                from sentence_transformers import SentenceTransformer
+                _model = SentenceTransformer(MODEL_NAME)
+    return _model
+
+def set_model(model):
+    """
+    Replace the embedding model.
+
+    Args:
+        model: Object with an `encode(text_or_list)` method returning numpy arrays
+    """
+    global _model
+    _model = model
+    _chunk_cache.clear()
 
 def embed_text(text):
     """
@@ -17,7 +53,7 @@ def embed_text(text):
     Returns:
         Numpy array of embeddings
     """
-    return model.encode(text)
+    return get_model().encode(text)
 
 def save_embeddings(text, filepath):
     """
@@ -79,6 +115,32 @@ def extract_plot_references(text):
     
     return text, plot_references
 
+def _chunk_index(embedding_file):
+    """
+    Chunks (lines) of a saved conversation and a FAISS index of their embeddings,
+    cached until the file changes.
+    """
+    stat = os.stat(embedding_file)
+    key = (stat.st_mtime, stat.st_size)
+    cached = _chunk_cache.get(embedding_file)
+    if cached and cached[0] == key:
+        return cached[1], cached[2]
+
+    # Load the stored embeddings
+    text, stored_embeddings = load_embeddings(embedding_file)
+
+    # Split the text into chunks (paragraphs or turns)
+    chunks = text.split('\n')
+
+    # Generate embeddings for each chunk
+    chunk_embeddings = np.array(get_model().encode(chunks)).astype('float32')
+
+    # Create a FAISS index and add the chunk embeddings to it
+    index = faiss.IndexFlatL2(chunk_embeddings.shape[1])
+    index.add(chunk_embeddings)
+    _chunk_cache[embedding_file] = (key, chunks, index)
+    return chunks, index
+
 def search_similar(query, embedding_file, top_k=3):
     """
     Search for similar contexts in the embedding file.
@@ -92,24 +154,10 @@ def search_similar(query, embedding_file, top_k=3):
         List of dictionaries with text, plot_references, and similarity score
     """
     try:
-        # Load the stored embeddings
-        text, stored_embeddings = load_embeddings(embedding_file)
-        
-        # Split the text into chunks (paragraphs or turns)
-        chunks = text.split('\n')
-        
-        # Generate embeddings for each chunk
-        chunk_embeddings = model.encode(chunks)
+        chunks, index = _chunk_index(embedding_file)
         
         # Generate embeddings for the query
-        query_embedding = model.encode(query)
-        
-        # Create a FAISS index
-        dimension = query_embedding.shape[0]
-        index = faiss.IndexFlatL2(dimension)
-        
-        # Add the chunk embeddings to the index
-        index.add(np.array(chunk_embeddings).astype('float32'))
+        query_embedding = get_model().encode(query)
         
         # Search for similar chunks
         distances, indices = index.search(np.array([query_embedding]).astype('float32'), min(top_k, len(chunks)))
@@ -135,3 +183,56 @@ def search_similar(query, embedding_file, top_k=3):
     except Exception as e:
         print(f"Error in search_similar: {str(e)}")
         return []
+
+PENDING_SUFFIX = ".txt.pending"
+
+def embed_pending(embeddings_dir):
+    """
+    Embed every conversation left as `<name>.txt.pending` in the embeddings directory
+    (written by the agent at exit) into `<name>.json`, then remove the pending file.
+    Several workers may run on the same directory; a file that cannot be embedded is
+    reported and left pending for the next run.
+    
+    Args:
+        embeddings_dir: Embeddings directory
+        
+    Returns:
+        List of embedding files written
+    """
+    written = []
+    for filename in sorted(os.listdir(embeddings_dir)):
+        if not filename.endswith(PENDING_SUFFIX):
+            continue
+        pending_path = os.path.join(embeddings_dir, filename)
+        embedding_file = os.path.join(embeddings_dir, filename[:-len(PENDING_SUFFIX)] + ".json")
+        # Workers in the same directory (CLI, batch mode, server sessions) each write
+        # their own temporary file; the last os.replace wins with identical content
+        tmp_path = None
+        try:
+            with open(pending_path, 'r', encoding='utf-8') as f:
+                text = f.read()
+            fd, tmp_path = tempfile.mkstemp(dir=embeddings_dir, prefix=filename + ".", suffix=".tmp")
+            os.close(fd)
+            save_embeddings(text, tmp_path)
+            os.replace(tmp_path, embedding_file)
+        except FileNotFoundError:
+            continue  # another worker embedded it already
+        except Exception as e:
+            print(f"[Embeddings] Could not embed {pending_path}, left for the next run: {e}")
+            if tmp_path and os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            continue
+        try:
+            os.remove(pending_path)
+        except FileNotFoundError:
+            pass  # another worker embedded it at the same time
+        written.append(embedding_file)
+    return written
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Embed conversations the agent saved at exit')
+    parser.add_argument('--embed-pending', required=True, metavar='EMBEDDINGS_DIR',
+                        help='Directory holding conversation_*.txt.pending files')
+    args = parser.parse_args()
+    for path in embed_pending(args.embed_pending):
+        print(f"[Embeddings] Saved {path}")
@@ -0,0 +1,485 @@
+import os
+import re
+import json
+import time
+import sqlite3
+import statistics
+import argparse
+import threading
+from datetime import datetime, timedelta
+
+from agent_logging import parse_log
+from agent_paths import parse_run_command
+from config_store import config_hash
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id      TEXT PRIMARY KEY,
+    run_dir     TEXT,
+    started_at  REAL,
+    indexed_at  REAL
+);
+CREATE TABLE IF NOT EXISTS experiments (
+    id          INTEGER PRIMARY KEY,
+    run_id      TEXT NOT NULL,
+    script      TEXT NOT NULL,
+    started_at  REAL NOT NULL,
+    duration_s  REAL,
+    status      TEXT,
+    config_path TEXT,
+    config_hash TEXT,
+    settings    TEXT,
+    x           REAL,
+    y           REAL,
+    z           REAL,
+    freq_start  REAL,
+    freq_stop   REAL,
+    freq_points INTEGER,
+    power       REAL,
+    data_path   TEXT,
+    plot_path   TEXT,
+    results     TEXT,
+    args        TEXT
+);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_experiments_unique ON experiments(run_id, script, started_at, config_path);
+CREATE INDEX IF NOT EXISTS idx_experiments_script_time ON experiments(script, started_at);
+CREATE INDEX IF NOT EXISTS idx_experiments_xy ON experiments(x, y);
+CREATE INDEX IF NOT EXISTS idx_experiments_config_hash ON experiments(config_hash);
+CREATE TABLE IF NOT EXISTS files (
+    path        TEXT PRIMARY KEY,
+    run_id      TEXT,
+    kind        TEXT,
+    size        INTEGER,
+    mtime       REAL,
+    config_hash TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_files_run_kind ON files(run_id, kind);
+"""
+
+# Sample-plane distance per volt of galvo deflection. Positions in the catalog are in galvo
+# volts; this converts radii given in micrometres. It depends on the objective and scan lens:
+# measure it on a calibration grid (pitch in um / galvo volts between grid lines) after any
+# change to the optics.
+GALVO_UM_PER_VOLT = 10.0
+
+# Runner script name -> config script key
+SCRIPT_KEYS = {"ESR": "esr_RnS", "find_nv": "find_nv", "galvo_scan": "galvo_scan", "optimize": "optimize"}
+
+RUN_COMMAND = re.compile(r"(?P<script>ESR|find_nv|galvo_scan|optimize)\.py\s+--config\s+(?P<config>\S+)")
+SAVED_DATA = re.compile(r"\[Runner\] Saved \S+ data to: (?P<path>\S+)")
+SAVED_PLOT = re.compile(r"\[Runner\] (?:Saved \S+ plot to|\S+ plot will be rendered to): (?P<path>\S+)")
+
+
+def _native_path(path: str) -> str:
+    # Logs written on the lab PC use backslashes; normalize so the path resolves on any OS
+    return path.replace("\\", os.sep).replace("/", os.sep) if path else path
+
+
+def queue_wait(output: str) -> float:
+    """Seconds the runner spent waiting for (or yielding) the instruments, from its timing line."""
+    line = next((l for l in (output or "").splitlines() if l.startswith("[Runner] Timing:")), "")
+    return sum(float(s) for s in re.findall(r"\b(?:queue|yielded)=([\d.]+)s", line))
+
+
+def _file_kind(filename: str) -> str:
+    if filename.endswith(".png.pending"):
+        return "pending_plot"
+    if filename.endswith(".png"):
+        return "plot"
+    if filename.endswith(".npz"):
+        return "arrays"
+    if filename.endswith(".bin"):
+        return "snapshots"
+    if filename.endswith((".log", ".jsonl")):
+        return "log"
+    if filename.endswith(".json"):
+        return "config" if "config" in filename else "data"
+    return "other"
+
+
+def key_settings(script: str, config) -> dict:
+    """
+    Pull the indexed settings (position, frequencies, power) out of a config.
+    Positions are in the config's galvo coordinates.
+    """
+    out = {}
+    block = (config or {}).get("scripts", {}).get(SCRIPT_KEYS.get(script, script), {})
+    settings = block.get("settings", {})
+    if script == "ESR":
+        out["freq_start"] = settings.get("freq_start")
+        out["freq_stop"] = settings.get("freq_stop")
+        out["freq_points"] = settings.get("freq_points")
+        out["power"] = settings.get("power_out")
+    elif script == "find_nv":
+        point = settings.get("initial_point") or {}
+        out["x"], out["y"] = point.get("x"), point.get("y")
+    elif script == "galvo_scan":
+        a, b = settings.get("point_a") or {}, settings.get("point_b") or {}
+        if settings.get("RoI_mode") == "center":
+            out["x"], out["y"] = a.get("x"), a.get("y")
+        elif None not in (a.get("x"), a.get("y"), b.get("x"), b.get("y")):
+            out["x"], out["y"] = (a["x"] + b["x"]) / 2, (a["y"] + b["y"]) / 2
+    return out
+
+
+def _result_position(tree):
+    """
+    Find an (x, y[, z]) position in saved result data, e.g. the maximum found by
+    find_nv or optimize. Returns a dict with whichever of x/y/z were found.
+    """
+    if not isinstance(tree, dict):
+        return {}
+    for key in ("maximum_point", "max_point", "nv_location", "position", "optimized_position"):
+        point = tree.get(key)
+        if isinstance(point, dict) and ("x" in point or "z" in point):
+            return {axis: point[axis] for axis in ("x", "y", "z") if isinstance(point.get(axis), (int, float))}
+        if isinstance(point, list) and len(point) >= 2 and all(isinstance(v, (int, float)) for v in point[:3]):
+            return dict(zip(("x", "y", "z"), point[:3]))
+    return {}
+
+
+def measured_position(row) -> dict:
+    """
+    Position (x/y/z) an experiment measured, from its indexed results (e.g. the
+    maximum found by optimize); {} if it reported none. Unlike the row's x/y, this
+    never falls back to the position requested in the config.
+    """
+    results = row.get("results")
+    if isinstance(results, str):
+        results = json.loads(results)
+    return _result_position(results) if results else {}
+
+
+def _scalar_results(tree):
+    """Keep the small, non-array part of saved result data (fit parameters, positions, ...)."""
+    if isinstance(tree, dict):
+        if set(tree) == {"$array"}:
+            return None
+        kept = {k: _scalar_results(v) for k, v in tree.items()}
+        return {k: v for k, v in kept.items() if v is not None}
+    if isinstance(tree, list):
+        return [_scalar_results(v) for v in tree][:32]
+    return tree
+
+
+class RunCatalog:
+    """
+    SQLite index of every run directory: experiments launched (script, config hash,
+    key settings, duration, outputs, fitted results) and the files each run produced.
+
+    Populated as the agent runs experiments (record_experiment) and by scanning existing
+    run directories (backfill), so questions like "all ESR runs near (x, y) in the
+    last week" are answered by an indexed query instead of directory scans.
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock, self._conn:
+            self._conn.executescript(SCHEMA)
+            # Catalogs created before runner arguments were recorded
+            columns = {r["name"] for r in self._conn.execute("PRAGMA table_info(experiments)")}
+            if "args" not in columns:
+                self._conn.execute("ALTER TABLE experiments ADD COLUMN args TEXT")
+
+    def close(self):
+        self._conn.close()
+
+    # ------------------------------------------------------------------ writes
+
+    def record_run(self, run_id: str, run_dir: str, started_at: float = None):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR IGNORE INTO runs (run_id, run_dir, started_at) VALUES (?, ?, ?)",
+                (run_id, run_dir, started_at if started_at is not None else time.time()))
+
+    def record_experiment(self, run_id: str, script: str, config_path: str, started_at: float,
+                          duration_s: float = None, output: str = "", status: str = "ok", args=None):
+        """
+        Index one experiment run.
+
+        Args:
+            run_id: Agent run id (run directory name).
+            script: Runner script name: "ESR", "find_nv", "galvo_scan" or "optimize".
+            config_path: Config file passed to the runner.
+            started_at: Unix time the run was launched.
+            duration_s: Wall time of the run, if known. Time the runner spent waiting in the
+                instrument queue is subtracted, so durations reflect instrument time.
+            output: Runner stdout; the saved data and plot paths are parsed from it.
+            status: "ok" or "error".
+            args: The other runner arguments (e.g. ["--sweep", "adaptive"]), or None if unknown.
+
+        Returns:
+            The experiment row id (None if it was already indexed).
+        """
+        config_path = _native_path(config_path)
+        if duration_s is not None:
+            duration_s = max(0.0, duration_s - queue_wait(output))
+        config = None
+        if config_path and os.path.exists(config_path):
+            try:
+                with open(config_path, "r", encoding="utf-8") as f:
+                    config = json.load(f)
+            except (OSError, json.JSONDecodeError):
+                config = None
+
+        data_match = SAVED_DATA.search(output or "")
+        plot_match = SAVED_PLOT.search(output or "")
+        data_path = _native_path(data_match.group("path")) if data_match else None
+        plot_path = _native_path(plot_match.group("path")) if plot_match else None
+
+        row = key_settings(script, config)
+        results = None
+        if data_path and os.path.exists(data_path):
+            try:
+                with open(data_path, "r", encoding="utf-8") as f:
+                    sidecar = json.load(f)
+                tree = sidecar.get("data", sidecar)
+                results = _scalar_results(tree)
+                row.update(_result_position(tree))
+            except (OSError, json.JSONDecodeError):
+                pass
+
+        # ESR configs carry no position: the NV is wherever the last find_nv/optimize left the galvo
+        if row.get("x") is None:
+            previous = self._last_position(run_id, started_at)
+            if previous:
+                row["x"], row["y"] = previous["x"], previous["y"]
+
+        settings = (config or {}).get("scripts", {}).get(SCRIPT_KEYS.get(script, script), {}).get("settings")
+        with self._lock, self._conn:
+            cur = self._conn.execute(
+                """INSERT OR IGNORE INTO experiments
+                   (run_id, script, started_at, duration_s, status, config_path, config_hash, settings,
+                    x, y, z, freq_start, freq_stop, freq_points, power, data_path, plot_path, results, args)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                (run_id, script, started_at, duration_s, status, config_path,
+                 config_hash(config) if config is not None else None,
+                 json.dumps(settings) if settings is not None else None,
+                 row.get("x"), row.get("y"), row.get("z"),
+                 row.get("freq_start"), row.get("freq_stop"), row.get("freq_points"), row.get("power"),
+                 data_path, plot_path, json.dumps(results) if results is not None else None,
+                 json.dumps(list(args)) if args is not None else None))
+            return cur.lastrowid if cur.rowcount else None
+
+    def _last_position(self, run_id, before):
+        cur = self._conn.execute(
+            """SELECT x, y FROM experiments
+               WHERE run_id = ? AND started_at <= ? AND x IS NOT NULL AND script IN ('find_nv', 'optimize')
+               ORDER BY started_at DESC LIMIT 1""", (run_id, before))
+        row = cur.fetchone()
+        return dict(row) if row else None
+
+    def index_files(self, run_id: str, run_dir: str):
+        """
+        (Re)index every file under a run directory.
+        """
+        rows = []
+        for root, _, filenames in os.walk(run_dir):
+            for filename in filenames:
+                path = os.path.join(root, filename)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                kind = _file_kind(filename)
+                digest = None
+                if kind == "config":
+                    try:
+                        with open(path, "r", encoding="utf-8") as f:
+                            digest = config_hash(json.load(f))
+                    except (OSError, json.JSONDecodeError):
+                        pass
+                rows.append((path, run_id, kind, stat.st_size, stat.st_mtime, digest))
+        with self._lock, self._conn:
+            self._conn.executemany("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?)", rows)
+            self._conn.execute("UPDATE runs SET indexed_at = ? WHERE run_id = ?", (time.time(), run_id))
+
+    def backfill(self, runs_root: str, reindex: bool = False):
+        """
+        Index run directories that are not in the catalog yet: their files, plus the
+        experiments found in their agent logs (run commands, durations and outputs).
+
+        Returns:
+            Number of run directories indexed.
+        """
+        if not os.path.isdir(runs_root):
+            return 0
+        with self._lock:
+            known = {r["run_id"] for r in self._conn.execute("SELECT run_id FROM runs WHERE indexed_at IS NOT NULL")}
+        count = 0
+        for run_id in sorted(os.listdir(runs_root)):
+            run_dir = os.path.join(runs_root, run_id)
+            if not os.path.isdir(run_dir) or (run_id in known and not reindex):
+                continue
+            started_at = None
+            m = re.search(r"(\d{8}_\d{6})$", run_id)
+            if m:
+                started_at = datetime.strptime(m.group(1), "%Y%m%d_%H%M%S").timestamp()
+            self.record_run(run_id, run_dir, started_at)
+            self._backfill_logs(run_id, os.path.join(run_dir, "logs"))
+            self.index_files(run_id, run_dir)
+            count += 1
+        return count
+
+    def _backfill_logs(self, run_id, logs_dir):
+        if not os.path.isdir(logs_dir):
+            return
+        for filename in sorted(os.listdir(logs_dir)):
+            if not filename.startswith("agent_history"):
+                continue
+            pending = None
+            for record in parse_log(os.path.join(logs_dir, filename)):
+                action, content = record.get("action"), record.get("content", "")
+                if action == "run":
+                    m = RUN_COMMAND.search(content)
+                    if m:
+                        try:
+                            args = [a for a in parse_run_command(content[m.start():])["args"] if a != "--force"]
+                        except ValueError:
+                            args = None
+                        pending = (m.group("script"), m.group("config"), datetime.fromisoformat(record["ts"]).timestamp(),
+                                   args)
+                elif pending and action == "run_output":
+                    script, config, started, args = pending
+                    ended = datetime.fromisoformat(record["ts"]).timestamp()
+                    duration = record.get("latency_s") or (ended - started)
+                    self.record_experiment(run_id, script, config, started, duration, output=content, args=args)
+                    pending = None
+                elif pending and content.startswith("[System] Error running command"):
+                    script, config, started, args = pending
+                    self.record_experiment(run_id, script, config, started, status="error", args=args)
+                    pending = None
+
+    # ----------------------------------------------------------------- queries
+
+    def query_experiments(self, script: str = None, near=None, radius: float = None,
+                          since: float = None, until: float = None, run_id: str = None,
+                          status: str = None, limit: int = None, radius_um: float = None):
+        """
+        Indexed experiment lookup.
+
+        Args:
+            script: "ESR", "find_nv", "galvo_scan" or "optimize".
+            near: (x, y) position in galvo coordinates (V); requires radius or radius_um.
+            radius: Maximum distance from `near`, in galvo volts.
+            since / until: Unix time bounds on the launch time.
+            run_id: Restrict to one run.
+            status: "ok" or "error".
+            limit: Maximum number of rows (most recent first).
+            radius_um: Maximum distance from `near` in micrometres on the sample, converted
+                with GALVO_UM_PER_VOLT (used instead of radius).
+
+        Returns:
+            List of dictionaries, most recent first.
+        """
+        if radius_um is not None:
+            radius = radius_um / GALVO_UM_PER_VOLT
+        clauses, params = [], []
+        if script:
+            clauses.append("script = ?")
+            params.append(script)
+        if since is not None:
+            clauses.append("started_at >= ?")
+            params.append(since)
+        if until is not None:
+            clauses.append("started_at <= ?")
+            params.append(until)
+        if run_id:
+            clauses.append("run_id = ?")
+            params.append(run_id)
+        if status:
+            clauses.append("status = ?")
+            params.append(status)
+        if near is not None and radius is not None:
+            # Bounding box on the (x, y) index first, exact distance second
+            x, y = near
+            clauses.append("x BETWEEN ? AND ? AND y BETWEEN ? AND ?")
+            params += [x - radius, x + radius, y - radius, y + radius]
+            clauses.append("(x - ?) * (x - ?) + (y - ?) * (y - ?) <= ?")
+            params += [x, x, y, y, radius * radius]
+        sql = "SELECT * FROM experiments"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " ORDER BY started_at DESC"
+        if limit:
+            sql += f" LIMIT {int(limit)}"
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        out = []
+        for row in rows:
+            item = dict(row)
+            for key in ("settings", "results", "args"):
+                if item[key]:
+                    item[key] = json.loads(item[key])
+            out.append(item)
+        return out
+
+    def typical_durations(self):
+        """
+        Median wall time (s) of successful runs per script, e.g. {"ESR": 612.0, ...}.
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                """SELECT script, duration_s FROM experiments
+                   WHERE status = 'ok' AND duration_s IS NOT NULL""").fetchall()
+        by_script = {}
+        for row in rows:
+            by_script.setdefault(row["script"], []).append(row["duration_s"])
+        return {script: statistics.median(values) for script, values in by_script.items()}
+
+    def query_files(self, run_id: str = None, kind: str = None):
+        clauses, params = [], []
+        if run_id:
+            clauses.append("run_id = ?")
+            params.append(run_id)
+        if kind:
+            clauses.append("kind = ?")
+            params.append(kind)
+        sql = "SELECT * FROM files" + (" WHERE " + " AND ".join(clauses) if clauses else "") + " ORDER BY mtime"
+        with self._lock:
+            return [dict(r) for r in self._conn.execute(sql, params).fetchall()]
+
+
+def main():
+    """
+    Usage:
+      python agent/run_catalog.py backfill
+      python agent/run_catalog.py query --script ESR --near -2.1 -3.0 --radius 0.05 --days 7
+      python agent/run_catalog.py query --script ESR --near -2.1 -3.0 --radius-um 1
+    """
+    parser = argparse.ArgumentParser(description='Index and query NVExperiment runs')
+    parser.add_argument('command', choices=['backfill', 'query'])
+    parser.add_argument('--db', default=os.path.join('projects', 'NVExperiment', 'run_catalog.sqlite'))
+    parser.add_argument('--runs-root', default=os.path.join('projects', 'NVExperiment', 'runs'))
+    parser.add_argument('--script', default=None)
+    parser.add_argument('--near', type=float, nargs=2, default=None, metavar=('X', 'Y'))
+    parser.add_argument('--radius', type=float, default=None, help='Radius around --near in galvo volts')
+    parser.add_argument('--radius-um', type=float, default=None,
+                        help=f'Radius around --near in micrometres ({GALVO_UM_PER_VOLT:g} um per galvo volt)')
+    parser.add_argument('--days', type=float, default=None, help='Only runs launched in the last N days')
+    parser.add_argument('--reindex', action='store_true')
+    args = parser.parse_args()
+
+    catalog = RunCatalog(args.db)
+    if args.command == 'backfill':
+        n = catalog.backfill(args.runs_root, reindex=args.reindex)
+        print(f"[Catalog] Indexed {n} run directories into {args.db}")
+        return
+    since = (datetime.now() - timedelta(days=args.days)).timestamp() if args.days else None
+    start = time.perf_counter()
+    rows = catalog.query_experiments(script=args.script, near=args.near, radius=args.radius, since=since,
+                                      radius_um=args.radius_um)
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    for row in rows:
+        when = datetime.fromtimestamp(row["started_at"]).strftime("%Y-%m-%d %H:%M:%S")
+        print(f"[Catalog] {when} {row['run_id']} {row['script']} x={row['x']} y={row['y']} "
+              f"duration={row['duration_s']} config={row['config_path']}")
+    print(f"[Catalog] {len(rows)} experiments ({elapsed_ms:.1f} ms)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,243 @@
+import os
+import json
+import queue
+import threading
+from datetime import datetime
+
+import numpy as np
+
+WAL_SUFFIX = ".wal.jsonl"
+VECTORS_SUFFIX = ".vec.jsonl"
+LOCK_SUFFIX = ".lock"
+
+_STOP = object()
+
+
+def _chunks(role: str, content: str):
+    # Same granularity as rag_engine.search_similar: one chunk per line
+    return [line for line in f"{role}: {content}".split("\n") if line.strip()]
+
+
+def _read_jsonl(path: str):
+    records = []
+    if not os.path.exists(path):
+        return records
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                records.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue  # torn line after a crash; later records are still good
+    return records
+
+
+def _try_lock(path: str):
+    """
+    Take an exclusive lock on `path` without waiting. Returns the open file (keep it open
+    to hold the lock; _unlock releases it), or None if another session holds the lock.
+    The OS releases the lock when the process dies.
+    """
+    f = open(path, "a+b")
+    try:
+        if os.name == "nt":
+            import msvcrt
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        f.close()
+        return None
+    return f
+
+
+def _unlock(f):
+    if os.name == "nt":
+        import msvcrt
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+    f.close()
+
+
+def _pending(wal_path: str, vectors_path: str):
+    # Records in a write-ahead log that have no vectors yet
+    embedded = {r["seq"] for r in _read_jsonl(vectors_path) if "seq" in r}
+    return [r for r in _read_jsonl(wal_path) if "seq" in r and r["seq"] not in embedded]
+
+
+class SessionEmbedder:
+    """
+    Embeds conversation turns incrementally while the session runs.
+
+    append() writes each turn to an append-only write-ahead log
+    (`session_<id>.wal.jsonl`, flushed and fsynced) and queues it; a background thread
+    embeds it and appends the vectors to `session_<id>.vec.jsonl`. Both files live in
+    the embeddings directory, so the session is searchable (search_sessions) as soon
+    as a turn is embedded, a crash loses at most the turn being written, and nothing
+    has to be embedded at exit.
+
+    Each open session holds a lock on `session_<id>.lock`, which the OS releases if the
+    process dies. At startup the embedder looks for logs of other sessions whose lock is
+    free (sessions that crashed or were closed before their last turns were embedded)
+    and embeds their missing turns into their vectors files, so those turns become
+    searchable too.
+
+    Args:
+        embeddings_dir: Embeddings directory.
+        session_id: Session identifier (the agent's run directory name).
+        embed_fn: Function mapping a list of strings to an array of embeddings
+            (rag_engine.embed_text).
+    """
+
+    def __init__(self, embeddings_dir: str, session_id: str, embed_fn):
+        os.makedirs(embeddings_dir, exist_ok=True)
+        self.embed_fn = embed_fn
+        self.wal_path = os.path.join(embeddings_dir, f"session_{session_id}{WAL_SUFFIX}")
+        self.vectors_path = os.path.join(embeddings_dir, f"session_{session_id}{VECTORS_SUFFIX}")
+        self._queue = queue.Queue()
+        self._closed = False
+
+        self._lock = _try_lock(os.path.join(embeddings_dir, f"session_{session_id}{LOCK_SUFFIX}"))
+        if self._lock is None:
+            raise RuntimeError(f"Session {session_id} is already open in another embedder")
+        logged = _read_jsonl(self.wal_path)
+        self._seq = max((r["seq"] for r in logged if "seq" in r), default=-1) + 1
+        self._wal = open(self.wal_path, "a", encoding="utf-8")
+        self._vectors = open(self.vectors_path, "a", encoding="utf-8")
+        self._thread = threading.Thread(target=self._run, name="session-embedder", daemon=True)
+        self._thread.start()
+        for record in _pending(self.wal_path, self.vectors_path):
+            self._queue.put(record)
+        self._recover_orphans(embeddings_dir)
+
+    def _recover_orphans(self, embeddings_dir: str):
+        # Queue the unembedded turns of other sessions' logs that no live session holds.
+        # The orphan's lock is kept until the worker has written its vectors.
+        for filename in sorted(os.listdir(embeddings_dir)):
+            wal_path = os.path.join(embeddings_dir, filename)
+            if not filename.endswith(WAL_SUFFIX) or wal_path == self.wal_path:
+                continue
+            stem = wal_path[:-len(WAL_SUFFIX)]
+            lock = _try_lock(stem + LOCK_SUFFIX)
+            if lock is None:
+                continue   # the session is still open
+            records = _pending(wal_path, stem + VECTORS_SUFFIX)
+            if not records:
+                _unlock(lock)
+                continue
+            print(f"[Embeddings] Embedding {len(records)} turns left over from {os.path.basename(wal_path)}")
+            self._queue.put(("orphan", stem + VECTORS_SUFFIX, records, lock))
+
+    def append(self, role: str, content: str) -> int:
+        """Log one turn and queue it for embedding. Returns its sequence number."""
+        if self._closed:
+            return -1
+        record = {"seq": self._seq, "ts": datetime.now().isoformat(timespec="milliseconds"),
+                  "role": role, "content": content}
+        self._seq += 1
+        self._wal.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._wal.flush()
+        os.fsync(self._wal.fileno())
+        self._queue.put(record)
+        return record["seq"]
+
+    def flush(self, timeout: float = 30.0):
+        """Block until every turn appended so far is embedded."""
+        if self._closed:
+            return
+        done = threading.Event()
+        self._queue.put(done)
+        done.wait(timeout)
+
+    def close(self, timeout: float = 1.0):
+        """
+        Stop the worker. The files are closed and the session lock released by the worker
+        once it has stopped; turns it has not embedded by then stay in the log and are
+        embedded by the next embedder opened in this directory.
+        """
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+
+    def _embed(self, records, vectors_file):
+        chunks = [(r["seq"], text) for r in records for text in _chunks(r["role"], r["content"])]
+        try:
+            vectors = np.asarray(self.embed_fn([text for _, text in chunks])) if chunks else []
+        except Exception as e:
+            print(f"[Embeddings] Background embedding failed: {str(e)}")
+            return
+        for (seq, text), vector in zip(chunks, vectors):
+            vectors_file.write(json.dumps({"seq": seq, "text": text,
+                                           "embedding": [round(float(v), 6) for v in vector]}) + "\n")
+        vectors_file.flush()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            while not self._queue.empty() and len(batch) < 32:
+                batch.append(self._queue.get_nowait())
+            records = [r for r in batch if isinstance(r, dict)]
+            if records:
+                self._embed(records, self._vectors)
+            for item in batch:
+                if isinstance(item, tuple) and item[0] == "orphan":
+                    _, vectors_path, orphan_records, lock = item
+                    try:
+                        with open(vectors_path, "a", encoding="utf-8") as f:
+                            self._embed(orphan_records, f)
+                    finally:
+                        _unlock(lock)
+                elif isinstance(item, threading.Event):
+                    item.set()
+            if any(item is _STOP for item in batch):
+                # Nothing else writes these files once the worker stops
+                self._vectors.close()
+                self._wal.close()
+                _unlock(self._lock)
+                return
+
+
+# path -> (size, texts, matrix); session vector files only grow, so a cached file is reloaded when its size changes
+_vector_cache = {}
+
+
+def _load_vectors(path: str):
+    size = os.path.getsize(path)
+    cached = _vector_cache.get(path)
+    if cached and cached[0] == size:
+        return cached[1], cached[2]
+    records = _read_jsonl(path)
+    texts = [r["text"] for r in records]
+    matrix = np.array([r["embedding"] for r in records], dtype="float32") if records else None
+    _vector_cache[path] = (size, texts, matrix)
+    return texts, matrix
+
+
+def search_sessions(query: str, embeddings_dir: str, embed_fn, top_k: int = 3):
+    """
+    Search the incrementally embedded sessions (current and past) in the embeddings directory.
+
+    Returns:
+        List of dictionaries with text, source file and similarity score
+        (1 / (1 + L2 distance), as in rag_engine.search_similar), best first.
+    """
+    if not os.path.isdir(embeddings_dir):
+        return []
+    paths = [os.path.join(embeddings_dir, f) for f in os.listdir(embeddings_dir) if f.endswith(VECTORS_SUFFIX)]
+    if not paths:
+        return []
+    query_vector = np.asarray(embed_fn(query), dtype="float32").reshape(-1)
+    results = []
+    for path in paths:
+        texts, matrix = _load_vectors(path)
+        if matrix is None:
+            continue
+        distances = np.linalg.norm(matrix - query_vector, axis=1)
+        for idx in np.argsort(distances)[:top_k]:
+            results.append({"text": texts[idx], "source": os.path.basename(path),
+                            "score": float(1.0 / (1.0 + distances[idx]))})
+    results.sort(key=lambda r: r["score"], reverse=True)
+    return results[:top_k]
@@ -0,0 +1 @@
+"""Simulated b26_toolkit (see ../README.md)."""
@@ -0,0 +1,112 @@
+"""
+Shared pieces of the simulated toolkit scripts: config loading, the progress signal,
+the simulated sample (NV positions) and instrument timing.
+"""
+import os
+import json
+import time
+import tempfile
+
+import numpy as np
+
+# Deterministic sample: NV positions (galvo V) and their ESR line splittings (Hz)
+NV_POSITIONS = np.array([[-2.1, -3.0], [1.4, 0.2], [0.35, 2.6], [-3.2, 1.1], [2.8, -1.7], [-0.6, -0.9]])
+NV_SPLITTINGS = np.array([18e6, 42e6, 0.0, 65e6, 27e6, 9e6])
+NV_WIDTH = 0.12      # spot size, V
+FOCUS_Z = 0.15       # best focus, V
+DRIFT_PER_HOUR = np.array([0.004, -0.003, 0.01])
+
+
+def time_scale() -> float:
+    return float(os.environ.get("SIM_TIME_SCALE", "0"))
+
+
+def wait(seconds: float):
+    """Sleep for the simulated share of `seconds` of instrument time."""
+    scale = time_scale()
+    if scale > 0 and seconds > 0:
+        time.sleep(seconds * scale)
+
+
+def drift(now: float = None):
+    """Sample drift (x, y, z) relative to the start of the hour, V."""
+    now = time.time() if now is None else now
+    return DRIFT_PER_HOUR * ((now % 3600.0) / 3600.0)
+
+
+def counts(x, y, z=FOCUS_Z, rng=None):
+    """Fluorescence count rate (kcounts/s) at galvo position(s) x, y and focus z."""
+    dx, dy, dz = drift()
+    x, y = np.asarray(x, dtype=float) - dx, np.asarray(y, dtype=float) - dy
+    signal = np.zeros(np.broadcast(x, y).shape)
+    for px, py in NV_POSITIONS:
+        signal = signal + 60.0 * np.exp(-((x - px) ** 2 + (y - py) ** 2) / (2 * NV_WIDTH ** 2))
+    focus = np.exp(-((z - FOCUS_Z - dz) ** 2) / (2 * 0.2 ** 2))
+    background = 8.0
+    rate = background + signal * focus
+    if rng is not None:
+        rate = rng.poisson(rate * 10) / 10.0
+    return rate
+
+
+def _state_path() -> str:
+    return os.environ.get("SIM_STATE", os.path.join(tempfile.gettempdir(), "nv_sim_state.json"))
+
+
+def galvo_position():
+    """Current simulated galvo position (x, y), persisted between script runs."""
+    try:
+        with open(_state_path(), "r") as f:
+            state = json.load(f)
+        return state["x"], state["y"]
+    except (OSError, ValueError, KeyError):
+        return 0.0, 0.0
+
+
+def set_galvo_position(x: float, y: float):
+    with open(_state_path(), "w") as f:
+        json.dump({"x": float(x), "y": float(y)}, f)
+
+
+def nearest_nv(x: float, y: float):
+    """Index of the NV nearest (x, y) and its distance (V), drift included."""
+    dx, dy, _ = drift()
+    distances = np.hypot(NV_POSITIONS[:, 0] + dx - x, NV_POSITIONS[:, 1] + dy - y)
+    index = int(np.argmin(distances))
+    return index, float(distances[index])
+
+
+class Signal:
+    """Minimal stand-in for the Qt signal the toolkit scripts emit progress on."""
+
+    def __init__(self):
+        self._slots = []
+
+    def connect(self, slot):
+        self._slots.append(slot)
+
+    def emit(self, *args):
+        for slot in self._slots:
+            slot(*args)
+
+
+class SimScript:
+    """
+    Base class: loads `settings` from the config's script block, like the toolkit
+    scripts do, and provides data, progress and abort handling.
+    """
+    script_key = None
+
+    def __init__(self, config_file=None, settings=None, **kwargs):
+        if settings is None and config_file is not None:
+            with open(config_file, "r") as f:
+                settings = json.load(f)["scripts"][self.script_key]["settings"]
+        self.settings = settings or {}
+        self.instruments = {}
+        self.data = {}
+        self.updateProgress = Signal()
+        self._abort = False
+        self.rng = np.random.default_rng(0)
+
+    def stop(self):
+        self._abort = True
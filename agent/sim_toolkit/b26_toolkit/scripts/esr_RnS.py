@@ -0,0 +1,52 @@
+import numpy as np
+
+from b26_toolkit.scripts._sim import SimScript, NV_SPLITTINGS, NV_WIDTH, counts, galvo_position, nearest_nv, wait
+
+
+class ESR_RnS(SimScript):
+    """
+    Simulated ESR: Lorentzian dips at zfs +/- splitting/2 for the NV at the current
+    galvo position (left there by find_nv/optimize; no dips if no NV is in focus),
+    averaged esr_avg times with shot noise. updateProgress is emitted after every average.
+    """
+    script_key = "esr_RnS"
+
+    def _frequencies(self):
+        s = self.settings
+        if s.get("range_type", "start_stop") == "center_range":
+            return np.linspace(s["freq_start"] - s["freq_stop"] / 2, s["freq_start"] + s["freq_stop"] / 2, int(s["freq_points"]))
+        return np.linspace(s["freq_start"], s["freq_stop"], int(s["freq_points"]))
+
+    def _function(self):
+        s = self.settings
+        frequency = self._frequencies()
+        zfs = s.get("fit_constants", {}).get("zfs", 2.87e9)
+        x, y = galvo_position()
+        nv, distance = nearest_nv(x, y)
+        contrast = 0.06 * np.exp(-distance ** 2 / (2 * NV_WIDTH ** 2))
+        split = NV_SPLITTINGS[nv]
+        width = 6e6
+        spectrum = np.ones_like(frequency)
+        for centre in (zfs - split / 2, zfs + split / 2):
+            spectrum -= contrast / (1 + ((frequency - centre) / width) ** 2)
+        rate = float(counts(x, y))
+
+        averages = int(s.get("esr_avg", 1))
+        running = np.zeros_like(frequency)
+        for i in range(averages):
+            if self._abort:
+                break
+            photons = rate * 1e3 * s.get("integration_time", 0.05)
+            scan = self.rng.poisson(spectrum * photons) / photons
+            running = (running * i + scan) / (i + 1)
+            self.data = {"frequency": frequency, "data": running.copy(), "fit_params": None}
+            wait(len(frequency) * (s.get("integration_time", 0.05) + s.get("mw_generator_switching_time", 0.01)))
+            self.updateProgress.emit(int(100 * (i + 1) / averages))
+        dips = np.sort(frequency[np.argsort(self.data["data"])[:2]])
+        self.data["fit_params"] = [float(np.mean(self.data["data"])), 0.06, width, float(dips[0]), float(dips[-1])]
+
+    def _plot(self, axes_list, data=None):
+        data = self.data if data is None else data
+        axes_list[0].plot(np.asarray(data["frequency"]) / 1e9, data["data"])
+        axes_list[0].set_xlabel("frequency (GHz)")
+        axes_list[0].set_ylabel("norm. fluorescence")
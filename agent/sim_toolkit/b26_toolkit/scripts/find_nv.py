@@ -0,0 +1,36 @@
+import numpy as np
+
+from b26_toolkit.scripts._sim import SimScript, counts, set_galvo_position, wait
+
+
+class FindNV(SimScript):
+    """
+    Simulated FindNV: images a num_points x num_points square of side sweep_range
+    around initial_point and moves the galvo to the brightest pixel.
+    """
+    script_key = "find_nv"
+
+    def _function(self):
+        s = self.settings
+        point = s.get("initial_point", {"x": 0.0, "y": 0.0})
+        half, n = s.get("sweep_range", 0.35) / 2, int(s.get("num_points", 61))
+        xs = np.linspace(point["x"] - half, point["x"] + half, n)
+        ys = np.linspace(point["y"] - half, point["y"] + half, n)
+        image = np.zeros((n, n))
+        for i, y in enumerate(ys):
+            if self._abort:
+                break
+            image[i] = counts(xs, y, rng=self.rng)
+            wait(n * 0.002)
+            self.updateProgress.emit(int(100 * (i + 1) / n))
+        iy, ix = np.unravel_index(np.argmax(image), image.shape)
+        maximum = {"x": float(xs[ix]), "y": float(ys[iy])}
+        set_galvo_position(maximum["x"], maximum["y"])
+        self.data = {"image_data": image, "extent": [float(xs[0]), float(xs[-1]), float(ys[-1]), float(ys[0])],
+                     "maximum_point": maximum, "initial_point": dict(point)}
+
+    def _plot(self, axes_list, data=None):
+        data = self.data if data is None else data
+        axes_list[0].imshow(np.asarray(data["image_data"]), extent=data["extent"], cmap="pink")
+        axes_list[0].plot(data["maximum_point"]["x"], data["maximum_point"]["y"], "x", color="cyan")
+        axes_list[0].set_title("FindNV")
@@ -0,0 +1,37 @@
+import numpy as np
+
+from b26_toolkit.scripts._sim import SimScript, counts, set_galvo_position, wait
+
+
+class GalvoScan(SimScript):
+    """
+    Simulated GalvoScan: confocal image between point_a and point_b ("corner" mode)
+    or of size point_b around point_a ("center" mode).
+    """
+    script_key = "galvo_scan"
+
+    def _function(self):
+        s = self.settings
+        a, b = s["point_a"], s["point_b"]
+        if s.get("RoI_mode", "corner") == "center":
+            x0, x1 = a["x"] - b["x"] / 2, a["x"] + b["x"] / 2
+            y0, y1 = a["y"] - b["y"] / 2, a["y"] + b["y"] / 2
+        else:
+            x0, x1, y0, y1 = a["x"], b["x"], a["y"], b["y"]
+        nx, ny = int(s["num_points"]["x"]), int(s["num_points"]["y"])
+        xs, ys = np.linspace(x0, x1, nx), np.linspace(y0, y1, ny)
+        image = np.zeros((ny, nx))
+        for i, y in enumerate(ys):
+            if self._abort:
+                break
+            image[i] = counts(xs, y, rng=self.rng)
+            wait(nx * (s.get("time_per_pt", 0.002) + s.get("settle_time", 0.0002)))
+            self.updateProgress.emit(int(100 * (i + 1) / ny))
+        if s.get("ending_behavior") == "return_to_start":
+            set_galvo_position(x0, y0)
+        self.data = {"image_data": image, "extent": [float(x0), float(x1), float(y1), float(y0)]}
+
+    def _plot(self, axes_list, data=None):
+        data = self.data if data is None else data
+        axes_list[0].imshow(np.asarray(data["image_data"]), extent=data["extent"], cmap="pink")
+        axes_list[0].set_title("GalvoScan")
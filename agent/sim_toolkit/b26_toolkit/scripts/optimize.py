@@ -0,0 +1,50 @@
+import numpy as np
+
+from b26_toolkit.scripts._sim import SimScript, FOCUS_Z, counts, drift, galvo_position, set_galvo_position, wait
+
+
+class optimize(SimScript):
+    """
+    Simulated optimize: sweeps the enabled axes around the current galvo position and
+    focus and moves to the maximum of each sweep.
+    """
+    script_key = "optimize"
+
+    def _function(self):
+        s = self.settings
+        x, y = galvo_position()
+        z = FOCUS_Z
+        sweeps = {}
+        axes = [axis for axis in ("x", "y", "z") if s.get(f"optimizing_{axis}", axis == "z")]
+        for k, axis in enumerate(axes):
+            if self._abort:
+                break
+            centre = {"x": x, "y": y, "z": z + drift()[2]}[axis]
+            values = np.linspace(centre - s["sweep_range"][axis] / 2, centre + s["sweep_range"][axis] / 2,
+                                 int(s["num_points"][axis]))
+            if axis == "x":
+                signal = counts(values, y, rng=self.rng)
+            elif axis == "y":
+                signal = counts(x, values, rng=self.rng)
+            else:
+                signal = counts(x, y, values, rng=self.rng)
+            best = float(values[int(np.argmax(signal))])
+            if axis == "x":
+                x = best
+            elif axis == "y":
+                y = best
+            else:
+                z = best
+            sweeps[axis] = {"position": values, "counts": signal}
+            device = "z-piezo" if axis == "z" else "galvo"
+            wait(len(values) * (s["time_per_pt"][device] + s["settle_time"][device]))
+            self.updateProgress.emit(int(100 * (k + 1) / len(axes)))
+        set_galvo_position(x, y)
+        self.data = {"maximum_point": {"x": float(x), "y": float(y), "z": float(z)}, "sweeps": sweeps}
+
+    def _plot(self, axes_list, data=None):
+        data = self.data if data is None else data
+        for axis, sweep in data["sweeps"].items():
+            axes_list[0].plot(sweep["position"], sweep["counts"], label=axis)
+        axes_list[0].legend()
+        axes_list[0].set_title("optimize")
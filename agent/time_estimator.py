@@ -0,0 +1,255 @@
+"""
+Instrument time of experiment runs, estimated from their config settings.
+
+The nominal time follows from the settings the scripts spend their time on:
+
+    ESR         esr_avg x freq_points x (integration_time + mw_generator_switching_time)
+                (per pass for --sweep adaptive)
+    galvo_scan  num_points.x x num_points.y x (time_per_pt + settle_time)
+    find_nv     num_points^2 x FIND_NV_TIME_PER_PT x number_of_attempts
+    optimize    num_points x (time_per_pt + settle_time) per optimized axis
+
+plus RUN_OVERHEAD_S for starting the runner and the instruments. The hardware adds its
+own overhead (DAQ task setup, generator settling, data transfer), so the nominal time is
+calibrated per script against the durations of earlier successful runs in the run catalog
+(durations exclude time spent in the instrument queue; the nominal time of each run is
+worked out with the runner arguments it was launched with): actual = overhead + scale x
+nominal measurement time, fitted by least squares. ESR runs with --stop-snr (which stop
+whenever the SNR is reached) or without recorded arguments are left out of the fit. The spread of the earlier runs around
+the fit gives the range of an estimate. Without history the nominal time is used.
+
+Usage:
+  python agent/time_estimator.py projects/NVExperiment/configs/default_esr_config.json [--args="--sweep adaptive"]
+  python agent/time_estimator.py --calibration
+"""
+import os
+import json
+import shlex
+import argparse
+import statistics
+
+from run_catalog import RunCatalog, SCRIPT_KEYS
+from config_store import script_key
+
+# Seconds per run spent outside the measurement (process start, instrument setup, saving)
+RUN_OVERHEAD_S = 5.0
+
+# find_nv counts for a fixed time per pixel (the script has no setting for it)
+FIND_NV_TIME_PER_PT = 0.002
+
+# Earlier runs needed to fit overhead and scale, and the most recent runs used per script
+MIN_FIT_RUNS = 3
+CALIBRATION_RUNS = 200
+
+# Runs estimated to take longer than this are warned about before launch
+LONG_RUN_S = 15 * 60.0
+
+# Config script key -> runner script name
+SCRIPT_NAMES = {key: name for name, key in SCRIPT_KEYS.items()}
+
+
+def runner_option(args, name: str, default, cast=float):
+    """Value of "--name value" or "--name=value" in a runner argument list, or `default`."""
+    args = list(args)
+    for i, arg in enumerate(args):
+        if arg == name and i + 1 < len(args):
+            return cast(args[i + 1])
+        if arg.startswith(name + "="):
+            return cast(arg.split("=", 1)[1])
+    return default
+
+
+def esr_passes(settings: dict, args=()):
+    """(points, averages) of each ESR pass the runner makes with these settings and arguments."""
+    points, averages = int(settings.get("freq_points", 0)), int(settings.get("esr_avg", 1))
+    if runner_option(args, "--sweep", "uniform", str) != "adaptive":
+        return [(points, averages)]
+    coarse = runner_option(args, "--coarse-points", 40, int)
+    budget = runner_option(args, "--point-budget", 120, int)
+    coarse_avg = runner_option(args, "--coarse-avg", averages, int)
+    # Dense passes are only made around dips; assume the whole budget is used
+    return [(coarse, coarse_avg), (max(0, budget - coarse), averages)]
+
+
+def optimize_axes(settings: dict):
+    """(points, time per point, settle time) of each axis optimize sweeps."""
+    axes = []
+    for axis in ("x", "y", "z"):
+        if settings.get(f"optimizing_{axis}", axis == "z"):
+            device = "z-piezo" if axis == "z" else "galvo"
+            axes.append((int(settings["num_points"][axis]), settings["time_per_pt"][device],
+                         settings["settle_time"][device]))
+    return axes
+
+
+def measurement_seconds(name: str, settings: dict, args=()) -> float:
+    """
+    Nominal measurement time (s) of one run, without the run overhead. ESR runs with
+    --stop-snr may stop earlier; the full number of averages is assumed.
+
+    Args:
+        name: Runner script name ("ESR", "find_nv", "galvo_scan" or "optimize").
+        settings: The "settings" of the config's script.
+        args: Other runner arguments (e.g. ["--sweep", "adaptive"]).
+
+    Raises:
+        ValueError: For an unknown script; KeyError/TypeError for settings it needs that are
+            missing or malformed.
+    """
+    s = settings
+    if name == "ESR":
+        per_point = s.get("integration_time", 0.05) + s.get("mw_generator_switching_time", 0.01)
+        return sum(points * averages * per_point for points, averages in esr_passes(s, args))
+    if name == "galvo_scan":
+        pixels = s["num_points"]["x"] * s["num_points"]["y"]
+        return pixels * (s.get("time_per_pt", 0.002) + s.get("settle_time", 0.0002))
+    if name == "find_nv":
+        return int(s.get("num_points", 61)) ** 2 * FIND_NV_TIME_PER_PT * int(s.get("number_of_attempts", 1))
+    if name == "optimize":
+        return sum(points * (per_point + settle) for points, per_point, settle in optimize_axes(s))
+    raise ValueError(f"Unknown script: {name}")
+
+
+def format_duration(seconds: float) -> str:
+    if seconds < 90:
+        return f"{seconds:.0f} s"
+    if seconds < 2 * 3600:
+        return f"{seconds / 60:.1f} min"
+    return f"{seconds / 3600:.1f} h"
+
+
+def format_estimate(estimate: dict) -> str:
+    """E.g. "~10.1 min (8.3-12.0 min, calibrated on 14 earlier ESR runs)"."""
+    text = f"~{format_duration(estimate['seconds'])}"
+    if estimate["calibrated"]:
+        return (text + f" ({format_duration(estimate['low_s'])}-{format_duration(estimate['high_s'])}, "
+                f"calibrated on {estimate['runs']} earlier {estimate['script']} runs)")
+    return text + " (nominal, from the settings only)"
+
+
+class TimeEstimator:
+    """
+    Estimates the instrument time of runs, calibrated on the run catalog.
+
+    Args:
+        catalog: RunCatalog with the durations of earlier runs, or None for nominal estimates.
+        max_runs: Most recent successful runs per script used for the calibration.
+    """
+
+    def __init__(self, catalog: RunCatalog = None, max_runs: int = CALIBRATION_RUNS):
+        self.catalog = catalog
+        self.max_runs = max_runs
+        # script -> {"overhead_s", "scale", "runs", "low", "high"}; low/high are the 10th and
+        # 90th percentile of actual/estimated over the calibration runs
+        self.calibration = {}
+        self.calibrate()
+
+    def calibrate(self) -> dict:
+        """Refit every script on the catalog's current runs and return the calibration."""
+        self.calibration = {}
+        if self.catalog is None:
+            return self.calibration
+        for name in SCRIPT_KEYS:
+            pairs = []
+            for row in self.catalog.query_experiments(script=name, status="ok", limit=self.max_runs):
+                if row["duration_s"] is None or not isinstance(row["settings"], dict):
+                    continue
+                args = row.get("args")
+                if name == "ESR" and (args is None or runner_option(args, "--stop-snr", None) is not None):
+                    continue
+                try:
+                    pairs.append((measurement_seconds(name, row["settings"], args or ()), row["duration_s"]))
+                except (KeyError, TypeError, ValueError):
+                    continue
+            if len(pairs) >= MIN_FIT_RUNS:
+                self.calibration[name] = self._fit(pairs)
+        return self.calibration
+
+    @staticmethod
+    def _fit(pairs) -> dict:
+        nominal, actual = [p[0] for p in pairs], [p[1] for p in pairs]
+        overhead, scale = None, None
+        if statistics.pvariance(nominal) > 0:
+            mean_n, mean_a = statistics.fmean(nominal), statistics.fmean(actual)
+            scale = (sum((n - mean_n) * (a - mean_a) for n, a in pairs)
+                     / sum((n - mean_n) ** 2 for n in nominal))
+            overhead = mean_a - scale * mean_n
+        if scale is None or scale <= 0 or overhead < 0:
+            # All runs alike (or a fit that makes no sense): keep the nominal overhead and
+            # scale the measurement time by the median ratio
+            overhead = min(RUN_OVERHEAD_S, min(actual))
+            ratios = [(a - overhead) / n for n, a in pairs if n > 0]
+            scale = max(0.0, statistics.median(ratios)) if ratios else 1.0
+        errors = sorted(a / max(overhead + scale * n, 1e-9) for n, a in pairs)
+        low, high = errors[int(0.1 * (len(errors) - 1))], errors[int(round(0.9 * (len(errors) - 1)))]
+        return {"overhead_s": overhead, "scale": scale, "runs": len(pairs),
+                "low": min(low, 1.0), "high": max(high, 1.0)}
+
+    def estimate(self, name: str, settings: dict, args=()) -> dict:
+        """
+        Estimate one run.
+
+        Returns:
+            {"script", "seconds", "low_s", "high_s", "nominal_s", "calibrated", "runs"}.
+
+        Raises:
+            ValueError, KeyError, TypeError: As measurement_seconds().
+        """
+        measure = measurement_seconds(name, settings, args)
+        nominal = RUN_OVERHEAD_S + measure
+        fit = self.calibration.get(name)
+        if fit is None:
+            return {"script": name, "seconds": nominal, "low_s": nominal, "high_s": nominal,
+                    "nominal_s": nominal, "calibrated": False, "runs": 0}
+        seconds = fit["overhead_s"] + fit["scale"] * measure
+        return {"script": name, "seconds": seconds, "low_s": seconds * fit["low"], "high_s": seconds * fit["high"],
+                "nominal_s": nominal, "calibrated": True, "runs": fit["runs"]}
+
+    def estimate_config(self, config, args=(), name: str = None):
+        """Estimate a run of a loaded config (script taken from the config); None if it cannot be."""
+        key = script_key(config)
+        name = name or SCRIPT_NAMES.get(key)
+        try:
+            return self.estimate(name, config["scripts"][SCRIPT_KEYS[name]]["settings"], args)
+        except (KeyError, TypeError, ValueError):
+            return None
+
+    def default_durations(self, store) -> dict:
+        """{script: estimated seconds} of a run of each default config in a ConfigStore."""
+        durations = {}
+        for key, (_, config, _) in store.defaults.items():
+            estimate = self.estimate_config(config)
+            if estimate is not None:
+                durations[estimate["script"]] = estimate["seconds"]
+        return durations
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Estimate the instrument time of a run")
+    parser.add_argument("config", nargs="?", default=None, help="Config file to estimate")
+    parser.add_argument("--args", default="", help='Runner arguments, e.g. --args="--sweep adaptive"')
+    parser.add_argument("--calibration", action="store_true", help="Show the calibration per script")
+    parser.add_argument("--db", default=os.path.join("projects", "NVExperiment", "run_catalog.sqlite"))
+    args = parser.parse_args()
+
+    estimator = TimeEstimator(RunCatalog(args.db) if os.path.exists(args.db) else None)
+    if args.calibration or not args.config:
+        for name in SCRIPT_KEYS:
+            fit = estimator.calibration.get(name)
+            if fit:
+                print(f"[Estimate] {name}: {fit['overhead_s']:.1f} s + {fit['scale']:.2f} x nominal "
+                      f"({fit['runs']} runs, actual/estimated {fit['low']:.2f}-{fit['high']:.2f})")
+            else:
+                print(f"[Estimate] {name}: nominal (fewer than {MIN_FIT_RUNS} runs in the catalog)")
+    if args.config:
+        with open(args.config, "r", encoding="utf-8") as f:
+            estimate = estimator.estimate_config(json.load(f), shlex.split(args.args))
+        if estimate is None:
+            print(f"[Estimate] {args.config} is not a config of a runner script")
+        else:
+            print(f"[Estimate] {estimate['script']}: {format_estimate(estimate)}"
+                  + (f"; nominal {format_duration(estimate['nominal_s'])}" if estimate["calibrated"] else ""))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,325 @@
+"""
+Lightweight tracing for the agent: timed spans, latency histograms and counters.
+
+    tracer = Tracer(enabled=True, jsonl_path="logs/trace.jsonl")
+    with tracer.span("call_llm", model="...") as span:
+        response = call_llm(...)
+        span.set(response_bytes=len(response))
+    tracer.count("llm_bytes_sent", len(prompt))
+
+Finished spans are buffered and appended to a JSON-lines file on flush(); every span
+also feeds a per-name latency histogram. render_prometheus() returns the histograms
+and counters in the Prometheus text format, and serve() exposes them on /metrics.
+
+A disabled tracer returns one shared no-op span and ignores counts, so the calls can
+stay in the code at negligible cost.
+
+Usage (summarize a trace file):
+  python tracing.py logs/trace_20250514_082859.jsonl
+"""
+import os
+import json
+import time
+import uuid
+import bisect
+import argparse
+import threading
+import statistics
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Span latency buckets in seconds (upper bounds), from prompt building to full ESR runs
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0, 1800.0)
+
+METRIC_PREFIX = "nv_agent"
+
+
+class _NoopSpan:
+    """Returned by a disabled tracer."""
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **attrs):
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class Span:
+    """
+    One timed operation. Use as a context manager; attributes can be added with set()
+    while it is open. Spans opened inside it on the same thread become its children.
+    """
+    __slots__ = ("tracer", "name", "attrs", "span_id", "parent_id", "started_at", "_start")
+
+    def __init__(self, tracer, name, attrs):
+        self.tracer = tracer
+        self.name = name
+        self.attrs = attrs
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = None
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def __enter__(self):
+        stack = self.tracer._stack()
+        self.parent_id = stack[-1].span_id if stack else None
+        stack.append(self)
+        self.started_at = time.time()
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        duration = time.perf_counter() - self._start
+        stack = self.tracer._stack()
+        if stack and stack[-1] is self:
+            stack.pop()
+        self.tracer._finish(self, duration, None if exc_type is None else f"{exc_type.__name__}: {exc}")
+        return False
+
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus sense."""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)   # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        """[(upper bound, count <= bound)] including +Inf."""
+        total, out = 0, []
+        for bound, n in zip(list(self.buckets) + [float("inf")], self.counts):
+            total += n
+            out.append((bound, total))
+        return out
+
+
+def _label_string(labels) -> str:
+    if not labels:
+        return ""
+    def escape(value):
+        return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    return "{" + ",".join(f'{k}="{escape(v)}"' for k, v in sorted(labels)) + "}"
+
+
+def _format_bound(bound: float) -> str:
+    return "+Inf" if bound == float("inf") else repr(float(bound))
+
+
+class Tracer:
+    """
+    Collects spans, histograms and counters for one agent session.
+
+    Args:
+        enabled: If False, span() returns NOOP_SPAN and count()/observe() do nothing.
+        jsonl_path: File finished spans are appended to on flush(); None keeps metrics only.
+        trace_id: Written with every span (defaults to a random id).
+        buckets: Histogram bucket upper bounds in seconds.
+    """
+
+    def __init__(self, enabled: bool = False, jsonl_path: str = None, trace_id: str = None,
+                 buckets=DEFAULT_BUCKETS):
+        self.enabled = enabled
+        self.jsonl_path = jsonl_path
+        self.trace_id = trace_id or uuid.uuid4().hex[:16]
+        self.buckets = buckets
+        self.histograms = {}   # span name -> Histogram
+        self.counters = {}     # (name, ((label, value), ...)) -> float
+        self._pending = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._server = None
+
+    def _stack(self):
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def span(self, name: str, **attrs):
+        """Open a span (use with `with`)."""
+        if not self.enabled:
+            return NOOP_SPAN
+        return Span(self, name, attrs)
+
+    def traced(self, name: str = None):
+        """Decorator that runs the function inside a span named `name` (default: its name)."""
+        def decorator(fn):
+            span_name = name or fn.__name__
+
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return fn(*args, **kwargs)
+                with Span(self, span_name, {}):
+                    return fn(*args, **kwargs)
+            wrapper.__name__ = fn.__name__
+            wrapper.__doc__ = fn.__doc__
+            wrapper.__wrapped__ = fn
+            return wrapper
+        return decorator
+
+    def count(self, name: str, value: float = 1, **labels):
+        """Add `value` to the counter `name` with the given labels."""
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name: str, seconds: float):
+        """Record a duration in the histogram `name` without a span."""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._histogram(name).observe(seconds)
+
+    def _histogram(self, name):
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = self.histograms[name] = Histogram(self.buckets)
+        return histogram
+
+    def _finish(self, span, duration, error):
+        record = {
+            "ts": datetime.fromtimestamp(span.started_at).isoformat(timespec="milliseconds"),
+            "trace": self.trace_id,
+            "span": span.span_id,
+            "parent": span.parent_id,
+            "name": span.name,
+            "duration_s": round(duration, 6),
+        }
+        if error:
+            record["error"] = error
+        if span.attrs:
+            record["attrs"] = span.attrs
+        with self._lock:
+            self._histogram(span.name).observe(duration)
+            if self.jsonl_path:
+                self._pending.append(record)
+
+    def flush(self):
+        """Append the spans finished since the last flush to the JSON-lines file."""
+        with self._lock:
+            pending, self._pending = self._pending, []
+        if not pending or not self.jsonl_path:
+            return
+        os.makedirs(os.path.dirname(self.jsonl_path) or ".", exist_ok=True)
+        with open(self.jsonl_path, "a", encoding="utf-8") as f:
+            for record in pending:
+                f.write(json.dumps(record, default=str) + "\n")
+
+    def render_prometheus(self) -> str:
+        """Histograms and counters in the Prometheus text exposition format."""
+        with self._lock:
+            histograms = {name: (h.cumulative(), h.sum, h.count) for name, h in self.histograms.items()}
+            counters = dict(self.counters)
+        lines = []
+        metric = f"{METRIC_PREFIX}_span_seconds"
+        if histograms:
+            lines.append(f"# HELP {metric} Duration of traced agent operations.")
+            lines.append(f"# TYPE {metric} histogram")
+        for name in sorted(histograms):
+            cumulative, total, count = histograms[name]
+            for bound, n in cumulative:
+                lines.append(f"{metric}_bucket{_label_string([('le', _format_bound(bound)), ('span', name)])} {n}")
+            lines.append(f"{metric}_sum{_label_string([('span', name)])} {total}")
+            lines.append(f"{metric}_count{_label_string([('span', name)])} {count}")
+        for name in sorted({name for name, _ in counters}):
+            metric = f"{METRIC_PREFIX}_{name}_total"
+            lines.append(f"# TYPE {metric} counter")
+            for (counter, labels), value in sorted(counters.items()):
+                if counter == name:
+                    lines.append(f"{metric}{_label_string(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+    def serve(self, port: int, host: str = "127.0.0.1"):
+        """
+        Serve render_prometheus() on http://host:port/metrics from a daemon thread.
+
+        Returns:
+            The HTTP server (call shutdown() to stop it; close() does this too).
+        """
+        tracer = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.rstrip("/") not in ("", "/metrics"):
+                    self.send_error(404)
+                    return
+                body = tracer.render_prometheus().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass  # keep the agent console clean
+
+        self._server = ThreadingHTTPServer((host, port), MetricsHandler)
+        threading.Thread(target=self._server.serve_forever, name="metrics-server", daemon=True).start()
+        print(f"[Tracing] Metrics at http://{host}:{self._server.server_address[1]}/metrics")
+        return self._server
+
+    def close(self):
+        self.flush()
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+
+def summarize_trace(path: str):
+    """
+    Per-span statistics of a trace file.
+
+    Returns:
+        Dict of span name -> {"count", "mean", "p50", "p95", "total"} in seconds.
+    """
+    durations = {}
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            durations.setdefault(record["name"], []).append(record["duration_s"])
+    summary = {}
+    for name, values in durations.items():
+        values.sort()
+        summary[name] = {
+            "count": len(values),
+            "mean": statistics.fmean(values),
+            "p50": values[len(values) // 2],
+            "p95": values[min(len(values) - 1, int(0.95 * len(values)))],
+            "total": sum(values),
+        }
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarize an agent trace file")
+    parser.add_argument("trace", help="trace_<timestamp>.jsonl written by the agent")
+    args = parser.parse_args()
+    summary = summarize_trace(args.trace)
+    print(f"{'span':<28}{'count':>7}{'mean s':>10}{'p50 s':>10}{'p95 s':>10}{'total s':>10}")
+    for name, s in sorted(summary.items(), key=lambda item: -item[1]["total"]):
+        print(f"{name:<28}{s['count']:>7}{s['mean']:>10.4f}{s['p50']:>10.4f}{s['p95']:>10.4f}{s['total']:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+import numpy as np
+
+
+class AdaptiveSweepPolicy:
+    """
+    Settings for an adaptive ESR sweep: one coarse pass over the configured
+    freq_start-freq_stop range, then dense passes only around the dips found.
+
+    Args:
+        coarse_points: Number of frequency points in the coarse pass.
+        point_budget: Total number of frequency points across all passes.
+        refine_span: Width (Hz) of the dense window placed around each dip.
+        max_resonances: Maximum number of dips to refine.
+        dip_snr: Minimum dip depth, in units of the coarse-pass noise, for a dip to be refined.
+        coarse_avg: Number of averages for the coarse pass (None keeps the config's esr_avg).
+    """
+
+    def __init__(self, coarse_points=40, point_budget=120, refine_span=20e6,
+                 max_resonances=2, dip_snr=4.0, coarse_avg=None):
+        if coarse_points < 3:
+            raise ValueError("coarse_points must be at least 3")
+        if point_budget < coarse_points:
+            raise ValueError("point_budget must be at least coarse_points")
+        self.coarse_points = int(coarse_points)
+        self.point_budget = int(point_budget)
+        self.refine_span = float(refine_span)
+        self.max_resonances = int(max_resonances)
+        self.dip_snr = float(dip_snr)
+        self.coarse_avg = coarse_avg
+
+
+def sweep_range(settings: dict):
+    """
+    (start, stop) in Hz of an ESR config's sweep. With range_type "center_range",
+    freq_start is the center and freq_stop the width of the sweep.
+    """
+    if settings.get("range_type", "start_stop") == "center_range":
+        center, width = float(settings["freq_start"]), float(settings["freq_stop"])
+        return center - width / 2, center + width / 2
+    return float(settings["freq_start"]), float(settings["freq_stop"])
+
+
+def find_dips(frequency, spectrum, dip_snr: float, max_resonances: int, min_separation: float):
+    """
+    Locate the deepest local minima of a spectrum that stand out of the noise.
+
+    Returns:
+        List of dip frequencies, deepest first.
+    """
+    frequency = np.asarray(frequency, dtype=float)
+    spectrum = np.asarray(spectrum, dtype=float)
+    if spectrum.size < 3:
+        return []
+    baseline = np.median(spectrum)
+    noise = np.median(np.abs(np.diff(spectrum))) / (0.6745 * np.sqrt(2))
+    threshold = dip_snr * noise if noise > 0 else 0.0
+
+    # Local minima (plateaus count once) that are deep enough
+    padded = np.concatenate(([np.inf], spectrum, [np.inf]))
+    is_min = (padded[1:-1] <= padded[:-2]) & (padded[1:-1] < padded[2:])
+    candidates = [i for i in np.flatnonzero(is_min) if baseline - spectrum[i] > threshold]
+    candidates.sort(key=lambda i: spectrum[i])
+
+    dips = []
+    for i in candidates:
+        f0 = float(frequency[i])
+        if all(abs(f0 - d) >= min_separation for d in dips):
+            dips.append(f0)
+        if len(dips) >= max_resonances:
+            break
+    return dips
+
+
+def plan_refinement(frequency, spectrum, policy: AdaptiveSweepPolicy):
+    """
+    Turn a coarse spectrum into dense sub-sweeps around its dips.
+
+    Overlapping windows are merged and the remaining point budget is split
+    between the windows in proportion to their width. The plan never exceeds the
+    budget: if the windows at their 3-point minimum still do not fit, the windows
+    of the shallowest dips are dropped.
+
+    Returns:
+        List of (freq_start, freq_stop, freq_points) tuples, in frequency order.
+    """
+    frequency = np.asarray(frequency, dtype=float)
+    remaining = policy.point_budget - len(frequency)
+    dips = find_dips(frequency, spectrum, policy.dip_snr, policy.max_resonances,
+                     min_separation=policy.refine_span / 2)
+    if not dips or remaining < 3:
+        return []
+
+    # Windows carry the rank of their deepest dip (dips are ordered deepest first)
+    lo, hi = float(frequency.min()), float(frequency.max())
+    windows = sorted((max(lo, f0 - policy.refine_span / 2), min(hi, f0 + policy.refine_span / 2), rank)
+                     for rank, f0 in enumerate(dips))
+    merged = [list(windows[0])]
+    for start, stop, rank in windows[1:]:
+        if start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], stop)
+            merged[-1][2] = min(merged[-1][2], rank)
+        else:
+            merged.append([start, stop, rank])
+    merged = [w for w in merged if w[1] > w[0]]
+    if not merged:
+        return []
+
+    total_width = sum(stop - start for start, stop, _ in merged)
+    plan = [[start, stop, max(3, int(round(remaining * (stop - start) / total_width))), rank]
+            for start, stop, rank in merged]
+    # Rounding up small windows can overshoot the budget: trim the window with the most
+    # points, and once every window is at 3 points drop the lowest-ranked one
+    dropped = False
+    while sum(w[2] for w in plan) > remaining:
+        overshoot = sum(w[2] for w in plan) - remaining
+        largest = max(plan, key=lambda w: w[2])
+        if largest[2] > 3:
+            largest[2] -= min(overshoot, largest[2] - 3)
+        else:
+            plan.remove(max(plan, key=lambda w: w[3]))
+            dropped = True
+    if dropped:
+        # Points freed by a dropped window go to the deepest dip
+        min(plan, key=lambda w: w[3])[2] += remaining - sum(w[2] for w in plan)
+    return [(start, stop, points) for start, stop, points, _ in plan]
+
+
+def merge_spectra(passes):
+    """
+    Combine the spectra of several passes into one frequency-sorted spectrum.
+    Where the dense passes overlap the coarse one, the coarse points inside a
+    dense window are dropped so the merged curve is not jagged.
+
+    Args:
+        passes: List of (frequency, spectrum) pairs; the first is the coarse pass.
+
+    Returns:
+        Tuple of (frequency, spectrum) numpy arrays.
+    """
+    coarse_f, coarse_s = (np.asarray(a, dtype=float) for a in passes[0])
+    keep = np.ones(len(coarse_f), dtype=bool)
+    freqs, spectra = [], []
+    for f, s in passes[1:]:
+        f, s = np.asarray(f, dtype=float), np.asarray(s, dtype=float)
+        keep &= (coarse_f < f.min()) | (coarse_f > f.max())
+        freqs.append(f)
+        spectra.append(s)
+    freqs.insert(0, coarse_f[keep])
+    spectra.insert(0, coarse_s[keep])
+    frequency = np.concatenate(freqs)
+    spectrum = np.concatenate(spectra)
+    order = np.argsort(frequency, kind="stable")
+    return frequency[order], spectrum[order]
@@ -0,0 +1,141 @@
+import os
+import struct
+import time
+import argparse
+import numpy as np
+
+# Append-only binary layout (little-endian):
+#   header : 8-byte magic, uint32 n_points, n_points float64 frequencies
+#   record : uint32 scan_num, float64 unix timestamp, n_points float64 running-average counts
+SNAPSHOT_MAGIC = b"ESRSNAP1"
+
+
+class ESRSnapshotWriter:
+    """
+    Persist running-average ESR spectra while the averaging loop is still going.
+    Each snapshot is appended as one fixed-size record, so writing is O(points)
+    no matter how many averages have already been saved.
+    """
+
+    def __init__(self, filepath: str):
+        self.filepath = filepath
+        self.n_points = None
+        self.count = 0
+        self._fh = None
+
+    def append(self, scan_num: int, frequency, spectrum):
+        """
+        Append one running-average spectrum. The header is written on the first call,
+        once the frequency axis is known.
+        """
+        spectrum = np.asarray(spectrum, dtype="<f8").ravel()
+        if self._fh is None:
+            frequency = np.asarray(frequency, dtype="<f8").ravel()
+            os.makedirs(os.path.dirname(self.filepath) or ".", exist_ok=True)
+            self._fh = open(self.filepath, "wb")
+            self.n_points = len(frequency)
+            self._fh.write(SNAPSHOT_MAGIC + struct.pack("<I", self.n_points))
+            self._fh.write(frequency.tobytes())
+        if len(spectrum) != self.n_points:
+            raise ValueError(f"Snapshot has {len(spectrum)} points, expected {self.n_points}")
+        self._fh.write(struct.pack("<Id", int(scan_num), time.time()))
+        self._fh.write(spectrum.tobytes())
+        self._fh.flush()
+        self.count += 1
+
+    def close(self):
+        if self._fh is not None:
+            self._fh.close()
+            self._fh = None
+
+
+def read_snapshots(filepath: str) -> dict:
+    """
+    Read a snapshot file written by ESRSnapshotWriter. A partially written trailing
+    record (e.g. the runner was killed mid-write) is ignored.
+
+    Returns:
+        Dictionary with 'frequency' (n_points,), 'scan_num' (n,), 'timestamp' (n,)
+        and 'spectra' (n, n_points) arrays.
+    """
+    with open(filepath, "rb") as f:
+        magic = f.read(len(SNAPSHOT_MAGIC))
+        if magic != SNAPSHOT_MAGIC:
+            raise ValueError(f"{filepath} is not an ESR snapshot file")
+        (n_points,) = struct.unpack("<I", f.read(4))
+        frequency = np.frombuffer(f.read(8 * n_points), dtype="<f8")
+        record_dtype = np.dtype([("scan_num", "<u4"), ("timestamp", "<f8"), ("spectrum", "<f8", (n_points,))])
+        body = f.read()
+    n_records = len(body) // record_dtype.itemsize
+    records = np.frombuffer(body[:n_records * record_dtype.itemsize], dtype=record_dtype)
+    return {
+        "frequency": frequency,
+        "scan_num": records["scan_num"].astype(int),
+        "timestamp": records["timestamp"],
+        "spectra": records["spectrum"],
+    }
+
+
+def contrast_snr(frequency, spectrum) -> dict:
+    """
+    Estimate the contrast of the deepest dip in a spectrum relative to the
+    point-to-point noise.
+
+    The baseline is the median count level and the noise is estimated from the
+    median absolute first difference, which is insensitive to the dips themselves.
+
+    Returns:
+        Dictionary with 'contrast' (fractional), 'snr' and 'dip_frequency'.
+    """
+    frequency = np.asarray(frequency, dtype=float)
+    spectrum = np.asarray(spectrum, dtype=float)
+    if spectrum.size < 3:
+        return {"contrast": 0.0, "snr": 0.0, "dip_frequency": None}
+    baseline = float(np.median(spectrum))
+    noise = float(np.median(np.abs(np.diff(spectrum)))) / (0.6745 * np.sqrt(2))
+    i_min = int(np.argmin(spectrum))
+    depth = baseline - float(spectrum[i_min])
+    return {
+        "contrast": depth / baseline if baseline else 0.0,
+        "snr": float(depth / noise) if noise > 0 else float("inf") if depth > 0 else 0.0,
+        "dip_frequency": float(frequency[i_min]),
+    }
+
+
+class EarlyStopCheck:
+    """
+    Decide whether an ESR run has averaged enough: stop once the fitted dip
+    stands out of the noise by snr_threshold, after at least min_averages scans.
+    """
+
+    def __init__(self, snr_threshold: float, min_averages: int = 5):
+        self.snr_threshold = snr_threshold
+        self.min_averages = min_averages
+        self.last = None
+
+    def should_stop(self, scans_done: int, frequency, spectrum) -> bool:
+        self.last = contrast_snr(frequency, spectrum)
+        return scans_done >= self.min_averages and self.last["snr"] >= self.snr_threshold
+
+
+def main():
+    """
+    Usage:
+      py esr_snapshots.py path/to/esr_snapshots_YYYYMMDD_HHMMSS.bin
+    """
+    parser = argparse.ArgumentParser(description='Summarize an ESR snapshot file')
+    parser.add_argument('snapshot_file', help='Path to the snapshot file written by ESR.py')
+    args = parser.parse_args()
+
+    snaps = read_snapshots(args.snapshot_file)
+    if len(snaps["scan_num"]) == 0:
+        print(f"[Snapshots] No snapshots in {args.snapshot_file}")
+        return
+    for scan_num, spectrum in zip(snaps["scan_num"], snaps["spectra"]):
+        stats = contrast_snr(snaps["frequency"], spectrum)
+        print(f"[Snapshots] scan {scan_num}: contrast={stats['contrast']:.4f} "
+              f"snr={stats['snr']:.1f} dip={stats['dip_frequency']:.6e} Hz")
+
+
+if __name__ == "__main__":
+    main()
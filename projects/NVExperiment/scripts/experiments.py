@@ -0,0 +1,160 @@
+"""
+Built-in experiment plugins for the shared runner (see runner.py).
+"""
+import os
+import json
+
+from runner import Experiment, register_experiment
+from esr_snapshots import ESRSnapshotWriter, EarlyStopCheck
+from adaptive_sweep import AdaptiveSweepPolicy, plan_refinement, merge_spectra, sweep_range
+
+
+class ESRExperiment(Experiment):
+    """
+    ESR with running-average snapshots, optional SNR early stop and an
+    optional adaptive (coarse + dense) frequency sweep.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument('--snapshot-every', type=int, default=1,
+                            help='Append the running-average spectrum to the snapshot file every N averages (0 disables)')
+        parser.add_argument('--stop-snr', type=float, default=None,
+                            help='Stop averaging early once the dip contrast SNR reaches this value')
+        parser.add_argument('--min-averages', type=int, default=5,
+                            help='Minimum number of averages before an early stop is allowed')
+        parser.add_argument('--sweep', choices=['uniform', 'adaptive'], default='uniform',
+                            help='uniform: sweep the configured range once; adaptive: coarse pass, then dense passes around dips')
+        parser.add_argument('--coarse-points', type=int, default=40, help='Adaptive sweep: points in the coarse pass')
+        parser.add_argument('--point-budget', type=int, default=120, help='Adaptive sweep: total points across all passes')
+        parser.add_argument('--refine-span', type=float, default=20e6, help='Adaptive sweep: width (Hz) of each dense window')
+        parser.add_argument('--max-resonances', type=int, default=2, help='Adaptive sweep: maximum number of dips to refine')
+        parser.add_argument('--dip-snr', type=float, default=4.0, help='Adaptive sweep: minimum dip depth in noise units')
+        parser.add_argument('--coarse-avg', type=int, default=None, help="Adaptive sweep: averages for the coarse pass (default: config's esr_avg)")
+
+    def measure(self, context):
+        args, data_dir, timestamp = context.args, context.data_dir, context.timestamp
+        if args.sweep == "uniform":
+            # Single ESR pass over the configured range
+            snapshot_path = os.path.join(data_dir, f"esr_snapshots_{timestamp}.bin")
+            esr = self.run_pass(context, context.config_file, snapshot_path)
+            return esr, esr.data
+
+        # Adaptive sweep: coarse pass over the full range, then dense passes around the dips
+        policy = AdaptiveSweepPolicy(coarse_points=args.coarse_points, point_budget=args.point_budget,
+                                     refine_span=args.refine_span, max_resonances=args.max_resonances,
+                                     dip_snr=args.dip_snr, coarse_avg=args.coarse_avg)
+        # Pass configs are written as start/stop, so a center_range config is converted first
+        freq_start, freq_stop = sweep_range(context.config_data["scripts"][self.script_key]["settings"])
+        coarse_config = self.write_pass_config(context, 0, freq_start, freq_stop,
+                                               policy.coarse_points, policy.coarse_avg)
+        print(f"[Runner] Adaptive sweep: coarse pass with {policy.coarse_points} points...")
+        esr = self.run_pass(context, coarse_config, os.path.join(data_dir, f"esr_snapshots_{timestamp}_pass0.bin"))
+        coarse_data = esr.data
+        passes = [(coarse_data["frequency"], coarse_data["data"])]
+
+        plan = plan_refinement(coarse_data["frequency"], coarse_data["data"], policy)
+        if not plan:
+            print("[Runner] Adaptive sweep: no dips above threshold, skipping refinement.")
+        for k, (start, stop, points) in enumerate(plan, start=1):
+            # Between passes no DAQ task is open, so a waiting optimize run can go first
+            context.checkpoint()
+            print(f"[Runner] Adaptive sweep: pass {k} {start:.6e}-{stop:.6e} Hz with {points} points...")
+            pass_config = self.write_pass_config(context, k, start, stop, points)
+            esr = self.run_pass(context, pass_config, os.path.join(data_dir, f"esr_snapshots_{timestamp}_pass{k}.bin"))
+            passes.append((esr.data["frequency"], esr.data["data"]))
+
+        frequency, spectrum = merge_spectra(passes)
+        print(f"[Runner] Adaptive sweep used {len(frequency)} of {policy.point_budget} budgeted points.")
+        data = {
+            "frequency": frequency,
+            "data": spectrum,
+            "fit_params": coarse_data.get("fit_params"),
+            "passes": [{"freq_start": float(f[0]), "freq_stop": float(f[-1]), "freq_points": len(f)}
+                       for f, _ in passes],
+        }
+        return esr, data
+
+    def write_pass_config(self, context, pass_num, freq_start, freq_stop, freq_points, esr_avg=None):
+        """
+        Write a copy of the ESR config restricted to one sweep window and return its path.
+        """
+        pass_config = json.loads(json.dumps(context.config_data))
+        settings = pass_config["scripts"][self.script_key]["settings"]
+        settings.update({
+            "range_type": "start_stop",
+            "freq_start": float(freq_start),
+            "freq_stop": float(freq_stop),
+            "freq_points": int(freq_points),
+        })
+        if esr_avg is not None:
+            settings["esr_avg"] = int(esr_avg)
+        path = os.path.join(context.data_dir, f"esr_pass{pass_num}_config_{context.timestamp}.json")
+        with open(path, "w") as f:
+            json.dump(pass_config, f, indent=2)
+        return path
+
+    def run_pass(self, context, config_file, snapshot_path):
+        """
+        Run one ESR_RnS measurement, persisting running-average snapshots and
+        stopping early once the SNR threshold (if any) is reached.
+        """
+        args = context.args
+        esr = context.create(config_file)
+
+        # Hook the averaging loop: ESR_RnS emits updateProgress after every average,
+        # with esr.data holding the running-average spectrum at that point.
+        snapshots = ESRSnapshotWriter(snapshot_path) if args.snapshot_every > 0 else None
+        early_stop = EarlyStopCheck(args.stop_snr, args.min_averages) if args.stop_snr is not None else None
+        scans_done = 0
+
+        def on_average(progress):
+            nonlocal scans_done
+            scans_done += 1
+            frequency, spectrum = esr.data.get("frequency"), esr.data.get("data")
+            if frequency is None or spectrum is None or len(spectrum) == 0:
+                return
+            if snapshots is not None and scans_done % args.snapshot_every == 0:
+                snapshots.append(scans_done, frequency, spectrum)
+            if early_stop is not None and early_stop.should_stop(scans_done, frequency, spectrum):
+                print(f"[Runner] Early stop after {scans_done} averages: "
+                      f"SNR {early_stop.last['snr']:.1f} >= {args.stop_snr}")
+                esr.stop()
+
+        esr.updateProgress.connect(on_average)
+
+        print("[Runner] Starting ESR measurement...")
+        try:
+            esr._function()  # This will run the entire ESR sequence
+        finally:
+            if snapshots is not None:
+                snapshots.close()
+        print(f"[Runner] ESR measurement completed after {scans_done} averages!")
+        if snapshots is not None and snapshots.count:
+            print(f"[Runner] Saved {snapshots.count} ESR snapshots to: {snapshot_path}")
+        return esr
+
+
+register_experiment(ESRExperiment(
+    name="esr", label="ESR", script_key="esr_RnS",
+    module="b26_toolkit.scripts.esr_RnS", class_name="ESR_RnS",
+    plot_prefix="ESR_plot", data_prefix="esr_data",
+))
+
+register_experiment(Experiment(
+    name="find_nv", label="FindNV", script_key="find_nv",
+    module="b26_toolkit.scripts.find_nv", class_name="FindNV",
+    plot_prefix="FindNV_plot", data_prefix="FindNV_data",
+))
+
+register_experiment(Experiment(
+    name="galvo_scan", label="GalvoScan", script_key="galvo_scan",
+    module="b26_toolkit.scripts.galvo_scan.galvo_scan", class_name="GalvoScan",
+    plot_prefix="GalvoScan_plot", data_prefix="GalvoScan_data", figsize=(4, 3),
+))
+
+register_experiment(Experiment(
+    name="optimize", label="optimization", script_key="optimize",
+    module="b26_toolkit.scripts.optimize", class_name="optimize",
+    plot_prefix="Optimization_plot", data_prefix="optimization_data",
+    description="Run optimization experiment",
+))
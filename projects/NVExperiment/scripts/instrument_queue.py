@@ -0,0 +1,392 @@
+import os
+import json
+import time
+import uuid
+import socket
+import argparse
+import threading
+from contextlib import contextmanager
+
+# Every measurement drives the same NI6353 DAQ, PulseBlaster and MW source, so the runner
+# takes a ticket in this cross-process queue before touching the hardware. The state is
+# a small JSON file changed only under an OS file lock (held for microseconds):
+#   queue.lock    : msvcrt/fcntl lock guarding queue.json
+#   queue.json    : {"order": ..., "holder": ticket or null, "waiting": [ticket, ...]}
+#   metrics.jsonl : one line per finished run (wait, run time, queue depth, yields)
+QUEUE_DIR = os.environ.get("NV_INSTRUMENT_QUEUE", os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "instrument_queue"))
+
+# Lower runs first. Optimize is short and keeps the NV in focus, so it goes ahead of
+# (and may preempt) long scans.
+PRIORITIES = {"optimize": 0, "find_nv": 1, "esr": 2, "galvo_scan": 2}
+DEFAULT_PRIORITY = 2
+PREEMPTING = {"optimize"}
+ORDERS = ("priority", "fifo")
+
+AGING_S = 600.0      # a waiting ticket gains one priority level per AGING_S, so scans are not starved
+HEARTBEAT_S = 5.0    # tickets are refreshed this often while their process is alive
+STALE_S = 30.0       # tickets not refreshed for this long belong to a dead process and are dropped
+POLL_S = 0.2
+REPORT_S = 60.0      # how often a waiting run prints the queue state
+
+
+@contextmanager
+def _file_lock(path):
+    with open(path, "a+b") as f:
+        if os.name == "nt":
+            import msvcrt
+            while True:
+                try:
+                    f.seek(0)
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)   # retries for 10 s, then raises
+                    break
+                except OSError:
+                    continue
+            try:
+                yield
+            finally:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+class InstrumentQueue:
+    """
+    Shared queue for the instruments, backed by files in `root`.
+
+    Args:
+        root: Queue directory (QUEUE_DIR by default, NV_INSTRUMENT_QUEUE overrides it).
+    """
+
+    def __init__(self, root: str = None):
+        self.root = root or QUEUE_DIR
+        os.makedirs(self.root, exist_ok=True)
+        self.lock_path = os.path.join(self.root, "queue.lock")
+        self.state_path = os.path.join(self.root, "queue.json")
+        self.metrics_path = os.path.join(self.root, "metrics.jsonl")
+
+    def _load(self):
+        try:
+            with open(self.state_path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            state = {}
+        state.setdefault("order", "priority")
+        state.setdefault("holder", None)
+        state.setdefault("waiting", [])
+        return state
+
+    def update(self, fn):
+        """Apply fn(state) under the file lock, save the state and return fn's result."""
+        with _file_lock(self.lock_path):
+            state = self._load()
+            self._prune(state, time.time())
+            result = fn(state)
+            tmp_path = self.state_path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(state, f, indent=1)
+            os.replace(tmp_path, self.state_path)
+            return result
+
+    def _prune(self, state, now):
+        def alive(ticket):
+            return now - ticket.get("heartbeat", 0) < STALE_S
+        holder = state["holder"]
+        if holder is not None and not alive(holder):
+            print(f"[Queue] Dropping the stale hold of {holder['script']} (pid {holder['pid']})")
+            state["holder"] = None
+        state["waiting"] = [t for t in state["waiting"] if alive(t)]
+
+    @staticmethod
+    def ordered(state, now=None):
+        """Waiting tickets in the order they will be served."""
+        now = time.time() if now is None else now
+        if state.get("order") == "fifo":
+            def key(t):
+                return (not t.get("resume"), t["enqueued_at"])
+        else:
+            def key(t):
+                # Preempting runs first, then a run that yielded to them, then by aged priority
+                rank = 0 if t.get("preempting") else 1 if t.get("resume") else 2
+                return (rank, t["priority"] - (now - t["enqueued_at"]) / AGING_S, t["enqueued_at"])
+        return sorted(state["waiting"], key=key)
+
+    def ticket(self, script: str, label: str = None, priority: int = None):
+        """Create a Ticket for one run of `script` (an experiment name, e.g. "esr")."""
+        return Ticket(self, script, label=label,
+                      priority=PRIORITIES.get(script, DEFAULT_PRIORITY) if priority is None else priority)
+
+    def status(self) -> dict:
+        """Current holder and waiting tickets (in service order)."""
+        def read(state):
+            return {"order": state["order"], "holder": state["holder"], "waiting": self.ordered(state)}
+        return self.update(read)
+
+    def set_order(self, order: str):
+        if order not in ORDERS:
+            raise ValueError(f"Queue order must be one of {ORDERS}, got {order!r}")
+        self.update(lambda state: state.__setitem__("order", order))
+
+    def record(self, entry: dict):
+        with _file_lock(self.lock_path):
+            with open(self.metrics_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry) + "\n")
+
+    def stats(self, since: float = 0.0) -> dict:
+        """
+        Wait and run time statistics of the runs finished after `since` (Unix time).
+
+        Returns:
+            Dict with "runs", "busy_s", "max_depth" and per-script
+            {"runs", "mean_wait_s", "p95_wait_s", "max_wait_s", "mean_run_s", "yields"}.
+        """
+        entries = []
+        if os.path.exists(self.metrics_path):
+            with open(self.metrics_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue
+                    if entry.get("finished_at", 0) >= since:
+                        entries.append(entry)
+        scripts = {}
+        for entry in entries:
+            scripts.setdefault(entry["script"], []).append(entry)
+        per_script = {}
+        for script, rows in scripts.items():
+            waits = sorted(r["wait_s"] for r in rows)
+            per_script[script] = {
+                "runs": len(rows),
+                "mean_wait_s": sum(waits) / len(waits),
+                "p95_wait_s": waits[min(len(waits) - 1, int(0.95 * len(waits)))],
+                "max_wait_s": waits[-1],
+                "mean_run_s": sum(r["run_s"] for r in rows) / len(rows),
+                "yields": sum(r.get("yields", 0) for r in rows),
+            }
+        return {
+            "runs": len(entries),
+            "busy_s": sum(e["run_s"] for e in entries),
+            "max_depth": max((e["depth"] for e in entries), default=0),
+            "scripts": per_script,
+        }
+
+
+class Ticket:
+    """
+    One run's place in the queue. acquire() blocks until the run holds the instruments,
+    checkpoint() lets a long run yield to a waiting preempting run, release() gives them up.
+    Also usable as a context manager.
+    """
+
+    def __init__(self, queue: InstrumentQueue, script: str, label: str = None, priority: int = DEFAULT_PRIORITY):
+        self.queue = queue
+        self.id = uuid.uuid4().hex[:12]
+        self.script = script
+        self.info = {
+            "id": self.id,
+            "pid": os.getpid(),
+            "host": socket.gethostname(),
+            "script": script,
+            "label": label or script,
+            "priority": priority,
+            "preempting": script in PREEMPTING,
+        }
+        self.enqueued_at = None
+        self.wait_s = 0.0
+        self.run_s = 0.0
+        self.depth = 0
+        self.yields = 0
+        self.held = False
+        self._held_since = None
+        self._stop = threading.Event()
+        self._heartbeat = None
+
+    def _enqueue(self, state, resume=False):
+        now = time.time()
+        state["waiting"].append(dict(self.info, enqueued_at=now, heartbeat=now, resume=resume))
+        return len(state["waiting"]) + (state["holder"] is not None)
+
+    def _try_take(self, state):
+        if state["holder"] is None:
+            order = self.queue.ordered(state)
+            if order and order[0]["id"] == self.id:
+                ticket = order[0]
+                state["waiting"].remove(ticket)
+                state["holder"] = dict(ticket, acquired_at=time.time(), heartbeat=time.time())
+                return None
+        if not any(t["id"] == self.id for t in state["waiting"]):
+            # Pruned (e.g. the process was suspended past STALE_S): queue again
+            self._enqueue(state)
+        ids = [t["id"] for t in self.queue.ordered(state)]
+        return {"holder": state["holder"], "ahead": ids.index(self.id)}
+
+    def _beat(self):
+        while not self._stop.wait(HEARTBEAT_S):
+            def refresh(state):
+                now = time.time()
+                for t in state["waiting"] + ([state["holder"]] if state["holder"] else []):
+                    if t["id"] == self.id:
+                        t["heartbeat"] = now
+            try:
+                self.queue.update(refresh)
+            except OSError as e:
+                print(f"[Queue] Heartbeat failed: {e}")
+
+    def _wait(self, timeout=None):
+        start = time.time()
+        last_report = 0.0
+        while True:
+            waiting = self.queue.update(self._try_take)
+            if waiting is None:
+                break
+            now = time.time()
+            if now - last_report >= REPORT_S:
+                last_report = now
+                holder = waiting["holder"]
+                held_by = (f"{holder['label']} (pid {holder['pid']}, {(now - holder['acquired_at']) / 60:.1f} min)"
+                           if holder else "nobody")
+                print(f"[Queue] Waiting for the instruments: {waiting['ahead']} ahead, held by {held_by}", flush=True)
+            if timeout is not None and now - start > timeout:
+                self.queue.update(self._leave)
+                raise TimeoutError(f"Instruments not free after {timeout:.0f} s")
+            time.sleep(POLL_S)
+        self.wait_s += time.time() - start
+        self.held = True
+        self._held_since = time.time()
+
+    def acquire(self, timeout: float = None) -> float:
+        """
+        Queue and block until this run holds the instruments.
+
+        Args:
+            timeout: Give up (TimeoutError) after this many seconds; None waits forever.
+
+        Returns:
+            Seconds spent waiting.
+        """
+        self.enqueued_at = time.time()
+        self.depth = self.queue.update(self._enqueue)
+        self._heartbeat = threading.Thread(target=self._beat, name="queue-heartbeat", daemon=True)
+        self._heartbeat.start()
+        self._wait(timeout)
+        return self.wait_s
+
+    def preempt_requested(self) -> bool:
+        """Whether a preempting run (optimize) is waiting for the instruments this run holds."""
+        if not self.held or self.info["preempting"]:
+            return False
+        return self.queue.update(lambda state: state["order"] == "priority"
+                                 and any(t.get("preempting") for t in state["waiting"]))
+
+    def checkpoint(self) -> bool:
+        """
+        Call between measurement segments, when no DAQ task is open. If a preempting run
+        is waiting, hand it the instruments and resume as soon as it is done.
+
+        Returns:
+            True if the run yielded.
+        """
+        if not self.preempt_requested():
+            return False
+
+        def hand_over(state):
+            if state["holder"] and state["holder"]["id"] == self.id:
+                state["holder"] = None
+            self._enqueue(state, resume=True)
+            return [t["label"] for t in state["waiting"] if t.get("preempting")]
+        self.run_s += time.time() - self._held_since
+        self.held = False
+        preempting = self.queue.update(hand_over)
+        self.yields += 1
+        print(f"[Queue] Yielding the instruments to {', '.join(preempting)}...", flush=True)
+        start = time.time()
+        self._wait()
+        print(f"[Queue] Resumed after {time.time() - start:.1f} s", flush=True)
+        return True
+
+    def _leave(self, state):
+        if state["holder"] and state["holder"]["id"] == self.id:
+            state["holder"] = None
+        state["waiting"] = [t for t in state["waiting"] if t["id"] != self.id]
+
+    def release(self):
+        """Give up the instruments (or the place in the queue) and record the run's metrics."""
+        self._stop.set()
+        if self.enqueued_at is None:
+            return
+        if self.held:
+            self.run_s += time.time() - self._held_since
+            self.held = False
+        self.queue.update(self._leave)
+        self.queue.record({
+            "finished_at": time.time(),
+            "script": self.script,
+            "label": self.info["label"],
+            "priority": self.info["priority"],
+            "wait_s": round(self.wait_s, 3),
+            "run_s": round(self.run_s, 3),
+            "depth": self.depth,
+            "yields": self.yields,
+        })
+        self.enqueued_at = None
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+        return False
+
+
+def main():
+    """
+    Usage:
+      py instrument_queue.py status
+      py instrument_queue.py stats [--hours 24]
+      py instrument_queue.py order fifo|priority
+    """
+    parser = argparse.ArgumentParser(description='Show the instrument run queue')
+    parser.add_argument('command', choices=['status', 'stats', 'order'])
+    parser.add_argument('value', nargs='?', help='For order: fifo or priority')
+    parser.add_argument('--hours', type=float, default=24.0, help='For stats: time window')
+    parser.add_argument('--root', default=None, help='Queue directory (default: %s)' % QUEUE_DIR)
+    args = parser.parse_args()
+
+    queue = InstrumentQueue(args.root)
+    now = time.time()
+    if args.command == "order":
+        if args.value not in ORDERS:
+            parser.error(f"order must be one of {ORDERS}")
+        queue.set_order(args.value)
+        print(f"[Queue] Order set to {args.value}")
+    elif args.command == "status":
+        status = queue.status()
+        holder = status["holder"]
+        print(f"[Queue] Order: {status['order']}")
+        if holder:
+            print(f"[Queue] Held by {holder['label']} (pid {holder['pid']}) for {now - holder['acquired_at']:.0f} s")
+        else:
+            print("[Queue] Instruments free")
+        for i, t in enumerate(status["waiting"], 1):
+            print(f"[Queue]   {i}. {t['label']} (pid {t['pid']}, priority {t['priority']}"
+                  f"{', resuming' if t.get('resume') else ''}) waiting {now - t['enqueued_at']:.0f} s")
+    else:
+        stats = queue.stats(since=now - args.hours * 3600)
+        print(f"[Queue] {stats['runs']} runs in the last {args.hours:g} h, instruments busy "
+              f"{stats['busy_s'] / 60:.1f} min ({stats['busy_s'] / (args.hours * 3600):.0%}), max queue depth {stats['max_depth']}")
+        for script, s in sorted(stats["scripts"].items()):
+            print(f"[Queue]   {script}: {s['runs']} runs, wait mean {s['mean_wait_s']:.1f} s / "
+                  f"p95 {s['p95_wait_s']:.1f} s / max {s['max_wait_s']:.1f} s, run mean {s['mean_run_s']:.1f} s, "
+                  f"{s['yields']} yields")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+import os
+import sys
+import json
+import argparse
+import tempfile
+import subprocess
+from results_io import load_results
+
+PENDING_SUFFIX = ".pending"
+
+
+def render_plot(plot_fn, data, outpath, figsize=(6, 4)):
+    """
+    Render a toolkit `_plot(axes_list, data=...)` method to a PNG with the Agg backend.
+    The image is written to a temporary file of its own first, so readers never see a
+    partial PNG and renderers of the same plot (the background worker and the agent) do
+    not overwrite each other's file.
+    """
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    fig, ax = plt.subplots(figsize=figsize)
+    # The toolkit `_plot()` methods check for `axes_list[0]`, so passing [ax] is enough.
+    plot_fn([ax], data=data)
+    fd, tmp_path = tempfile.mkstemp(prefix=os.path.basename(outpath) + ".", suffix=".tmp.png",
+                                    dir=os.path.dirname(os.path.abspath(outpath)))
+    os.close(fd)
+    try:
+        fig.savefig(tmp_path, dpi=150)
+        os.replace(tmp_path, outpath)
+    finally:
+        plt.close(fig)
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def defer_plot(experiment, config_file, data_path, outpath, background=True):
+    """
+    Record that a plot still has to be rendered and, optionally, start a detached
+    worker that renders it right away.
+
+    A `<plot>.pending` marker is written next to the plot; it is removed once the
+    plot exists. Anything that needs the image before then (e.g. the agent's
+    vision action) can render it on demand with render_pending().
+    """
+    marker_path = outpath + PENDING_SUFFIX
+    with open(marker_path, "w") as f:
+        json.dump({
+            "experiment": experiment,
+            "config": os.path.abspath(config_file),
+            "data": os.path.abspath(data_path),
+            "plot": os.path.abspath(outpath),
+        }, f, indent=2)
+
+    if background:
+        cmd = [sys.executable, os.path.abspath(__file__), "--marker", marker_path]
+        kwargs = {"stdout": subprocess.DEVNULL, "stderr": subprocess.DEVNULL, "stdin": subprocess.DEVNULL}
+        if os.name == "nt":
+            kwargs["creationflags"] = subprocess.DETACHED_PROCESS | subprocess.CREATE_NEW_PROCESS_GROUP
+        else:
+            kwargs["start_new_session"] = True
+        subprocess.Popen(cmd, **kwargs)
+    return marker_path
+
+
+class _PlotSelf:
+    """
+    Stands in for the script instance when `_plot` is called from saved data: it has the
+    config's settings, no instruments and the class's methods, but none of the state the
+    Script/QObject __init__ would set up (constructing the script would connect to the
+    instruments). A plot method that needs such state fails with an error that says so.
+    """
+
+    def __init__(self, cls, settings):
+        self._cls = cls
+        self.settings = settings
+        self.instruments = {}
+
+    def __getattr__(self, name):
+        attr = getattr(self._cls, name, None)
+        if callable(attr):
+            return attr.__get__(self, self._cls)
+        raise AttributeError(f"{self._cls.__name__}._plot uses self.{name}, which is not available when "
+                             f"rendering from saved data (only settings, instruments and methods are)")
+
+
+def _plot_method(experiment, config_file):
+    """
+    Get the script's `_plot` bound to a _PlotSelf, without constructing the script.
+    """
+    from runner import get_experiment
+
+    plugin = get_experiment(experiment)
+    cls = plugin.load_class()
+    with open(config_file, "r") as f:
+        config_data = json.load(f)
+    handle = _PlotSelf(cls, config_data["scripts"][plugin.script_key]["settings"])
+    return cls._plot.__get__(handle, cls), plugin.figsize
+
+
+def render_pending(marker_path):
+    """
+    Render the plot described by a `.pending` marker and remove the marker.
+
+    Returns:
+        Path of the rendered plot.
+    """
+    with open(marker_path, "r") as f:
+        marker = json.load(f)
+    plot_fn, figsize = _plot_method(marker["experiment"], marker["config"])
+    data = load_results(marker["data"], mmap_mode=None)
+    render_plot(plot_fn, data, marker["plot"], figsize=figsize)
+    try:
+        os.remove(marker_path)
+    except FileNotFoundError:
+        pass  # rendered concurrently by another worker
+    return marker["plot"]
+
+
+def main():
+    """
+    Usage:
+      py render_plot.py --marker path/to/ESR_plot_YYYYMMDD_HHMMSS.png.pending
+    """
+    parser = argparse.ArgumentParser(description='Render a deferred experiment plot from its saved data')
+    parser.add_argument('--marker', required=True, help='Path to the .pending marker written by the runner')
+    args = parser.parse_args()
+
+    if not os.path.exists(args.marker):
+        print(f"[Render] Marker not found (plot already rendered?): {args.marker}")
+        sys.exit(1)
+    outpath = render_pending(args.marker)
+    print(f"[Render] Saved plot to: {outpath}")
+
+
+if __name__ == "__main__":
+    main()
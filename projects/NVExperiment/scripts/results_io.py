@@ -0,0 +1,180 @@
+import os
+import json
+import struct
+import zipfile
+import argparse
+import numpy as np
+
+RESULTS_FORMAT = "nv-results-1"
+
+
+def _array_key(path) -> str:
+    # "/"-joined path; "%" and "/" inside a component are escaped so keys never collide
+    return "/".join(p.replace("%", "%25").replace("/", "%2F") for p in path) or "data"
+
+
+def _split_arrays(value, path, arrays):
+    """
+    Walk a (nested) result value, moving numpy arrays into `arrays` and
+    returning a JSON-serializable copy that references them by key.
+    """
+    if isinstance(value, np.ndarray) and value.dtype != object:
+        key = _array_key(path)
+        if key in arrays:
+            raise ValueError(f"Two arrays in the result data map to the same key {key!r}")
+        arrays[key] = value
+        return {"$array": key}
+    if isinstance(value, dict):
+        return {str(k): _split_arrays(v, path + [str(k)], arrays) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_split_arrays(v, path + [str(i)], arrays) for i, v in enumerate(value)]
+    if isinstance(value, np.generic):
+        return value.item()
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    return str(value)
+
+
+def _array_summary(array: np.ndarray) -> dict:
+    summary = {"dtype": array.dtype.str, "shape": list(array.shape)}
+    if array.size and np.issubdtype(array.dtype, np.number) and not np.issubdtype(array.dtype, np.complexfloating):
+        summary["min"] = float(np.nanmin(array))
+        summary["max"] = float(np.nanmax(array))
+    return summary
+
+
+def _write_npz(npz_path: str, arrays: dict, compress: bool):
+    """
+    Write arrays as an .npz archive (one "<key>.npy" member each), like np.savez but
+    without passing keys as keyword arguments, so any key (e.g. "file") is allowed.
+    """
+    compression = zipfile.ZIP_DEFLATED if compress else zipfile.ZIP_STORED
+    with zipfile.ZipFile(npz_path, "w", compression=compression, allowZip64=True) as zf:
+        for key, array in arrays.items():
+            with zf.open(f"{key}.npy", "w", force_zip64=True) as member:
+                np.lib.format.write_array(member, np.asanyarray(array), allow_pickle=False)
+
+
+def save_results(data, data_dir: str, stem: str, compress: bool = False, metadata: dict = None):
+    """
+    Save an experiment's data dictionary as typed binary arrays plus a JSON sidecar.
+
+    Numpy arrays are written to `<stem>.npz` with their dtype and shape intact; all
+    other values (settings, fit parameters, strings) go to `<stem>.json`, which also
+    lists every array with its shape, dtype and value range so it can be read
+    without loading the arrays.
+
+    Args:
+        data: The script's data (usually `script.data`), possibly nested.
+        data_dir: Output directory.
+        stem: File name without extension, e.g. "esr_data_20250514_082859".
+        compress: Deflate the arrays. Uncompressed archives can be memory-mapped by load_results.
+        metadata: Extra JSON-serializable information stored in the sidecar under "runner"
+            (experiment name, config path, timings, ...).
+
+    Returns:
+        Tuple of (json_path, npz_path).
+    """
+    os.makedirs(data_dir, exist_ok=True)
+    arrays = {}
+    tree = _split_arrays(data, [], arrays)
+
+    npz_path = os.path.join(data_dir, f"{stem}.npz")
+    json_path = os.path.join(data_dir, f"{stem}.json")
+    _write_npz(npz_path, arrays, compress)
+
+    sidecar = {
+        "format": RESULTS_FORMAT,
+        "arrays_file": os.path.basename(npz_path),
+        "arrays": {key: _array_summary(array) for key, array in arrays.items()},
+        "data": tree,
+    }
+    if metadata:
+        sidecar["runner"] = metadata
+    with open(json_path, "w") as f:
+        json.dump(sidecar, f, indent=1)
+    return json_path, npz_path
+
+
+def _memmap_member(npz_path: str, zf: zipfile.ZipFile, member: str, mmap_mode: str):
+    """
+    Memory-map one array stored uncompressed inside an .npz archive.
+    Returns None if the member is compressed or cannot be mapped.
+    """
+    info = zf.getinfo(member)
+    if info.compress_type != zipfile.ZIP_STORED:
+        return None
+    with open(npz_path, "rb") as fh:
+        fh.seek(info.header_offset)
+        local_header = fh.read(30)
+        name_len, extra_len = struct.unpack("<HH", local_header[26:30])
+        fh.seek(info.header_offset + 30 + name_len + extra_len)
+        version = np.lib.format.read_magic(fh)
+        if version == (1, 0):
+            shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(fh)
+        else:
+            shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(fh)
+        offset = fh.tell()
+    if dtype.hasobject:
+        return None
+    if 0 in shape:
+        return np.empty(shape, dtype=dtype)
+    return np.memmap(npz_path, dtype=dtype, mode=mmap_mode, offset=offset,
+                     shape=shape, order="F" if fortran_order else "C")
+
+
+def _join_arrays(value, arrays):
+    if isinstance(value, dict):
+        if set(value) == {"$array"}:
+            return arrays[value["$array"]]
+        return {k: _join_arrays(v, arrays) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_join_arrays(v, arrays) for v in value]
+    return value
+
+
+def load_results(path: str, mmap_mode: str = "r"):
+    """
+    Load data saved by save_results.
+
+    Args:
+        path: The `.json` sidecar or the `.npz` archive (the other is found next to it).
+        mmap_mode: Memory-map mode for uncompressed arrays ("r", "c", ...), or None to read them into memory.
+
+    Returns:
+        The original data dictionary with numpy arrays restored.
+    """
+    json_path = os.path.splitext(path)[0] + ".json"
+    with open(json_path, "r") as f:
+        metadata = json.load(f)
+    if metadata.get("format") != RESULTS_FORMAT:
+        raise ValueError(f"{json_path} is not a results sidecar written by save_results")
+    npz_path = os.path.join(os.path.dirname(json_path), metadata["arrays_file"])
+
+    arrays = {}
+    if metadata["arrays"]:
+        with zipfile.ZipFile(npz_path) as zf, np.load(npz_path, allow_pickle=False) as npz:
+            for key in metadata["arrays"]:
+                array = _memmap_member(npz_path, zf, f"{key}.npy", mmap_mode) if mmap_mode else None
+                arrays[key] = array if array is not None else npz[key]
+    return _join_arrays(metadata["data"], arrays)
+
+
+def main():
+    """
+    Usage:
+      py results_io.py path/to/esr_data_YYYYMMDD_HHMMSS.json
+    """
+    parser = argparse.ArgumentParser(description='Summarize a saved experiment result')
+    parser.add_argument('path', help='Path to the .json sidecar or .npz archive')
+    args = parser.parse_args()
+
+    json_path = os.path.splitext(args.path)[0] + ".json"
+    with open(json_path, "r") as f:
+        metadata = json.load(f)
+    for key, summary in metadata["arrays"].items():
+        print(f"[Results] {key}: {summary}")
+
+
+if __name__ == "__main__":
+    main()
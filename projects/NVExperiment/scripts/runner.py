@@ -0,0 +1,287 @@
+"""
+Shared experiment runner.
+
+Every experiment script (ESR.py, find_nv.py, galvo_scan.py, optimize.py) is a thin
+shim around main(<experiment name>). The runner handles everything the scripts have
+in common: argument parsing, config loading, instantiating the b26_toolkit script,
+streaming progress, saving the data, plotting and timing.
+
+The measurement itself runs while holding a ticket of the shared instrument queue
+(instrument_queue.py), so runs from different agents or from the lab console never
+drive the hardware at the same time.
+
+To add an experiment, register an Experiment plugin in experiments.py (or any module
+imported there) and add a two-line shim script:
+
+    from runner import main
+    if __name__ == "__main__":
+        main("my_experiment")
+
+Usage:
+  py runner.py <experiment> --config path/to/config.json [--output-dir path/to/output/directory]
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import importlib
+import importlib.util
+from contextlib import contextmanager
+from datetime import datetime
+
+# NV_TOOLKIT_PATH overrides the lab toolkit, e.g. with the simulated one in agent/sim_toolkit
+TOOLKIT_PATH = os.environ.get(
+    "NV_TOOLKIT_PATH", r'C:\Users\NVAFM_6th_fl_2\NV-Automation\b26_toolkit_for_agent\b26_toolkit-master')
+
+EXPERIMENTS = {}
+_plugins_loaded = False
+
+
+def _add_toolkit_path():
+    if TOOLKIT_PATH not in sys.path:
+        sys.path.insert(0, TOOLKIT_PATH)
+
+
+class Experiment:
+    """
+    Plugin describing one experiment type.
+
+    Args:
+        name: Registry name, e.g. "esr".
+        label: Name used in file names and runner messages, e.g. "ESR".
+        script_key: Key of the script block in the config, i.e. config_data["scripts"][script_key].
+        module: b26_toolkit module that defines the script class.
+        class_name: Name of the script class in that module.
+        plot_prefix: Plot file name prefix, e.g. "ESR_plot".
+        data_prefix: Data file name prefix, e.g. "esr_data".
+        figsize: Figure size passed to the script's `_plot()`.
+        description: argparse description.
+    """
+
+    def __init__(self, name, label, script_key, module, class_name, plot_prefix, data_prefix,
+                 figsize=(6, 4), description=None):
+        self.name = name
+        self.label = label
+        self.script_key = script_key
+        self.module = module
+        self.class_name = class_name
+        self.plot_prefix = plot_prefix
+        self.data_prefix = data_prefix
+        self.figsize = figsize
+        self.description = description or f"Run {label} experiment"
+
+    def add_arguments(self, parser):
+        """Add experiment-specific command-line arguments."""
+
+    def module_available(self):
+        """Whether the toolkit module can be imported, without importing it."""
+        _add_toolkit_path()
+        try:
+            return importlib.util.find_spec(self.module) is not None
+        except ImportError:
+            return False
+
+    def load_class(self):
+        """Import the toolkit script class (deferred until a measurement actually runs)."""
+        _add_toolkit_path()
+        return getattr(importlib.import_module(self.module), self.class_name)
+
+    def create(self, config_file):
+        """Instantiate the toolkit script from a config file."""
+        handle = self.load_class()(config_file=config_file)
+        print(f"[Runner] Created {self.class_name} instance.")
+        return handle
+
+    def measure(self, context):
+        """
+        Run the measurement and return (handle, data). Plugins override this to
+        customize how the toolkit script is driven (extra passes, hooks, ...).
+        """
+        handle = context.create(context.config_file)
+        print(f"[Runner] Starting {self.label} measurement...")
+        handle._function()  # This will run the entire measurement sequence
+        print(f"[Runner] {self.label} measurement completed!")
+        return handle, handle.data
+
+
+class RunContext:
+    """
+    State shared between the runner and an Experiment plugin for one invocation.
+    """
+
+    def __init__(self, experiment, args, config_data, timestamp):
+        self.experiment = experiment
+        self.args = args
+        self.config_file = args.config
+        self.config_data = config_data
+        self.data_dir = args.output_dir
+        self.timestamp = timestamp
+        self.timing = {}
+        self.ticket = None   # instrument_queue.Ticket held during the measurement
+
+    @contextmanager
+    def stage(self, name):
+        """Time a stage of the run; repeated stages accumulate."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timing[name] = self.timing.get(name, 0.0) + time.perf_counter() - start
+
+    def create(self, config_file):
+        """Instantiate the toolkit script and stream its progress to stdout."""
+        with self.stage("init"):
+            handle = self.experiment.create(config_file)
+        last = [-1]
+
+        def on_progress(progress):
+            # Print at most every 5% so the captured output stays short
+            if progress is not None and (progress >= 100 or progress - last[0] >= 5):
+                last[0] = progress
+                print(f"[Runner] Progress: {progress}%", flush=True)
+
+        updates = getattr(handle, "updateProgress", None)
+        if updates is not None:
+            updates.connect(on_progress)
+        return handle
+
+    def checkpoint(self):
+        """
+        Let a waiting optimize run use the instruments. Plugins call this between
+        measurement segments, when no toolkit script is running.
+        """
+        if self.ticket is None:
+            return
+        start = time.perf_counter()
+        if self.ticket.checkpoint():
+            self.timing["yielded"] = self.timing.get("yielded", 0.0) + time.perf_counter() - start
+
+
+def register_experiment(experiment: Experiment):
+    """Add an experiment plugin to the registry and return it."""
+    EXPERIMENTS[experiment.name] = experiment
+    return experiment
+
+
+def get_experiment(name: str) -> Experiment:
+    """Look up a registered experiment, loading the built-in plugins on first use."""
+    global _plugins_loaded
+    if not _plugins_loaded:
+        importlib.import_module("experiments")
+        _plugins_loaded = True
+    if name not in EXPERIMENTS:
+        raise KeyError(f"Unknown experiment '{name}'. Registered: {', '.join(sorted(EXPERIMENTS))}")
+    return EXPERIMENTS[name]
+
+
+def build_parser(experiment: Experiment):
+    parser = argparse.ArgumentParser(description=experiment.description)
+    parser.add_argument('--config', required=True, help='Path to the config JSON file')
+    parser.add_argument('--output-dir', default='data', help='Directory to save output data and plots')
+    parser.add_argument('--compress', action='store_true', help='Deflate the saved data arrays (disables memory-mapped loading)')
+    parser.add_argument('--plot', choices=['background', 'lazy', 'sync'], default='background',
+                        help='background: render the plot in a detached worker; lazy: render on first use; sync: render before exiting')
+    parser.add_argument('--priority', type=int, default=None,
+                        help='Instrument queue priority, lower runs first (default: optimize 0, find_nv 1, others 2)')
+    parser.add_argument('--no-queue', action='store_true',
+                        help='Do not wait for the instrument queue (only when nothing else can use the instruments)')
+    experiment.add_arguments(parser)
+    return parser
+
+
+def main(name=None, argv=None):
+    """
+    Run one experiment end to end.
+
+    Args:
+        name: Registered experiment name. If None, it is taken from the first command-line argument.
+        argv: Command-line arguments (defaults to sys.argv[1:]).
+    """
+    from results_io import save_results
+    from render_plot import render_plot, defer_plot
+    from instrument_queue import InstrumentQueue
+
+    argv = sys.argv[1:] if argv is None else list(argv)
+    if name is None:
+        if not argv or argv[0].startswith("-"):
+            print("[Runner] Usage: py runner.py <experiment> --config <config_file> [--output-dir <dir>]")
+            sys.exit(1)
+        name, argv = argv[0], argv[1:]
+    experiment = get_experiment(name)
+    args = build_parser(experiment).parse_args(argv)
+    run_start = time.perf_counter()
+
+    # 1. Load the JSON config
+    config_file = args.config
+    data_dir = args.output_dir
+    if not os.path.exists(config_file):
+        print(f"[Runner] Config file not found: {config_file}")
+        sys.exit(1)
+    with open(config_file, "r") as f:
+        config_data = json.load(f)
+
+    # 2. The script section lives at config_data["scripts"][<script key>]
+    info = config_data["scripts"][experiment.script_key]
+    script_path = info["filepath"]   # e.g. "C:\\Users\\...\\esr_RnS.py"
+    # The filepath only exists on the lab PC; elsewhere the module must be importable from TOOLKIT_PATH
+    if not os.path.exists(script_path) and not experiment.module_available():
+        print(f"[Runner] {experiment.label} script not found at: {script_path}")
+        sys.exit(1)
+
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    os.makedirs(data_dir, exist_ok=True)
+    context = RunContext(experiment, args, config_data, timestamp)
+
+    # 3. Import the toolkit, wait for the instruments and run the measurement
+    with context.stage("import"):
+        experiment.load_class()
+    if not args.no_queue:
+        context.ticket = InstrumentQueue().ticket(experiment.name, label=f"{experiment.label} {timestamp}",
+                                                  priority=args.priority)
+        with context.stage("queue"):
+            waited = context.ticket.acquire()
+        if waited >= 1.0:
+            print(f"[Runner] Waited {waited:.1f} s for the instruments (queue depth {context.ticket.depth})")
+    try:
+        with context.stage("measure"):
+            handle, data = experiment.measure(context)
+    finally:
+        # Saving and plotting do not need the hardware
+        if context.ticket is not None:
+            context.ticket.release()
+    context.timing["measure"] -= context.timing.get("init", 0.0) + context.timing.get("yielded", 0.0)
+
+    # 4. Save the data first so it is on disk as soon as the measurement ends:
+    #    arrays as typed binary (.npz) plus a small JSON metadata sidecar
+    runner_info = {
+        "experiment": experiment.name,
+        "config": os.path.abspath(config_file),
+        "timestamp": timestamp,
+        "timing": context.timing,
+    }
+    with context.stage("save"):
+        outjson, outnpz = save_results(data, data_dir, f"{experiment.data_prefix}_{timestamp}",
+                                       compress=args.compress, metadata=runner_info)
+    print(f"[Runner] Saved {experiment.label} data to: {outjson} (arrays: {outnpz})")
+
+    # 5. Plot the results. By default the figure is rendered from the saved data by a
+    #    background worker (Agg backend), so the runner does not wait on matplotlib.
+    outpath = os.path.join(data_dir, f"{experiment.plot_prefix}_{timestamp}.png")
+    with context.stage("plot"):
+        if args.plot == "sync":
+            render_plot(handle._plot, data, outpath, figsize=experiment.figsize)
+            print(f"[Runner] Saved {experiment.label} plot to: {outpath}")
+        else:
+            defer_plot(experiment.name, config_file, outjson, outpath, background=(args.plot == "background"))
+            print(f"[Runner] {experiment.label} plot will be rendered to: {outpath}")
+
+    context.timing["total"] = time.perf_counter() - run_start
+    print("[Runner] Timing: " + " ".join(f"{stage}={seconds:.2f}s" for stage, seconds in context.timing.items()))
+    return outjson
+
+
+if __name__ == "__main__":
+    # Re-enter through the importable module so plugins register into the same registry
+    import runner
+    runner.main()